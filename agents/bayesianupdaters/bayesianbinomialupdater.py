@@ -33,6 +33,19 @@ class BayesianBinomialUpdater(BayesianAgent):
             self._bayes_update_credence_on_influencer(influencer)
         for propagandist in self.selective_propagandist_influencers:
             self._bayes_update_credence_on_propagandist(propagandist)
+
+    def bayes_update_credence_on_evidence(self, evidence: int):
+        """ Update once on experiments pooled into their summed (2k - n). Equivalent to updating on
+        each of them in turn, up to rounding."""
+        if self.credence <= 0:
+            return
+        p = 0.5 + self.epsilon
+        try:
+            self.credence = 1 / (1 + ((1 - self.credence) * ((1 - p) / p) ** evidence) / self.credence)
+        except OverflowError:
+            # Overwhelming evidence against H, which one update at a time would have rounded to 0
+            if self.credence < 1:
+                self.credence = 0
         
     # Private methods
     def _bayes_update_credence_on_influencer(self, influencer: BinomialExperimenter): 
@@ -0,0 +1,53 @@
+import math
+from agents.bayesianupdaters.bayesianbinomialupdater import BayesianBinomialUpdater
+
+""" A BayesianBinomialUpdater that stores its credence as log-odds, log(c / (1 - c)). Under the two
+possible worlds p and 1-p, an experiment multiplies the odds by (p / (1 - p)) ** (2k - n), so a whole
+round of evidence is one addition: sum(2k - n) * log(p / (1 - p)). Credence is only converted back to
+a probability when it is read, and it cannot underflow to an unrecoverable 0."""
+class LogOddsBinomialUpdater(BayesianBinomialUpdater):
+    def __init__(self, epsilon: float, **kw):
+        self.log_odds: float = 0.
+        super().__init__(epsilon = epsilon, **kw)
+        p = 0.5 + epsilon
+        self._log_likelihood_ratio = math.log(p / (1 - p))
+
+    @property
+    def credence(self) -> float:
+        return probability_from_log_odds(self.log_odds)
+
+    @credence.setter
+    def credence(self, value: float):
+        self.log_odds = log_odds_from_probability(value)
+
+    # Public interface
+    # Superclass mandatory method implementation
+    def bayes_update_credence(self):
+        evidence = 0
+        for influencer in self.bayes_influencers:
+            exp = influencer.get_experiment_data()
+            if exp:
+                evidence += 2 * exp.k - exp.n
+        for propagandist in self.selective_propagandist_influencers:
+            evidence += propagandist.shared_evidence.evidence
+        if evidence:
+            self.log_odds += evidence * self._log_likelihood_ratio
+
+    def bayes_update_credence_on_evidence(self, evidence: int):
+        # Exactly what bayes_update_credence does with the same evidence
+        if evidence:
+            self.log_odds += evidence * self._log_likelihood_ratio
+
+def log_odds_from_probability(probability: float) -> float:
+    if probability <= 0:
+        return -math.inf
+    if probability >= 1:
+        return math.inf
+    return math.log(probability / (1 - probability))
+
+def probability_from_log_odds(log_odds: float) -> float:
+    # Split on the sign so that math.exp never overflows.
+    if log_odds >= 0:
+        return 1 / (1 + math.exp(-log_odds))
+    odds = math.exp(log_odds)
+    return odds / (1 + odds)
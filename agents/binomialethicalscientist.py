@@ -1,8 +1,11 @@
+import math
 import numpy as np
 from agents.bayesianupdaters.bayesianbinomialupdater import BayesianBinomialUpdater
 from agents.crsupervisor import CredenceBasedSupervisor
 from agents.experimenters.binomialexperimenter import BinomialExperiment
-from typing import Optional
+from network.outcomes import ENBinomialOutcomes
+from sim.stopconditions import ENCredenceBands
+from typing import Optional, Tuple
 
 """ A scientist who runs experiments on a binomial distribution, and who stops 
 experimenting when credence is below a certain threshold."""
@@ -14,6 +17,34 @@ class BinomialEthicalScientist(BayesianBinomialUpdater, CredenceBasedSupervisor)
         self.rng = rng
         self.n_per_round = n_per_round
         self.binomial_experiment: Optional[BinomialExperiment] = None
+        # Pre-drawn outcomes shared with the rest of the network, if any (see network/outcomes.py)
+        self.outcomes: Optional[ENBinomialOutcomes] = None
+        self.outcome_index = 0
+        # Kept up to date as the credence changes once tracked (see track_credence_bands)
+        self.credence_bands: Optional[ENCredenceBands] = None
+        self._credence_band = 0
+        # While the credence is within these, it is still in its band
+        self._band_floor = -math.inf
+        self._band_ceiling = math.inf
+
+    def draw_outcomes_from(self, outcomes: ENBinomialOutcomes, index: int):
+        self.outcomes = outcomes
+        self.outcome_index = index
+
+    def track_credence_bands(self, bands: ENCredenceBands):
+        """ Count this scientist into bands, and move it between them as its credence changes."""
+        self.credence_bands = bands
+        self._credence_band = self._band_in(bands)
+        bands.add(self._credence_band)
+        self._band_floor, self._band_ceiling = self._band_range_in(bands, self._credence_band)
+
+    def move_credence_band(self):
+        """ Call once the credence changed, unless in the round's research action, which does."""
+        band = self._band_in(self.credence_bands)
+        if band != self._credence_band:
+            self.credence_bands.move(self._credence_band, band)
+            self._credence_band = band
+        self._band_floor, self._band_ceiling = self._band_range_in(self.credence_bands, band)
     
     # CredenceBasedSupervisor mandatory method implementations
     def _stop_action(self):
@@ -26,13 +57,25 @@ class BinomialEthicalScientist(BayesianBinomialUpdater, CredenceBasedSupervisor)
         
     def _finally(self):
         self.bayes_update_credence()
+        # Most updates leave the credence in its band
+        if not self._band_floor <= self.credence <= self._band_ceiling:
+            self.move_credence_band()
 
     # BinomialExperimenter implementation
     def get_experiment_data(self) -> Optional[BinomialExperiment]:
         return self.binomial_experiment
         
+    def _band_in(self, bands: ENCredenceBands) -> int:
+        return bands.band(self.credence)
+
+    def _band_range_in(self, bands: ENCredenceBands, band: int) -> Tuple[float, float]:
+        return bands.credence_range(band)
+
     # Experiment
     def _experiment(self, n: int, epsilon):
-        k = self.rng.binomial(n, 0.5 + epsilon)
+        if self.outcomes:
+            k = self.outcomes.draw(self.outcome_index)
+        else:
+            k = self.rng.binomial(n, 0.5 + epsilon)
         self.binomial_experiment = BinomialExperiment(k, n)
     
\ No newline at end of file
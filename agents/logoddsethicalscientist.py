@@ -0,0 +1,33 @@
+import numpy as np
+from agents.bayesianupdaters.logoddsbinomialupdater import LogOddsBinomialUpdater, log_odds_from_probability
+from agents.binomialethicalscientist import BinomialEthicalScientist
+from sim.stopconditions import ENCredenceBands
+from typing import Tuple
+
+""" A BinomialEthicalScientist whose credence is stored as log-odds. The stop threshold is compared
+in log-odds space, so deciding on a round's research action needs no conversion."""
+class LogOddsBinomialEthicalScientist(LogOddsBinomialUpdater, BinomialEthicalScientist):
+    def __init__(self, rng: np.random.Generator, n_per_round: int, epsilon: float, stop_threshold: float, prior: float):
+        super().__init__(rng = rng,
+                         n_per_round = n_per_round,
+                         epsilon = epsilon,
+                         stop_threshold = stop_threshold,
+                         prior = prior)
+        self._log_odds_stop_threshold = log_odds_from_probability(stop_threshold)
+
+    def decide_round_research_action(self):
+        if self.log_odds < self._log_odds_stop_threshold:
+            self._stop_action()
+        else:
+            self._continue_action()
+
+    def _finally(self):
+        self.bayes_update_credence()
+        if not self._band_floor <= self.log_odds <= self._band_ceiling:
+            self.move_credence_band()
+
+    def _band_in(self, bands: ENCredenceBands) -> int:
+        return bands.log_odds_band(self.log_odds)
+
+    def _band_range_in(self, bands: ENCredenceBands, band: int) -> Tuple[float, float]:
+        return bands.log_odds_range(band)
@@ -1,31 +1,41 @@
 from agents.experimenters.binomialexperimenter import *
-from typing import List
+from typing import NamedTuple
+
+class SharedEvidence(NamedTuple):
+    """ Sufficient statistics of the experiments a propagandist shared in a round. Under two possible
+    worlds, updating on all of them is the same as updating once on evidence = sum(2k - n)."""
+    count: int
+    evidence: int
 
 class SelectiveSharingPropagandist():
-    def __init__(self):
+    def __init__(self, n_per_round: int):
+        # The n of every experiment. It can currently only handle networks where it is the same.
+        self.n_per_round = n_per_round
         self.scientists: list[BinomialExperimenter] = []
+        # The round's shared experiments, collected once per round by collect_round_evidence
+        self._shared_experiments: list[BinomialExperiment] = []
+        self.shared_evidence = SharedEvidence(0, 0)
 
     def add_scientist(self, scientist: BinomialExperimenter):
+        if scientist.n_per_round != self.n_per_round:
+            raise ValueError("SelectiveSharingPropagandist can currently only handle networks where "
+                             f"the n of all experiments is the same, {self.n_per_round}, got {scientist.n_per_round}.")
         self.scientists.append(scientist)
 
-    # BinomialExperimenter implementation
-    def get_experiment_data(self) -> list[BinomialExperiment]:
-        if not self.scientists:
-            return []
+    def collect_round_evidence(self):
+        """ Call once per round, after the scientists have experimented and before anyone updates
+        on the propagandist."""
         experiments = [scientist.get_experiment_data() for scientist in self.scientists]
-        experiments = [experiment for experiment in experiments if experiment]
-        if not experiments:
-            return []
         # NB this assumes that hypothesis A (which is to be promoted) is 0.5 - epsilon, and B is 0.5 + epsilon.
-        experiments = [experiment for experiment in experiments if experiment.k / experiment.n < 0.5]
-        if experiments:
-            # Get the lowest evidence for B (i.e. highest evidence for A)
-            return experiments
-        else:
-            return []
-        # TODO: Implement safety. SelectiveSharingPropagandist cannot handle networks 
-        # where n varies! (If n varies, a )
-        # if not (experiments.count(experiments[0].n) == len(experiments)):
-        #     raise NotImplementedError("SelectiveSharingPropagandist can currently \
-        #         only handle networks where the n of all experiments is the same.")
-        
+        # k/n < 0.5, i.e. evidence for A
+        self._shared_experiments = [experiment for experiment in experiments
+                                    if experiment and 2 * experiment.k < self.n_per_round]
+        count = len(self._shared_experiments)
+        self.shared_evidence = SharedEvidence(count,
+                                              2 * sum(experiment.k for experiment in self._shared_experiments)
+                                              - count * self.n_per_round)
+
+    # BinomialExperimenter implementation
+    def get_experiment_data(self) -> list[BinomialExperiment]:
+        """ The experiments shared this round. Callers must not modify the list."""
+        return self._shared_experiments
@@ -0,0 +1,101 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from sim.simsetup import ENSimType, preset_configs
+from sim.sweep import ENSweep
+from sim.sim_models import *
+from typing import Dict, Iterable, List, Optional
+
+""" Executor benchmarks: a whole sweep of a preset on a process pool and on a thread pool, at
+several worker counts. Unlike the macro-benchmarks, this includes pool start-up and the shipping of
+tasks and results. Each measurement runs in a fresh interpreter, so that its peak memory is its own:
+peak_rss_mb is that of the sweep's process plus, for a process pool, that of the largest worker
+times the number of workers. Rounds depend on the chunk size for ENSimEngine.VECTORIZED only, which
+is kept the same for every measurement."""
+
+def run_executor_benchmarks(sim_type: ENSimType = ENSimType.PROPAGANDA_CYCLE,
+                            sim_count: int = 200,
+                            worker_counts: Optional[Iterable[int]] = None,
+                            options: ENSimOptions = ENSimOptions(ENSimEngine.VECTORIZED),
+                            chunk_size: int = 50,
+                            seed_base: int = 253) -> Dict[str, dict]:
+    if worker_counts is None:
+        worker_counts = _default_worker_counts()
+    results = {}
+    for workers in worker_counts:
+        for executor in ENSweepExecutor:
+            result = _measure_in_subprocess(sim_type, sim_count, workers, executor, options, chunk_size, seed_base)
+            results[f'executor.{sim_type.name}.{executor.name}.{workers}'] = result
+    return results
+
+def measure_sweep(sim_type: ENSimType,
+                  sim_count: int,
+                  workers: int,
+                  executor: ENSweepExecutor,
+                  options: ENSimOptions,
+                  chunk_size: int,
+                  seed_base: int) -> dict:
+    configs, _ = preset_configs(sim_type)
+    sweep = ENSweep(configs,
+                    [seed_base + i for i in range(len(configs))],
+                    sim_count,
+                    options,
+                    chunk_size,
+                    workers,
+                    None,
+                    None,
+                    executor=executor)
+    start_time = time.perf_counter()
+    for _ in sweep.run():
+        pass
+    seconds = time.perf_counter() - start_time
+    rounds = sum(int(aggregator.results['final_sim_round'].sum()) for aggregator in sweep.aggregators)
+    sims = len(configs) * sim_count
+    # ru_maxrss is in kilobytes on Linux
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if executor == ENSweepExecutor.PROCESSES:
+        peak_kb += workers * resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {'seconds': seconds / rounds,
+            'unit': 'round',
+            'sims': sims,
+            'rounds': rounds,
+            'sims_per_sec': sims / seconds,
+            'rounds_per_sec': rounds / seconds,
+            'workers': workers,
+            'peak_rss_mb': peak_kb / 1024}
+
+def _measure_in_subprocess(sim_type: ENSimType,
+                           sim_count: int,
+                           workers: int,
+                           executor: ENSweepExecutor,
+                           options: ENSimOptions,
+                           chunk_size: int,
+                           seed_base: int) -> dict:
+    args = [sim_type.name, str(sim_count), str(workers), executor.name, options.engine.name,
+            options.credence_representation.name, str(chunk_size), str(seed_base)]
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.executors', *args],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def _default_worker_counts() -> List[int]:
+    cpu_count = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpu_count:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpu_count:
+        counts.append(cpu_count)
+    return counts
+
+if __name__ == '__main__':
+    # One measurement, run by _measure_in_subprocess
+    sim_type, sim_count, workers, executor, engine, credence_representation, chunk_size, seed_base = sys.argv[1:]
+    print(json.dumps(measure_sweep(ENSimType[sim_type],
+                                   int(sim_count),
+                                   int(workers),
+                                   ENSweepExecutor[executor],
+                                   ENSimOptions(ENSimEngine[engine], ENCredenceRepresentation[credence_representation]),
+                                   int(chunk_size),
+                                   int(seed_base))))
@@ -0,0 +1,40 @@
+import numpy as np
+import time
+from sim.simsetup import ENSimType, preset_configs
+from sim.simworker import replicate_seeds, run_sim
+from sim.sim_models import *
+from typing import Dict, Iterable, List, Tuple
+
+""" Macro-benchmarks: fixed-seed runs of the configs of each ENSimType preset, in this process.
+Unlike the time in the sweep CSVs, this leaves out pool start-up and IPC. Replicate j of config i
+is seeded like in a sweep, so the same code always simulates the same rounds, and rounds/sec is
+comparable between runs. Like the micro-benchmarks, each preset reports its best of a few repeats."""
+
+def run_macro_benchmarks(replicates: int = 5,
+                         repeat: int = 3,
+                         options: ENSimOptions = ENSimOptions(),
+                         sim_types: Iterable[ENSimType] = ENSimType,
+                         seed_base: int = 253) -> Dict[str, dict]:
+    results = {}
+    for sim_type in sim_types:
+        configs, _ = preset_configs(sim_type)
+        sims = len(configs) * replicates
+        seconds, rounds = min(_run_preset(configs, replicates, options, seed_base) for _ in range(repeat))
+        results[f'macro.{sim_type.name}'] = {'seconds': seconds / rounds,
+                                             'unit': 'round',
+                                             'sims': sims,
+                                             'rounds': rounds,
+                                             'sims_per_sec': sims / seconds,
+                                             'rounds_per_sec': rounds / seconds}
+    return results
+
+def _run_preset(configs: List[ENParams],
+                replicates: int,
+                options: ENSimOptions,
+                seed_base: int) -> Tuple[float, int]:
+    rounds = 0
+    start_time = time.perf_counter()
+    for i, params in enumerate(configs):
+        for seed in replicate_seeds(seed_base + i, 0, replicates):
+            rounds += run_sim(np.random.default_rng(seed), params, options).final_sim_round
+    return time.perf_counter() - start_time, rounds
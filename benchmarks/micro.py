@@ -0,0 +1,85 @@
+import copy
+import math
+import numpy as np
+import time
+import timeit
+from agents.bayesianupdaters.bayesianbinomialupdater import BayesianBinomialUpdater
+from network.network import ENetworkForBinomialUpdating
+from sim.sim_models import *
+from typing import Callable, Dict, List
+
+""" Micro-benchmarks of the object graph's hot spots. Every benchmark times a single call and
+reports the best seconds per call over a few repeats, which is the least noisy estimate. A round
+changes the network it is played on, so every round benchmark plays one round on each of a batch of
+copies of the same network, made before the clock starts, rather than playing on towards consensus."""
+
+# A PROPAGANDA_CYCLE config, the shape of most production sweeps
+MICRO_PARAMS = ENParams(20, ENetworkType.CYCLE, 10, 0.05, 0.5, 10000, 0.99,
+                        ENPassiveUpdatersConfig(1, 0.0001, 0.5, 10), True)
+
+def run_micro_benchmarks(repeat: int = 5, seed: int = 253) -> Dict[str, dict]:
+    results = {}
+    for name, func in micro_benchmarks(seed):
+        seconds = best_seconds_per_call(func, repeat)
+        results[f'micro.{name}'] = {'seconds': seconds, 'unit': 'call', 'calls_per_sec': 1 / seconds}
+    for name, network in round_benchmarks(seed):
+        seconds = best_seconds_per_round(network, repeat)
+        results[f'micro.{name}'] = {'seconds': seconds, 'unit': 'call', 'calls_per_sec': 1 / seconds}
+    return results
+
+def micro_benchmarks(seed: int) -> List[tuple[str, Callable[[], object]]]:
+    rng = np.random.default_rng(seed)
+    updater = BayesianBinomialUpdater(epsilon=MICRO_PARAMS.epsilon, prior=0.5)
+    network = _network(rng, MICRO_PARAMS)
+    # Give the scientists experiments to share
+    network.enetwork_play_round()
+    complete_params = MICRO_PARAMS._replace(network_type=ENetworkType.COMPLETE)
+    return [
+        ('bayes_posterior', lambda: updater._bayes_calculate_posterior_two_possible_worlds(0.5, 6, 10, 0.55)),
+        ('propagandist_collect_round_evidence', network.propagandist.collect_round_evidence),
+        ('build_network_cycle', lambda: _network(rng, MICRO_PARAMS)),
+        ('build_network_complete', lambda: _network(rng, complete_params)),
+    ]
+
+def round_benchmarks(seed: int) -> List[tuple[str, ENetworkForBinomialUpdating]]:
+    """ Networks in the state every timed round starts from: a round in, as in a typical replicate."""
+    rng = np.random.default_rng(seed)
+    benchmarks = []
+    for name, params in (('play_round_cycle', MICRO_PARAMS),
+                         ('play_round_complete', MICRO_PARAMS._replace(network_type=ENetworkType.COMPLETE))):
+        network = _network(rng, params)
+        network.enetwork_play_round()
+        benchmarks.append((name, network))
+    return benchmarks
+
+def best_seconds_per_call(func: Callable[[], object], repeat: int) -> float:
+    timer = timeit.Timer(func)
+    # Enough calls per repeat to run for about 0.2 s
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+def best_seconds_per_round(network: ENetworkForBinomialUpdating, repeat: int) -> float:
+    # Enough rounds per repeat to run for about 0.2 s. The copies include the network's generator,
+    # so every one plays the same round.
+    probe = copy.deepcopy(network)
+    start = time.perf_counter()
+    probe.enetwork_play_round()
+    number = max(1, min(10000, math.ceil(0.2 / max(time.perf_counter() - start, 1e-9))))
+    best = math.inf
+    for _ in range(repeat):
+        networks = [copy.deepcopy(network) for _ in range(number)]
+        start = time.perf_counter()
+        for copied in networks:
+            copied.enetwork_play_round()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+def _network(rng: np.random.Generator, params: ENParams) -> ENetworkForBinomialUpdating:
+    return ENetworkForBinomialUpdating(rng,
+                                       params.scientist_pop_count,
+                                       params.network_type,
+                                       params.binom_n_per_round,
+                                       params.epsilon,
+                                       params.scientist_stop_threshold,
+                                       params.passive_updaters_config,
+                                       params.selective_propagandist_active)
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from benchmarks.executors import run_executor_benchmarks
+from benchmarks.macro import run_macro_benchmarks
+from benchmarks.micro import run_micro_benchmarks
+from sim.simsetup import ENSimType
+from sim.sim_models import *
+from typing import Dict, List
+
+""" Runs the benchmark suite, saves the results as JSON and compares them with a baseline.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.1
+    python -m benchmarks.run --skip-micro --skip-macro --executors --workers 1 2 4 8
+
+Every benchmark reports 'seconds' per unit of work (a call or a simulated round); a benchmark
+regressed when it takes more than (1 + threshold) times its baseline seconds. The exit status is 1
+if anything regressed. Baselines only compare on the same machine, so none is kept in the repo:
+save one from the commit you compare against."""
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run')
+    parser.add_argument('--output', help="Write the results to this JSON file.")
+    parser.add_argument('--baseline', help="Compare with the results in this JSON file.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Allowed slowdown relative to the baseline. Default 0.1, i.e. 10%%.")
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--skip-macro', action='store_true')
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats per micro-benchmark.")
+    parser.add_argument('--macro-repeat', type=int, default=3, help="Repeats per macro-benchmark.")
+    parser.add_argument('--replicates', type=int, default=5,
+                        help="Fixed-seed replicates per config in the macro-benchmarks.")
+    parser.add_argument('--sim-types', nargs='+', choices=[t.name for t in ENSimType],
+                        help="Presets to macro-benchmark. Default all.")
+    parser.add_argument('--engine', choices=[e.name for e in ENSimEngine], default=ENSimEngine.OBJECT_GRAPH.name)
+    parser.add_argument('--executors', action='store_true',
+                        help="Also compare sweeps on process and thread pools (see benchmarks/executors.py).")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help="Worker counts for the executor benchmarks. Default powers of 2 up to the CPU count.")
+    parser.add_argument('--executor-engine', choices=[e.name for e in ENSimEngine], default=ENSimEngine.VECTORIZED.name)
+    args = parser.parse_args(argv)
+
+    benchmarks = {}
+    if not args.skip_micro:
+        benchmarks.update(run_micro_benchmarks(args.repeat))
+    if not args.skip_macro:
+        sim_types = [ENSimType[name] for name in args.sim_types] if args.sim_types else list(ENSimType)
+        benchmarks.update(run_macro_benchmarks(args.replicates,
+                                               args.macro_repeat,
+                                               ENSimOptions(ENSimEngine[args.engine]),
+                                               sim_types))
+    if args.executors:
+        benchmarks.update(run_executor_benchmarks(worker_counts=args.workers,
+                                                  options=ENSimOptions(ENSimEngine[args.executor_engine])))
+    results = {'environment': environment(), 'benchmarks': benchmarks}
+    print_results(benchmarks)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline['benchmarks'], benchmarks, args.threshold)
+        if regressions:
+            print(f'Regressed by more than {args.threshold:.0%}: {", ".join(regressions)}')
+            return 1
+    return 0
+
+def compare(baseline: Dict[str, dict], current: Dict[str, dict], threshold: float) -> List[str]:
+    """ Print the change of each benchmark in both result sets; return the regressed ones."""
+    regressions = []
+    for name in sorted(current.keys() & baseline.keys()):
+        ratio = current[name]['seconds'] / baseline[name]['seconds']
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        print(f'{name:<45} {ratio:6.2f}x baseline time{"  REGRESSED" if regressed else ""}')
+    return regressions
+
+def print_results(benchmarks: Dict[str, dict]):
+    for name, result in benchmarks.items():
+        if result['unit'] == 'call':
+            print(f'{name:<45} {result["seconds"] * 1e6:12.3f} us/call')
+        else:
+            memory = f' {result["peak_rss_mb"]:10.1f} MB' if 'peak_rss_mb' in result else ''
+            print(f'{name:<45} {result["rounds_per_sec"]:12.1f} rounds/s {result["sims_per_sec"]:10.3f} sims/s{memory}')
+
+def environment() -> dict:
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count()}
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
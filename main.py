@@ -1,13 +1,62 @@
-from sim.simsetup import *
+import argparse
 from multiprocessing import freeze_support
 
-def main():
-    sim_type = ENSimType.PROPAGANDA_CYCLE
+""" Command line entry point, e.g. python main.py --sim-type ZOLLMAN_CYCLE --sim-count 10000.
+Modules are only imported in main(), once the arguments are parsed. Workers started with spawn or
+forkserver import this module again, and then import nothing but what their tasks need."""
+
+def parse_args() -> argparse.Namespace:
+    from sim.sim_models import (ENCompleteNetworkUpdating, ENCredenceRepresentation, ENSimEngine, ENSimType,
+                                ENSweepExecutor)
+    parser = argparse.ArgumentParser(description="Run the simulations of a pre-defined template.")
+    parser.add_argument('--sim-type', choices=[t.name for t in ENSimType], default=ENSimType.PROPAGANDA_CYCLE.name)
     # sim_count is standardly 10000 in the Zollman (2007) literature.
     # It is 1000 in Weatherall, O'Connor and Bruner (2020).
-    sim_count = 1000
-    simsetup = ENSimSetup(sim_count, sim_type)
-    simsetup.quick_setup()
+    parser.add_argument('--sim-count', type=int, default=1000)
+    parser.add_argument('--engine', choices=[e.name for e in ENSimEngine], default=ENSimEngine.OBJECT_GRAPH.name)
+    parser.add_argument('--credence-representation', choices=[r.name for r in ENCredenceRepresentation],
+                        default=ENCredenceRepresentation.PROBABILITY.name)
+    parser.add_argument('--complete-network-updating', choices=[u.name for u in ENCompleteNetworkUpdating],
+                        default=ENCompleteNetworkUpdating.PER_INFLUENCER.name,
+                        help="SEQUENTIAL gives the same results in O(N) per round (object graph engine only)")
+    parser.add_argument('--share-scientists', action='store_true',
+                        help="simulate configs that only differ in their passive updaters or propagandist together")
+    parser.add_argument('--output', help="CSV file to append the results to (default: the template's)")
+    parser.add_argument('--processes', type=int, help="worker processes or threads (default: one per CPU)")
+    parser.add_argument('--executor', choices=[e.name for e in ENSweepExecutor], default=ENSweepExecutor.PROCESSES.name,
+                        help="THREADS suits the VECTORIZED engine")
+    parser.add_argument('--chunk-size', type=int)
+    parser.add_argument('--start-method', choices=['fork', 'spawn', 'forkserver'],
+                        help="how worker processes are started (default: the platform's)")
+    parser.add_argument('--checkpoint-dir')
+    parser.add_argument('--cache-dir')
+    parser.add_argument('--status-path', help="JSON status file for monitoring")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    from sim.simsetup import ENSimSetup, preset_configs
+    from sim.sim_models import (ENCompleteNetworkUpdating, ENCredenceRepresentation, ENSimEngine, ENSimType,
+                                ENSweepExecutor)
+    sim_type = ENSimType[args.sim_type]
+    simsetup = ENSimSetup(args.sim_count,
+                          sim_type,
+                          engine = ENSimEngine[args.engine],
+                          chunk_size = args.chunk_size,
+                          credence_representation = ENCredenceRepresentation[args.credence_representation],
+                          processes = args.processes,
+                          checkpoint_dir = args.checkpoint_dir,
+                          cache_dir = args.cache_dir,
+                          status_path = args.status_path,
+                          start_method = args.start_method,
+                          complete_network_updating = ENCompleteNetworkUpdating[args.complete_network_updating],
+                          share_scientists = args.share_scientists,
+                          executor = ENSweepExecutor[args.executor])
+    if args.output:
+        configs, _ = preset_configs(sim_type)
+        simsetup.setup_sims(configs, args.output)
+    else:
+        simsetup.quick_setup()
 
 if __name__ == "__main__":
     #freeze_support() 
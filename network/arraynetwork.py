@@ -0,0 +1,355 @@
+import math
+import numpy as np
+from functools import lru_cache
+from agents.bayesianupdaters.logoddsbinomialupdater import log_odds_from_probability, probability_from_log_odds
+from agents.experimenters.binomialexperimenter import BinomialExperiment
+from agents.selective_sharing_propagandist import SharedEvidence
+from network.outcomes import ENBinomialOutcomes
+from network.topology import shared_topology
+from sim.sim_models import *
+from sim.stopconditions import ENCredenceBands
+from typing import List, Optional, Sequence, Tuple
+
+""" One replicate's network as a struct of arrays: credences, stop thresholds, the latest k and n
+and whether each scientist experimented are contiguous NumPy arrays, and agents only exist as
+lightweight views (ENScientistView, ENPassiveUpdaterView) for code that expects agent objects.
+Round for round, it simulates exactly what ENetworkForBinomialUpdating simulates, from the same
+random draws.
+
+The object graph updates scientists one after the other, each on the experiments its influencers
+have at that moment: this round's for scientists earlier in the list (and itself), last round's for
+those after it. A scientist's credence only changes in its own turn, so every research decision of
+a round can be taken up front, the round's experiments drawn in one call, and the updates
+vectorized over scientists, one influencer position at a time. Likelihood ratios are looked up
+in a table of Python float powers, so posteriors round exactly like the scalar formula."""
+
+# Rebuilt from the parameters when a network is unpickled
+DERIVED_ATTRIBUTES = ('_likelihood_ratio_list', '_likelihood_ratios', '_evidence_offset', '_vanishing_ratios',
+                      '_log_likelihood_ratio', '_influencer_owner', '_influencers', '_current_round_influencer',
+                      '_influencer_positions')
+
+# Up to this many passive updaters are updated as Python floats in the probability representation
+SCALAR_PASSIVE_UPDATER_COUNT = 8
+
+class ENScientistView():
+    """ Agent-like access to scientist index of an ENetworkStateForBinomialUpdating."""
+    __slots__ = ('network', 'index')
+
+    def __init__(self, network: 'ENetworkStateForBinomialUpdating', index: int):
+        self.network = network
+        self.index = index
+
+    @property
+    def credence(self) -> float:
+        return self.network._to_probability(self.network._beliefs[self.index])
+
+    @credence.setter
+    def credence(self, value: float):
+        self.network._beliefs[self.index] = self.network._from_probability(value)
+
+    @property
+    def stop_threshold(self) -> float:
+        return float(self.network.stop_thresholds[self.index])
+
+    # BinomialExperimenter implementation
+    def get_experiment_data(self) -> Optional[BinomialExperiment]:
+        if not self.network.experimenting[self.index]:
+            return None
+        return BinomialExperiment(int(self.network.k[self.index]), int(self.network.n[self.index]))
+
+class ENPassiveUpdaterView():
+    """ Agent-like access to passive updater index of an ENetworkStateForBinomialUpdating."""
+    __slots__ = ('network', 'index')
+
+    def __init__(self, network: 'ENetworkStateForBinomialUpdating', index: int):
+        self.network = network
+        self.index = index
+
+    @property
+    def credence(self) -> float:
+        return self.network._to_probability(self.network._passive_beliefs[self.index])
+
+    @credence.setter
+    def credence(self, value: float):
+        self.network._passive_beliefs[self.index] = self.network._from_probability(value)
+
+class ENetworkStateForBinomialUpdating():
+    def __init__(self,
+                 rng: np.random.Generator,
+                 scientist_popcount: int,
+                 scientist_network_type: ENetworkType,
+                 n_per_round: int,
+                 epsilon: float,
+                 scientist_stop_threshold: float,
+                 passive_updaters_config: Optional[ENPassiveUpdatersConfig],
+                 selective_propagandist_active: bool,
+                 credence_representation: ENCredenceRepresentation = ENCredenceRepresentation.PROBABILITY,
+                 network_config: Optional[ENetworkConfig] = None,
+                 outcome_stream: ENOutcomeStream = ENOutcomeStream.PER_CALL,
+                 observer_variants: Sequence[ENObserverVariant] = ()):
+        self.rng = rng
+        self.scientist_popcount = scientist_popcount
+        self.scientist_network_type = scientist_network_type
+        self.network_config = network_config
+        self.epsilon = epsilon
+        self.p = 0.5 + epsilon
+        self.credence_representation = credence_representation
+        self._likelihood_ratios_init(n_per_round)
+        # Beliefs are credences or log-odds, depending on the representation
+        # Same draws as the scientists' priors in ENetworkForBinomialUpdating
+        self._beliefs = self._from_probabilities(rng.uniform(0.001, size=scientist_popcount))
+        self.stop_thresholds = np.full(scientist_popcount, scientist_stop_threshold)
+        self._stop_beliefs = self._from_probabilities(self.stop_thresholds)
+        # The latest experiment of each scientist. Those who did not experiment have none.
+        self.k = np.zeros(scientist_popcount, dtype=np.int64)
+        self.n = np.full(scientist_popcount, n_per_round, dtype=np.int64)
+        self.experimenting = np.zeros(scientist_popcount, dtype=bool)
+        self.previous_experimenting = np.zeros(scientist_popcount, dtype=bool)
+        self._evidence = np.zeros(scientist_popcount, dtype=np.int64)
+        self._previous_evidence = np.zeros(scientist_popcount, dtype=np.int64)
+        self._influencers_init()
+        self._passive_beliefs: Optional[np.ndarray] = None
+        self._passive_influencer_count = 0
+        if passive_updaters_config and passive_updaters_config.updater_count > 0:
+            self._passive_updaters_init(passive_updaters_config)
+        self.selective_propagandist_active = selective_propagandist_active
+        # Each observer variant's passive updaters start from the same priors (see ENObserverVariant)
+        self.observer_variants = list(observer_variants)
+        self._variant_passive_beliefs = [self._passive_beliefs.copy() for _ in observer_variants
+                                         if self._passive_beliefs is not None]
+        self._shares_evidence = selective_propagandist_active or any(variant.selective_propagandist_active
+                                                                     for variant in observer_variants)
+        self.shared_evidence = SharedEvidence(0, 0)
+        self.outcomes = ENBinomialOutcomes(rng, n_per_round, self.p, scientist_popcount, outcome_stream)
+        self.credence_bands: Optional[ENCredenceBands] = None
+
+    ## Init helpers
+    def _likelihood_ratios_init(self, n_per_round: int):
+        self._likelihood_ratio_list, self._likelihood_ratios = likelihood_ratio_table(n_per_round, self.p)
+        self._evidence_offset = n_per_round
+        # Then a prior of 0 would give 0 / 0 rather than the scalar formula's 0
+        self._vanishing_ratios = bool((self._likelihood_ratios == 0).any())
+        self._log_likelihood_ratio = math.log(self.p / (1 - self.p))
+
+    def _influencers_init(self):
+        (self._influencer_owner,
+         self._influencers,
+         self._current_round_influencer,
+         self._influencer_positions) = influencer_tables(self.scientist_popcount,
+                                                          self.scientist_network_type,
+                                                          self.network_config)
+
+    def _passive_updaters_init(self, passive_updaters_config: ENPassiveUpdatersConfig):
+        priors = self.rng.uniform(passive_updaters_config.min_prior,
+                                  passive_updaters_config.max_prior,
+                                  size=passive_updaters_config.updater_count)
+        self._passive_beliefs = self._from_probabilities(priors)
+        self._passive_influencer_count = min(passive_updaters_config.scientist_influencer_count,
+                                             self.scientist_popcount)
+
+    def __getstate__(self) -> dict:
+        # Ship the state only. The influencer tables and likelihood ratios are rebuilt on arrival.
+        state = self.__dict__.copy()
+        for derived in DERIVED_ATTRIBUTES:
+            del state[derived]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._likelihood_ratios_init(int(self.n[0]))
+        self._influencers_init()
+
+    ## Interface
+    @property
+    def credences(self) -> np.ndarray:
+        """ Read-only; in the probability representation, this is the state itself."""
+        return self._to_probabilities(self._beliefs)
+
+    @property
+    def passive_credences(self) -> np.ndarray:
+        if self._passive_beliefs is None:
+            return np.empty(0)
+        return self._to_probabilities(self._passive_beliefs)
+
+    @property
+    def scientists(self) -> List[ENScientistView]:
+        return [ENScientistView(self, i) for i in range(self.scientist_popcount)]
+
+    @property
+    def passive_updaters(self) -> List[ENPassiveUpdaterView]:
+        count = 0 if self._passive_beliefs is None else len(self._passive_beliefs)
+        return [ENPassiveUpdaterView(self, i) for i in range(count)]
+
+    def enetwork_play_round(self):
+        self._experiment()
+        self._update_scientists()
+        if self._shares_evidence:
+            self._collect_shared_evidence()
+        if self._passive_beliefs is not None:
+            self._update_passive_updaters()
+        if self.credence_bands:
+            self._count_credence_bands()
+
+    def track_credence_bands(self, bands: ENCredenceBands):
+        """ Count the scientists' credences into bands, and recount them after every round."""
+        self.credence_bands = bands
+        self._count_credence_bands()
+
+    def passive_updaters_avg_credence(self) -> Optional[float]:
+        if self._passive_beliefs is None:
+            return None
+        return np.mean(self.passive_credences)
+
+    def variant_passive_updaters_avg_credences(self) -> List[Optional[float]]:
+        if not self._variant_passive_beliefs:
+            return [None] * len(self.observer_variants)
+        return [np.mean(self._to_probabilities(beliefs)) for beliefs in self._variant_passive_beliefs]
+
+    ## Private methods
+    def _count_credence_bands(self):
+        # Every belief may have changed, and vectorized comparisons beat tracking which did
+        self.credence_bands.recount(self._beliefs, self.credence_representation == ENCredenceRepresentation.LOG_ODDS)
+
+    def _experiment(self):
+        self._evidence, self._previous_evidence = self._previous_evidence, self._evidence
+        self.previous_experimenting = self.experimenting
+        self.experimenting = self._beliefs >= self._stop_beliefs
+        self.outcomes.start_round()
+        self.k[self.experimenting] = self.outcomes.draw_round(self.experimenting)
+        np.subtract(2 * self.k, self.n, out=self._evidence)
+        self._evidence[~self.experimenting] = 0
+
+    def _update_scientists(self):
+        influencers = self._influencers
+        current = self._current_round_influencer
+        evidence = np.where(current, self._evidence[influencers], self._previous_evidence[influencers])
+        match self.credence_representation:
+            case ENCredenceRepresentation.PROBABILITY:
+                has_experiment = np.where(current,
+                                          self.experimenting[influencers],
+                                          self.previous_experimenting[influencers])
+                ratios = self._likelihood_ratios[evidence + self._evidence_offset]
+                with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+                    for owners, entries in self._influencer_positions:
+                        priors = self._beliefs if owners is None else self._beliefs[owners]
+                        posteriors = self._posteriors(priors, ratios[entries])
+                        posteriors = np.where(has_experiment[entries], posteriors, priors)
+                        if owners is None:
+                            self._beliefs = posteriors
+                        else:
+                            self._beliefs[owners] = posteriors
+            case ENCredenceRepresentation.LOG_ODDS:
+                # Those who did not experiment contribute 0.
+                totals = np.bincount(self._influencer_owner, weights=evidence, minlength=self.scientist_popcount)
+                self._beliefs += totals * self._log_likelihood_ratio
+
+    def _collect_shared_evidence(self):
+        # SelectiveSharingPropagandist shares the experiments with k/n < 0.5.
+        shared = self._evidence < 0
+        self._shared = np.flatnonzero(shared)
+        self.shared_evidence = SharedEvidence(len(self._shared), int(self._evidence[shared].sum()))
+
+    def _update_passive_updaters(self):
+        self._passive_beliefs = self._passive_posteriors(self._passive_beliefs,
+                                                         self._passive_influencer_count,
+                                                         self.selective_propagandist_active)
+        for i, variant in enumerate(self.observer_variants):
+            self._variant_passive_beliefs[i] = self._passive_posteriors(self._variant_passive_beliefs[i],
+                                                                        min(variant.scientist_influencer_count,
+                                                                            self.scientist_popcount),
+                                                                        variant.selective_propagandist_active)
+
+    def _passive_posteriors(self, beliefs: np.ndarray, influencer_count: int, propagandist_active: bool) -> np.ndarray:
+        influencers = np.arange(influencer_count)
+        match self.credence_representation:
+            case ENCredenceRepresentation.PROBABILITY:
+                sequence = influencers[self.experimenting[influencers]]
+                if propagandist_active:
+                    sequence = np.concatenate([sequence, self._shared])
+                offset = self._evidence_offset
+                ratios = [self._likelihood_ratio_list[e + offset] for e in self._evidence[sequence].tolist()]
+                if len(beliefs) <= SCALAR_PASSIVE_UPDATER_COUNT:
+                    # NumPy's per-call overhead dominates for a handful of updaters.
+                    scalar_beliefs = beliefs.tolist()
+                    for ratio in ratios:
+                        scalar_beliefs = [1 / (1 + ((1 - b) * ratio) / b) if b > 0 else 0. for b in scalar_beliefs]
+                    beliefs[:] = scalar_beliefs
+                    return beliefs
+                with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+                    for ratio in ratios:
+                        beliefs = self._posteriors(beliefs, ratio)
+                return beliefs
+            case ENCredenceRepresentation.LOG_ODDS:
+                evidence = int(self._evidence[influencers].sum())
+                if propagandist_active:
+                    evidence += self.shared_evidence.evidence
+                return beliefs + evidence * self._log_likelihood_ratio
+
+    def _posteriors(self, priors: np.ndarray, likelihood_ratios) -> np.ndarray:
+        """ BayesianBinomialUpdater._bayes_calculate_posterior_two_possible_worlds for each prior.
+        Callers silence the floating point warnings of priors of 0."""
+        posteriors = 1 / (1 + ((1 - priors) * likelihood_ratios) / priors)
+        if self._vanishing_ratios:
+            posteriors[priors <= 0] = 0.
+        return posteriors
+
+    def _from_probabilities(self, probabilities: np.ndarray) -> np.ndarray:
+        if self.credence_representation == ENCredenceRepresentation.LOG_ODDS:
+            # The scalar conversions of LogOddsBinomialUpdater, so the two engines agree to the last bit
+            return np.array([log_odds_from_probability(p) for p in probabilities.tolist()])
+        return probabilities.astype(np.float64)
+
+    def _to_probabilities(self, beliefs: np.ndarray) -> np.ndarray:
+        if self.credence_representation == ENCredenceRepresentation.LOG_ODDS:
+            return np.array([probability_from_log_odds(b) for b in beliefs.tolist()])
+        return beliefs
+
+    def _from_probability(self, probability: float) -> float:
+        if self.credence_representation == ENCredenceRepresentation.LOG_ODDS:
+            return log_odds_from_probability(probability)
+        return probability
+
+    def _to_probability(self, belief: float) -> float:
+        if self.credence_representation == ENCredenceRepresentation.LOG_ODDS:
+            return probability_from_log_odds(float(belief))
+        return float(belief)
+
+# The tables below only depend on a config's parameters. They are built once per process and
+# shared by its replicates, so their arrays are read-only.
+@lru_cache(maxsize=64)
+def likelihood_ratio_table(n_per_round: int, p: float) -> Tuple[List[float], np.ndarray]:
+    # ((1 - p) / p) ** (2k - n) for 2k - n in -n..n, as the scalar formula computes it
+    base = (1 - p) / p
+    ratio_list = [_float_power(base, e) for e in range(-n_per_round, n_per_round + 1)]
+    return ratio_list, _read_only(np.array(ratio_list))
+
+@lru_cache(maxsize=64)
+def influencer_tables(popcount: int,
+                       network_type: ENetworkType,
+                       network_config: Optional[ENetworkConfig]) -> Tuple[np.ndarray, np.ndarray, np.ndarray,
+                                                                           List[Tuple[Optional[np.ndarray], np.ndarray]]]:
+    topology = shared_topology(popcount, network_type, network_config)
+    offsets = topology.offsets
+    degrees = np.diff(offsets)
+    owners = np.repeat(np.arange(popcount), degrees)
+    influencers = topology.indices.astype(np.int64)
+    # Influencers at or before a scientist in the list have already experimented this round.
+    current_round_influencer = influencers <= owners
+    # The entries of the t-th influencer of every scientist that has one
+    positions = []
+    for t in range(int(degrees.max(initial=0))):
+        position_owners = np.flatnonzero(degrees > t)
+        # None stands for every scientist, which saves a gather and a scatter.
+        positions.append((None if len(position_owners) == popcount else _read_only(position_owners),
+                          _read_only(offsets[position_owners] + t)))
+    return _read_only(owners), _read_only(influencers), _read_only(current_round_influencer), positions
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+def _float_power(base: float, exponent: int) -> float:
+    try:
+        return base ** exponent
+    except OverflowError:
+        return math.inf
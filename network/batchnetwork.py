@@ -0,0 +1,158 @@
+from network.topology import shared_topology
+from sim.sim_models import *
+import numpy as np
+from typing import List, Optional, Sequence
+
+class ENetworkBatchForBinomialUpdating():
+    """ Vectorized counterpart of ENetworkForBinomialUpdating. Holds sim_count independent
+    replicates of the same network: credences are a (sim_count, pop) array and the topology is a
+    CSR neighbour index (network/topology.py), over which each round is a sparse gather. Complete
+    networks skip the index, since everyone sees the same pooled evidence.
+    Updates are synchronous: every active scientist experiments, then everyone updates on the
+    round's evidence."""
+    def __init__(self,
+                 rng: np.random.Generator,
+                 sim_count: int,
+                 scientist_popcount: int,
+                 scientist_network_type: ENetworkType,
+                 n_per_round: int,
+                 epsilon: float,
+                 scientist_stop_threshold: float,
+                 passive_updaters_config: Optional[ENPassiveUpdatersConfig],
+                 selective_propagandist_active: bool,
+                 credence_representation: ENCredenceRepresentation = ENCredenceRepresentation.PROBABILITY,
+                 network_config: Optional[ENetworkConfig] = None,
+                 observer_variants: Sequence[ENObserverVariant] = ()):
+        self.rng = rng
+        self.credence_representation = credence_representation
+        self.scientist_popcount = scientist_popcount
+        self.scientist_network_type = scientist_network_type
+        self.n_per_round = n_per_round
+        self.p = 0.5 + epsilon # hypothesis
+        self.scientist_stop_threshold = scientist_stop_threshold
+        # Beliefs are held in the chosen representation; credences converts them when read.
+        # Same prior distribution as the object graph: uniform on [0.001, 1).
+        self._beliefs = self._from_probabilities(rng.uniform(0.001, size=(sim_count, scientist_popcount)))
+        self.topology = None
+        if scientist_network_type != ENetworkType.COMPLETE:
+            self.topology = shared_topology(scientist_popcount, scientist_network_type, network_config)
+        self._passive_beliefs: Optional[np.ndarray] = None
+        self.passive_influencers: Optional[np.ndarray] = None
+        if passive_updaters_config and passive_updaters_config.updater_count > 0:
+            self._passive_updaters_init(passive_updaters_config, sim_count)
+        self.selective_propagandist_active = selective_propagandist_active
+        # Each observer variant's passive updaters start from the same priors (see ENObserverVariant)
+        self.observer_variants = list(observer_variants)
+        self._variant_passive_beliefs: List[np.ndarray] = []
+        self._variant_passive_influencers: List[np.ndarray] = []
+        if self._passive_beliefs is not None:
+            for variant in observer_variants:
+                self._variant_passive_beliefs.append(self._passive_beliefs.copy())
+                influencers = np.zeros(scientist_popcount, dtype=bool)
+                influencers[:variant.scientist_influencer_count] = True
+                self._variant_passive_influencers.append(influencers)
+
+    ## Init helpers
+    def _passive_updaters_init(self, passive_updaters_config: ENPassiveUpdatersConfig, sim_count: int):
+        priors = self.rng.uniform(passive_updaters_config.min_prior,
+                                  passive_updaters_config.max_prior,
+                                  size=(sim_count, passive_updaters_config.updater_count))
+        self._passive_beliefs = self._from_probabilities(priors)
+        self.passive_influencers = np.zeros(self.scientist_popcount, dtype=bool)
+        self.passive_influencers[:passive_updaters_config.scientist_influencer_count] = True
+
+    ## Interface
+    @property
+    def credences(self) -> np.ndarray:
+        return self._to_probabilities(self._beliefs)
+
+    @property
+    def passive_credences(self) -> Optional[np.ndarray]:
+        if self._passive_beliefs is None:
+            return None
+        return self._to_probabilities(self._passive_beliefs)
+
+    def enetwork_play_round(self):
+        experimenting = self.credences >= self.scientist_stop_threshold
+        k = self.rng.binomial(self.n_per_round, self.p, size=self.credences.shape)
+        # (2k - n) is all a two-world Bayes update needs from an experiment.
+        evidence = np.where(experimenting, 2 * k - self.n_per_round, 0)
+        self._beliefs = self._bayes_update(self._beliefs, self._neighbour_evidence(evidence))
+        if self._passive_beliefs is None:
+            return
+        self._passive_beliefs = self._passive_posteriors(self._passive_beliefs,
+                                                         evidence,
+                                                         self.passive_influencers,
+                                                         self.selective_propagandist_active)
+        for i, variant in enumerate(self.observer_variants):
+            self._variant_passive_beliefs[i] = self._passive_posteriors(self._variant_passive_beliefs[i],
+                                                                        evidence,
+                                                                        self._variant_passive_influencers[i],
+                                                                        variant.selective_propagandist_active)
+
+    def passive_updaters_avg_credence(self) -> Optional[np.ndarray]:
+        if self._passive_beliefs is None:
+            return None
+        return self.passive_credences.mean(axis=1)
+
+    def variant_passive_updaters_avg_credences(self) -> List[Optional[np.ndarray]]:
+        if not self._variant_passive_beliefs:
+            return [None] * len(self.observer_variants)
+        return [self._to_probabilities(beliefs).mean(axis=1) for beliefs in self._variant_passive_beliefs]
+
+    def keep_sims(self, keep: np.ndarray):
+        """ Drop the replicates where keep is False."""
+        self._beliefs = self._beliefs[keep]
+        if self._passive_beliefs is not None:
+            self._passive_beliefs = self._passive_beliefs[keep]
+        self._variant_passive_beliefs = [beliefs[keep] for beliefs in self._variant_passive_beliefs]
+
+    ## Private methods
+    def _neighbour_evidence(self, evidence: np.ndarray) -> np.ndarray:
+        if self.topology is None:
+            return evidence.sum(axis=1, keepdims=True)
+        return self.topology.neighbour_sums(evidence)
+
+    def _passive_posteriors(self,
+                            beliefs: np.ndarray,
+                            evidence: np.ndarray,
+                            influencers: np.ndarray,
+                            propagandist_active: bool) -> np.ndarray:
+        passive_evidence = evidence[:, influencers].sum(axis=1)
+        if propagandist_active:
+            # The propagandist shares every experiment with k/n < 0.5, i.e. 2k - n < 0.
+            passive_evidence += np.where(evidence < 0, evidence, 0).sum(axis=1)
+        return self._bayes_update(beliefs, passive_evidence[:, np.newaxis])
+
+    def _bayes_update(self, beliefs: np.ndarray, evidence: np.ndarray) -> np.ndarray:
+        match self.credence_representation:
+            case ENCredenceRepresentation.PROBABILITY:
+                return bayes_posteriors_two_possible_worlds(beliefs, evidence, self.p)
+            case ENCredenceRepresentation.LOG_ODDS:
+                return beliefs + evidence * np.log(self.p / (1 - self.p))
+
+    def _from_probabilities(self, probabilities: np.ndarray) -> np.ndarray:
+        if self.credence_representation == ENCredenceRepresentation.LOG_ODDS:
+            return log_odds_from_probabilities(probabilities)
+        return probabilities
+
+    def _to_probabilities(self, beliefs: np.ndarray) -> np.ndarray:
+        if self.credence_representation == ENCredenceRepresentation.LOG_ODDS:
+            return probabilities_from_log_odds(beliefs)
+        return beliefs
+
+def bayes_posteriors_two_possible_worlds(priors: np.ndarray, evidence: np.ndarray, p: float) -> np.ndarray:
+    """ Vectorized BayesianBinomialUpdater._bayes_calculate_posterior_two_possible_worlds, where
+    evidence is the summed (2k - n) of all experiments the updater sees this round. Applying the
+    aggregate once is equivalent to updating on each experiment in turn."""
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        posteriors = 1 / (1 + ((1 - priors) * ((1 - p) / p) ** evidence) / priors)
+    return np.where(priors > 0, posteriors, 0.)
+
+def log_odds_from_probabilities(probabilities: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore'):
+        return np.log(probabilities) - np.log1p(-probabilities)
+
+def probabilities_from_log_odds(log_odds: np.ndarray) -> np.ndarray:
+    with np.errstate(over='ignore'):
+        return 1 / (1 + np.exp(-log_odds))
@@ -1,10 +1,15 @@
 from agents.binomialethicalscientist import BinomialEthicalScientist
 from agents.bayesianupdaters.bayesianbinomialupdater import BayesianBinomialUpdater
+from agents.bayesianupdaters.logoddsbinomialupdater import LogOddsBinomialUpdater
+from agents.logoddsethicalscientist import LogOddsBinomialEthicalScientist
 from agents.experimenters.binomialexperimenter import BinomialExperiment
 from agents.selective_sharing_propagandist import SelectiveSharingPropagandist
+from network.outcomes import ENBinomialOutcomes
+from network.topology import shared_topology
 from sim.sim_models import *
+from sim.stopconditions import ENCredenceBands
 import numpy as np
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 class ENetworkForBinomialUpdating():
     def __init__(self,
@@ -15,10 +20,30 @@ class ENetworkForBinomialUpdating():
                  epsilon: float,
                  scientist_stop_threshold: float,
                  passive_updaters_config: Optional[ENPassiveUpdatersConfig],
-                 selective_propagandist_active: bool):
+                 selective_propagandist_active: bool,
+                 credence_representation: ENCredenceRepresentation = ENCredenceRepresentation.PROBABILITY,
+                 network_config: Optional[ENetworkConfig] = None,
+                 outcome_stream: ENOutcomeStream = ENOutcomeStream.PER_CALL,
+                 complete_network_updating: ENCompleteNetworkUpdating = ENCompleteNetworkUpdating.PER_INFLUENCER,
+                 observer_variants: Sequence[ENObserverVariant] = ()):
         self.scientist_popcount = scientist_popcount
         self.scientist_network_type = scientist_network_type
-        self.scientists = [BinomialEthicalScientist(
+        self.network_config = network_config
+        self.complete_network_updating = complete_network_updating
+        # Then the network updates the scientists itself, on pooled evidence (see _update_complete_network)
+        self._pooled_updating = (scientist_network_type == ENetworkType.COMPLETE
+                                 and complete_network_updating != ENCompleteNetworkUpdating.PER_INFLUENCER)
+        # Last round's 2k - n of each scientist, 0 for those who did not experiment
+        self._previous_evidence = [0] * scientist_popcount
+        self._previous_experimented = [False] * scientist_popcount
+        match credence_representation:
+            case ENCredenceRepresentation.PROBABILITY:
+                scientist_class = BinomialEthicalScientist
+                self._passive_updater_class = BayesianBinomialUpdater
+            case ENCredenceRepresentation.LOG_ODDS:
+                scientist_class = LogOddsBinomialEthicalScientist
+                self._passive_updater_class = LogOddsBinomialUpdater
+        self.scientists = [scientist_class(
             rng,
             n_per_round,
             epsilon,
@@ -27,13 +52,25 @@ class ENetworkForBinomialUpdating():
             # Uniform function is half-open: includes low, excludes high. 
             # TODO: Wouldn't it be a good idea to exclude 0 as well? 
             ) for _ in range(scientist_popcount)]
+        self.outcomes = ENBinomialOutcomes(rng, n_per_round, 0.5 + epsilon, scientist_popcount, outcome_stream)
+        for i, scientist in enumerate(self.scientists):
+            scientist.draw_outcomes_from(self.outcomes, i)
         self._structure_scientific_network(self.scientists, scientist_network_type)
         self.passive_updaters: list[BayesianBinomialUpdater] = []
+        self._passive_priors: List[float] = []
         if passive_updaters_config:
             self._passive_udpaters_init(passive_updaters_config, epsilon, rng)
-        self.propagandist = SelectiveSharingPropagandist() if selective_propagandist_active else None
+        self.propagandist = SelectiveSharingPropagandist(n_per_round) if selective_propagandist_active else None
         if self.propagandist:
             self._propagandist_init(self.propagandist)
+        # The passive updaters of each observer variant, and a propagandist for the variants if this
+        # network has none
+        self.variant_passive_updaters: List[List[BayesianBinomialUpdater]] = []
+        self._variant_propagandist: Optional[SelectiveSharingPropagandist] = None
+        if observer_variants:
+            self._observer_variants_init(observer_variants, passive_updaters_config, n_per_round, epsilon)
+        # Kept up to date by the scientists once tracked (see track_credence_bands)
+        self.credence_bands: Optional[ENCredenceBands] = None
 
     ## Init helpers
     def _structure_scientific_network(self,
@@ -41,21 +78,28 @@ class ENetworkForBinomialUpdating():
                                       network_type: ENetworkType):
         match network_type:
             case ENetworkType.COMPLETE:
+                if self._pooled_updating:
+                    return
                 for updater in bayes_updaters:
                     self._add_all_bayes_influencers_for_updater(updater, bayes_updaters)
             case ENetworkType.CYCLE:
                 for i, updater in enumerate(bayes_updaters):
                     self._add_cycle_bayes_influencers_for_updater(updater, i, bayes_updaters)
             case _:
-                print("Invalid. All ENetworkType need to be specifically matched.")
-                raise NotImplementedError
+                topology = shared_topology(self.scientist_popcount, network_type, self.network_config)
+                for i, updater in enumerate(bayes_updaters):
+                    for j in topology.neighbours(i):
+                        updater.add_bayes_influencer(bayes_updaters[j])
 
     def _passive_udpaters_init(self,
                                passive_updaters_config: ENPassiveUpdatersConfig,
                                epsilon: float,
                                rng: np.random.Generator):
         for _ in range(passive_updaters_config.updater_count):
-            self._add_passive_updater(passive_updaters_config, epsilon, rng)
+            self._passive_priors.append(rng.uniform(passive_updaters_config.min_prior,
+                                                    passive_updaters_config.max_prior))
+        for prior in self._passive_priors:
+            self._add_passive_updater(epsilon, prior)
         if not self.passive_updaters:
             return
         for updater in self.passive_updaters:
@@ -69,20 +113,103 @@ class ENetworkForBinomialUpdating():
             self._add_propagandist_influencer_for_passive_updaters(propagandist,
                                                                    self.passive_updaters)
 
+    def _observer_variants_init(self,
+                                observer_variants: Sequence[ENObserverVariant],
+                                passive_updaters_config: Optional[ENPassiveUpdatersConfig],
+                                n_per_round: int,
+                                epsilon: float):
+        propagandist = self.propagandist
+        if not propagandist and any(variant.selective_propagandist_active for variant in observer_variants):
+            propagandist = self._variant_propagandist = SelectiveSharingPropagandist(n_per_round)
+            self._add_scientist_pool_for_propagandist(propagandist)
+        for variant in observer_variants:
+            updaters = [self._passive_updater_class(epsilon=epsilon, prior=prior) for prior in self._passive_priors]
+            if passive_updaters_config:
+                config = passive_updaters_config._replace(scientist_influencer_count=variant.scientist_influencer_count)
+                for updater in updaters:
+                    self._add_bayes_influencers_for_passive_updater(updater, config, self.scientists)
+            if variant.selective_propagandist_active:
+                self._add_propagandist_influencer_for_passive_updaters(propagandist, updaters)
+            self.variant_passive_updaters.append(updaters)
+
     ## Interface
     def enetwork_play_round(self):
+        self.outcomes.start_round()
         for scientist in self.scientists:
             scientist.decide_round_research_action()
+        if self._pooled_updating:
+            self._update_complete_network()
+        if self.propagandist:
+            self.propagandist.collect_round_evidence()
+        if self._variant_propagandist:
+            self._variant_propagandist.collect_round_evidence()
         if self.passive_updaters:
             for passive_updater in self.passive_updaters:
                 passive_updater.bayes_update_credence()
+        for updaters in self.variant_passive_updaters:
+            for passive_updater in updaters:
+                passive_updater.bayes_update_credence()
+
+    def track_credence_bands(self, bands: ENCredenceBands):
+        """ Count the scientists' credences into bands, and keep the counts up to date as the
+        scientists update."""
+        self.credence_bands = bands
+        for scientist in self.scientists:
+            scientist.track_credence_bands(bands)
+
+    @property
+    def credences(self) -> np.ndarray:
+        return np.array([a.credence for a in self.scientists])
+
+    @property
+    def passive_credences(self) -> np.ndarray:
+        return np.array([a.credence for a in self.passive_updaters])
 
     def passive_updaters_avg_credence(self) -> Optional[float]:
         if not self.passive_updaters:
             return None
         return np.mean([a.credence for a in self.passive_updaters])
+
+    def variant_passive_updaters_avg_credences(self) -> List[Optional[float]]:
+        return [np.mean([a.credence for a in updaters]) if updaters else None
+                for updaters in self.variant_passive_updaters]
         
     ## Private methods
+    def _update_complete_network(self) -> int:
+        """ Update every scientist of a complete network once, on the pooled evidence it has seen this
+        round, in O(N). A scientist's credence only changes in its own turn, so its research decision
+        does not depend on the updates of the scientists before it, and all of them can be taken first.
+        Return how many experiments the scientists updated on, for profiling."""
+        experiments = [scientist.get_experiment_data() for scientist in self.scientists]
+        evidence = [2 * experiment.k - experiment.n if experiment else 0 for experiment in experiments]
+        experimented = [experiment is not None for experiment in experiments]
+        updates = 0
+        match self.complete_network_updating:
+            case ENCompleteNetworkUpdating.SEQUENTIAL:
+                # Scientist i sees this round's experiments of scientists 0..i and last round's of the rest.
+                pooled = sum(self._previous_evidence)
+                seen = sum(self._previous_experimented)
+                for i, scientist in enumerate(self.scientists):
+                    pooled += evidence[i] - self._previous_evidence[i]
+                    seen += experimented[i] - self._previous_experimented[i]
+                    if seen:
+                        scientist.bayes_update_credence_on_evidence(pooled)
+                        if self.credence_bands:
+                            scientist.move_credence_band()
+                        updates += seen
+            case ENCompleteNetworkUpdating.SYNCHRONOUS:
+                pooled = sum(evidence)
+                seen = sum(experimented)
+                if seen:
+                    for scientist in self.scientists:
+                        scientist.bayes_update_credence_on_evidence(pooled)
+                        if self.credence_bands:
+                            scientist.move_credence_band()
+                    updates = seen * len(self.scientists)
+        self._previous_evidence = evidence
+        self._previous_experimented = experimented
+        return updates
+
     # TODO: The influencer logic can probably be made more generic
     def _add_all_bayes_influencers_for_updater(self,
                                           updater: BinomialEthicalScientist,
@@ -106,14 +233,8 @@ class ENetworkForBinomialUpdating():
             if len(experimenters) > i:
                 updater.add_bayes_influencer(experimenters[i])
 
-    def _add_passive_updater(self,
-                             passive_updaters_config: ENPassiveUpdatersConfig,
-                             epsilon: float,
-                             rng: np.random.Generator):
-        min_p = passive_updaters_config.min_prior
-        max_p = passive_updaters_config.max_prior
-        updater = BayesianBinomialUpdater(epsilon=epsilon,
-                                          prior=rng.uniform(min_p, max_p))
+    def _add_passive_updater(self, epsilon: float, prior: float):
+        updater = self._passive_updater_class(epsilon=epsilon, prior=prior)
         if self.passive_updaters:
             self.passive_updaters.append(updater)
         else:
@@ -0,0 +1,84 @@
+import numpy as np
+from sim.sim_models import *
+from typing import List
+
+""" The binomial outcomes of a replicate's experiments, pre-drawn in blocks. A scalar
+rng.binomial call costs far more than the draw itself, while one call with size=m draws exactly what
+m scalar calls would, continuing the same stream. So the outcomes only depend on the layout
+(ENOutcomeStream) and never on the block sizes. Blocks are drawn when the first outcome of a
+block is needed, which is after everything the network draws while it is built."""
+
+# Blocks start at this many rounds of outcomes and double up to the maximum, so that short
+# replicates draw few outcomes they never use.
+FIRST_BLOCK_ROUNDS = 16
+MAX_BLOCK_ROUNDS = 256
+
+class ENBinomialOutcomes():
+    def __init__(self,
+                 rng: np.random.Generator,
+                 n: int,
+                 p: float,
+                 scientist_count: int,
+                 layout: ENOutcomeStream):
+        self.rng = rng
+        self.n = n
+        self.p = p
+        self.scientist_count = scientist_count
+        self.layout = layout
+        self._block_rounds = FIRST_BLOCK_ROUNDS
+        # PER_CALL: the block's draws as Python ints, as a scalar call returns them
+        self._draws: List[int] = []
+        self._position = 0
+        # BLOCKED: the block's rounds, one row per round
+        self._rounds = np.empty((0, scientist_count), dtype=np.int64)
+        self._round = -1
+        self._round_outcomes: List[int] = []
+
+    ## Interface
+    def start_round(self):
+        """ Call at the start of every round, before any outcome of the round is drawn."""
+        if self.layout != ENOutcomeStream.BLOCKED:
+            return
+        self._round += 1
+        if self._round == len(self._rounds):
+            self._rounds = self.rng.binomial(self.n, self.p, size=(self._next_block_rounds(), self.scientist_count))
+            self._round = 0
+        self._round_outcomes = self._rounds[self._round].tolist()
+
+    def draw(self, scientist: int) -> int:
+        """ The outcome of scientist's experiment this round."""
+        match self.layout:
+            case ENOutcomeStream.BLOCKED:
+                return self._round_outcomes[scientist]
+            case ENOutcomeStream.PER_CALL:
+                if self._position == len(self._draws):
+                    self._draw_block()
+                k = self._draws[self._position]
+                self._position += 1
+                return k
+
+    def draw_round(self, experimenting: np.ndarray) -> np.ndarray:
+        """ The outcomes of this round's experiments, in scientist order. experimenting is a mask."""
+        match self.layout:
+            case ENOutcomeStream.BLOCKED:
+                return self._rounds[self._round][experimenting]
+            case ENOutcomeStream.PER_CALL:
+                count = int(np.count_nonzero(experimenting))
+                outcomes: List[int] = []
+                while len(outcomes) < count:
+                    if self._position == len(self._draws):
+                        self._draw_block()
+                    taken = self._draws[self._position:self._position + count - len(outcomes)]
+                    self._position += len(taken)
+                    outcomes += taken
+                return np.array(outcomes, dtype=np.int64)
+
+    ## Private methods
+    def _draw_block(self):
+        self._draws = self.rng.binomial(self.n, self.p, size=self._next_block_rounds() * self.scientist_count).tolist()
+        self._position = 0
+
+    def _next_block_rounds(self) -> int:
+        rounds = self._block_rounds
+        self._block_rounds = min(2 * rounds, MAX_BLOCK_ROUNDS)
+        return rounds
@@ -0,0 +1,178 @@
+from sim.sim_models import *
+from functools import lru_cache
+import numpy as np
+from typing import NamedTuple, Optional
+
+class ENTopology(NamedTuple):
+    """ CSR-style neighbour index: the influencers of scientist i are
+    indices[offsets[i]:offsets[i + 1]]. Every builder in this module includes each scientist
+    among its own influencers, like the COMPLETE and CYCLE wirings of ENetworkForBinomialUpdating."""
+    offsets: np.ndarray
+    indices: np.ndarray
+
+    @property
+    def popcount(self) -> int:
+        return len(self.offsets) - 1
+
+    def neighbours(self, i: int) -> np.ndarray:
+        return self.indices[self.offsets[i]:self.offsets[i + 1]]
+
+    def neighbour_sums(self, values: np.ndarray) -> np.ndarray:
+        """ For values of shape (..., pop), sum each scientist's influencers' values as a sparse
+        gather over the index. Empty rows sum to 0."""
+        gathered = values[..., self.indices]
+        cumulative = np.zeros(values.shape[:-1] + (len(self.indices) + 1,), dtype=gathered.dtype)
+        np.cumsum(gathered, axis=-1, out=cumulative[..., 1:])
+        return cumulative[..., self.offsets[1:]] - cumulative[..., self.offsets[:-1]]
+
+def build_topology(popcount: int,
+                   network_type: ENetworkType,
+                   network_config: Optional[ENetworkConfig] = None) -> ENTopology:
+    """ Random topologies are drawn from network_config.seed, so every replicate of a config
+    shares the same graph."""
+    config = network_config or ENetworkConfig()
+    match network_type:
+        case ENetworkType.COMPLETE:
+            return complete_topology(popcount)
+        case ENetworkType.CYCLE:
+            return cycle_topology(popcount)
+        case ENetworkType.K_REGULAR:
+            return k_regular_lattice_topology(popcount, config.degree)
+        case ENetworkType.SMALL_WORLD:
+            return small_world_topology(popcount, config.degree, config.probability,
+                                        np.random.default_rng(config.seed))
+        case ENetworkType.ERDOS_RENYI:
+            return erdos_renyi_topology(popcount, config.probability, np.random.default_rng(config.seed))
+        case ENetworkType.STAR:
+            return star_topology(popcount)
+        case ENetworkType.WHEEL:
+            return wheel_topology(popcount)
+        case ENetworkType.EDGE_LIST:
+            if not config.edge_list_path:
+                raise ValueError("ENetworkType.EDGE_LIST needs ENetworkConfig.edge_list_path.")
+            return edge_list_file_topology(popcount, config.edge_list_path)
+        case _:
+            print("Invalid. All ENetworkType need to be specifically matched.")
+            raise NotImplementedError
+
+@lru_cache(maxsize=64)
+def shared_topology(popcount: int,
+                    network_type: ENetworkType,
+                    network_config: Optional[ENetworkConfig] = None) -> ENTopology:
+    """ build_topology, built once per process for all the replicates of a config. The arrays are
+    shared, and so read-only."""
+    topology = build_topology(popcount, network_type, network_config)
+    topology.offsets.flags.writeable = False
+    topology.indices.flags.writeable = False
+    return topology
+
+## Builders
+def complete_topology(popcount: int) -> ENTopology:
+    offsets = np.arange(popcount + 1, dtype=np.int64) * popcount
+    indices = np.tile(np.arange(popcount, dtype=_index_dtype(popcount)), popcount)
+    return ENTopology(offsets, indices)
+
+def cycle_topology(popcount: int) -> ENTopology:
+    # Same influencer order as _add_cycle_bayes_influencers_for_updater: i-1, i, i+1. Very small
+    # cycles keep the duplicate entries that wiring produces.
+    i = np.arange(popcount, dtype=np.int64)
+    indices = np.stack([(i - 1) % popcount, i, (i + 1) % popcount], axis=1).ravel()
+    offsets = np.arange(popcount + 1, dtype=np.int64) * 3
+    return ENTopology(offsets, indices.astype(_index_dtype(popcount)))
+
+def k_regular_lattice_topology(popcount: int, degree: int) -> ENTopology:
+    """ Ring lattice in which every scientist is linked to its degree // 2 nearest neighbours on
+    either side."""
+    if degree % 2 or not 0 < degree < popcount:
+        raise ValueError("A k-regular lattice needs an even degree between 0 and the population count.")
+    src, dst = _ring_lattice_edges(popcount, degree)
+    return topology_from_edges(popcount, src, dst)
+
+def small_world_topology(popcount: int, degree: int, rewire_probability: float, rng: np.random.Generator) -> ENTopology:
+    """ Watts-Strogatz: a k-regular ring lattice whose edges are each rewired to a uniformly random
+    target with rewire_probability. Rewired edges that duplicate an existing edge or would be a
+    self-loop are dropped."""
+    if degree % 2 or not 0 < degree < popcount:
+        raise ValueError("A small-world network needs an even degree between 0 and the population count.")
+    src, dst = _ring_lattice_edges(popcount, degree)
+    rewire = rng.random(len(src)) < rewire_probability
+    dst = dst.copy()
+    dst[rewire] = rng.integers(0, popcount, size=int(rewire.sum()))
+    return topology_from_edges(popcount, src, dst)
+
+def erdos_renyi_topology(popcount: int, edge_probability: float, rng: np.random.Generator) -> ENTopology:
+    """ G(n, p). The edge count is drawn first and the edges are then sampled as random pairs, so
+    construction is O(edges) rather than O(n^2)."""
+    possible_edges = popcount * (popcount - 1) // 2
+    edge_count = rng.binomial(possible_edges, edge_probability)
+    keys = np.empty(0, dtype=np.int64)
+    while len(keys) < edge_count:
+        missing = edge_count - len(keys)
+        a = rng.integers(0, popcount, size=missing)
+        b = rng.integers(0, popcount, size=missing)
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        new_keys = (a * popcount + b)[a != b]
+        keys = _sorted_unique(np.concatenate([keys, new_keys]))
+    # Drop the surplus at random rather than by key order
+    keys = rng.permutation(keys)[:edge_count]
+    return topology_from_edges(popcount, keys // popcount, keys % popcount)
+
+def star_topology(popcount: int) -> ENTopology:
+    """ Scientist 0 is the hub."""
+    rim = np.arange(1, popcount, dtype=np.int64)
+    return topology_from_edges(popcount, np.zeros_like(rim), rim)
+
+def wheel_topology(popcount: int) -> ENTopology:
+    """ A star whose rim, scientists 1..pop-1, also forms a cycle."""
+    rim = np.arange(1, popcount, dtype=np.int64)
+    next_on_rim = np.roll(rim, -1)
+    src = np.concatenate([np.zeros_like(rim), rim])
+    dst = np.concatenate([rim, next_on_rim])
+    return topology_from_edges(popcount, src, dst)
+
+def edge_list_file_topology(popcount: int, path: str) -> ENTopology:
+    """ Whitespace-separated pairs of 0-based scientist indices, one undirected edge per line.
+    Lines starting with # are ignored."""
+    edges = np.loadtxt(path, dtype=np.int64, comments='#', ndmin=2)
+    if edges.size == 0:
+        edges = np.empty((0, 2), dtype=np.int64)
+    if edges.shape[1] != 2:
+        raise ValueError(f'Expected two columns in the edge list {path}.')
+    if edges.size and (edges.min() < 0 or edges.max() >= popcount):
+        raise ValueError(f'The edge list {path} refers to scientists outside 0..{popcount - 1}.')
+    return topology_from_edges(popcount, edges[:, 0], edges[:, 1])
+
+def topology_from_edges(popcount: int, src: np.ndarray, dst: np.ndarray) -> ENTopology:
+    """ Build an undirected topology with self-loops from an edge list. Duplicate edges are merged
+    and each row's influencers are sorted."""
+    own = np.arange(popcount, dtype=np.int64)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    rows = np.concatenate([src, dst, own])
+    cols = np.concatenate([dst, src, own])
+    keys = _sorted_unique(rows * popcount + cols)
+    rows = keys // popcount
+    offsets = np.zeros(popcount + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=popcount), out=offsets[1:])
+    return ENTopology(offsets, (keys % popcount).astype(_index_dtype(popcount)))
+
+## Private helpers
+def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+    # Faster than np.unique for the large integer key arrays built here
+    keys = np.sort(keys)
+    if not keys.size:
+        return keys
+    first = np.empty(len(keys), dtype=bool)
+    first[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+    return keys[first]
+
+def _ring_lattice_edges(popcount: int, degree: int) -> tuple[np.ndarray, np.ndarray]:
+    i = np.arange(popcount, dtype=np.int64)
+    src = np.repeat(i, degree // 2)
+    dst = (src + np.tile(np.arange(1, degree // 2 + 1), popcount)) % popcount
+    return src, dst
+
+def _index_dtype(popcount: int) -> type:
+    # Halves the index memory for all but enormous populations
+    return np.int32 if popcount < 2 ** 31 else np.int64
@@ -0,0 +1,99 @@
+from network.batchnetwork import ENetworkBatchForBinomialUpdating
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from sim.sim_models import ENSimulationRawResults, ENStopCondition
+from sim.stopconditions import stop_condition_mask
+from sim.trajectory import ENTrajectoryRecorder
+
+class EpistemicNetworkBatchSimulation():
+    """ Runs every replicate held by an ENetworkBatchForBinomialUpdating at once. Replicates
+    leave the active set as soon as they meet the stop conditions of
+    EpistemicNetworkSimulation._sim_action."""
+    def __init__(self,
+                 epistemic_network: ENetworkBatchForBinomialUpdating,
+                 maxrounds: int,
+                 low_stop: float,
+                 high_stop: float,
+                 trajectory_recorders: Optional[Dict[int, ENTrajectoryRecorder]] = None,
+                 stop_conditions: Sequence[ENStopCondition] = ()):
+        self.epistemic_network = epistemic_network
+        self._low_stop = low_stop
+        self._maxrounds = maxrounds
+        self._high_stop = high_stop
+        self._stop_conditions = tuple(stop_conditions)
+        sim_count = epistemic_network.credences.shape[0]
+        # Keyed by replicate id; a recorder is dropped once its replicate has finished
+        self._recorders = dict(trajectory_recorders or {})
+        self.results: List[Optional[ENSimulationRawResults]] = [None] * sim_count
+
+    def run_sim(self):
+        # Replicate ids of the rows still held by the network
+        active = np.arange(len(self.results))
+        for sim_round in range(1, self._maxrounds + 1):
+            if self._recorders:
+                self._record(sim_round, active)
+            active = self._sim_action(sim_round, active)
+            if not active.size:
+                return
+            self.epistemic_network.enetwork_play_round()
+        if self._recorders:
+            # Rows hold the state at the start of a round. Out of rounds, the last round was played.
+            self._finish_recorders(self._maxrounds + 1, active, np.ones(len(active), dtype=bool))
+        for sim_id in active:
+            self.results[sim_id] = ENSimulationRawResults(None, None, self._maxrounds, None)
+
+    def _sim_action(self, sim_round: int, active: np.ndarray) -> np.ndarray:
+        credences = self.epistemic_network.credences
+        # Everyone's credence in B is below the stop threshold. Abandon further research
+        abandoned = np.all(credences < self._low_stop, axis=1)
+        # Everyone's credence in B is above the consensus threshold. Scientific consensus reached
+        consensus = np.all(credences > self._high_stop, axis=1) & ~abandoned
+        finished = abandoned | consensus
+        stopped = np.zeros_like(finished)
+        for condition in self._stop_conditions:
+            stopped |= stop_condition_mask(condition, credences, self._low_stop, self._high_stop)
+        stopped &= ~finished
+        finished |= stopped
+        if not finished.any():
+            return active
+        if self._recorders:
+            self._finish_recorders(sim_round, active, finished)
+        p_avg_crs = self.epistemic_network.passive_updaters_avg_credence()
+        variant_p_avg_crs = self.epistemic_network.variant_passive_updaters_avg_credences()
+        for row in np.flatnonzero(abandoned):
+            self.results[active[row]] = ENSimulationRawResults(None, sim_round, sim_round, None)
+        for row in np.flatnonzero(consensus):
+            p_avg_cr = float(p_avg_crs[row]) if p_avg_crs is not None else None
+            variant_p_avg_cr = tuple(float(crs[row]) if crs is not None else None for crs in variant_p_avg_crs)
+            self.results[active[row]] = ENSimulationRawResults(sim_round, None, sim_round, p_avg_cr, variant_p_avg_cr)
+        for row in np.flatnonzero(stopped):
+            self.results[active[row]] = ENSimulationRawResults(None, None, sim_round, None)
+        self.epistemic_network.keep_sims(~finished)
+        return active[~finished]
+
+    def _record(self, sim_round: int, active: np.ndarray):
+        due = [sim_id for sim_id, recorder in self._recorders.items() if recorder.next_round == sim_round]
+        if not due:
+            return
+        credences, passive_credences = self._credences_of(active, due)
+        for j, sim_id in enumerate(due):
+            self._recorders[sim_id].record(sim_round,
+                                           credences[j],
+                                           passive_credences[j] if passive_credences is not None else None)
+
+    def _finish_recorders(self, final_round: int, active: np.ndarray, finished: np.ndarray):
+        done = [sim_id for sim_id in active[finished] if sim_id in self._recorders]
+        if not done:
+            return
+        credences, passive_credences = self._credences_of(active, done)
+        for j, sim_id in enumerate(done):
+            self._recorders.pop(sim_id).finish(final_round,
+                                               credences[j],
+                                               passive_credences[j] if passive_credences is not None else None)
+
+    def _credences_of(self, active: np.ndarray, sim_ids: List[int]):
+        # active stays sorted, as rows are only ever dropped
+        rows = np.searchsorted(active, sim_ids)
+        passive_credences = self.epistemic_network.passive_credences
+        return (self.epistemic_network.credences[rows],
+                passive_credences[rows] if passive_credences is not None else None)
@@ -0,0 +1,81 @@
+import json
+import os
+import numpy as np
+from sim.sim_models import *
+from typing import Callable, List, Optional
+
+""" Checkpoints of a sweep's completed replicate chunks, so that an interrupted sweep can resume.
+Each config has a directory named by its checkpoint key, and every chunk is saved there as soon as
+it comes back from a worker. Chunks are seeded by their replicates' spawn keys, so a resumed config
+ends up with exactly the results of an uninterrupted run. A chunk's profile, if any, is saved next to
+it as JSON."""
+
+RECORDED_MARKER = 'recorded'
+
+class ENSweepCheckpoint():
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save_chunk(self, key: str, chunk: ENSimChunkResult):
+        config_dir = self._config_dir(key)
+        os.makedirs(config_dir, exist_ok=True)
+        stop = chunk.start + len(chunk.raw_results)
+        # The chunk's simulation time is kept in the name so that resumed configs report it too.
+        path = os.path.join(config_dir, f'{chunk.start}-{stop}-{chunk.time_elapsed:.6f}.npy')
+        if chunk.profile:
+            # Written first, so that a chunk that can be seen always has its profile
+            _atomic_write_json(f'{path[:-len(".npy")]}.profile.json', chunk.profile._asdict())
+        tmp_path = f'{path}.tmp.npy'
+        np.save(tmp_path, chunk.raw_results)
+        os.replace(tmp_path, path)
+
+    def load_chunks(self,
+                    key: str,
+                    config_index: int,
+                    skip: Optional[Callable[[int], bool]] = None) -> List[ENSimChunkResult]:
+        """ The saved chunks of a config, leaving out those whose start skip returns True for."""
+        config_dir = self._config_dir(key)
+        if not os.path.isdir(config_dir):
+            return []
+        chunks = []
+        for filename in sorted(os.listdir(config_dir)):
+            if not filename.endswith('.npy') or '.tmp' in filename:
+                continue
+            name = filename[:-len('.npy')]
+            start, _, time_elapsed = name.split('-')
+            if skip and skip(int(start)):
+                continue
+            profile = None
+            profile_path = os.path.join(config_dir, f'{name}.profile.json')
+            if os.path.isfile(profile_path):
+                with open(profile_path) as f:
+                    profile = ENProfile(**json.load(f))
+            chunks.append(ENSimChunkResult(config_index,
+                                           int(start),
+                                           np.load(os.path.join(config_dir, filename)),
+                                           float(time_elapsed),
+                                           profile))
+        return chunks
+
+    def is_recorded(self, key: str) -> bool:
+        return os.path.isfile(os.path.join(self._config_dir(key), RECORDED_MARKER))
+
+    def mark_recorded(self, key: str):
+        """ The config's row has been written. Its chunks are no longer needed."""
+        config_dir = self._config_dir(key)
+        os.makedirs(config_dir, exist_ok=True)
+        with open(os.path.join(config_dir, RECORDED_MARKER), 'w'):
+            pass
+        for filename in os.listdir(config_dir):
+            if filename.endswith('.npy') or filename.endswith('.profile.json'):
+                os.remove(os.path.join(config_dir, filename))
+
+    def _config_dir(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+def _atomic_write_json(path: str, value: dict):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
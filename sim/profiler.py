@@ -0,0 +1,143 @@
+import numpy as np
+import time
+from network.arraynetwork import ENetworkStateForBinomialUpdating
+from network.network import ENetworkForBinomialUpdating
+from sim.batchsim import EpistemicNetworkBatchSimulation
+from sim.sim import EpistemicNetworkSimulation
+from sim.sim_models import *
+from typing import Callable, Optional
+
+""" Per-phase timers and counters for the simulations of a chunk (see ENProfile). The profiler
+instruments one simulation at a time by wrapping methods on its instances: the network, the agents
+(or, for ENetworkStateForBinomialUpdating, the network's per-phase methods) and the simulation
+itself. The classes are untouched, so simulations that are not profiled run exactly the code they
+always did, at no cost. In the vectorized engine there are no per-agent objects: experiments and
+propagandist filtering are not timed separately from play_round, and bayes_updates counts the
+aggregated per-round updates that changed a belief array entry."""
+
+class ENProfiler():
+    def __init__(self):
+        self.values = dict(ENProfile()._asdict())
+
+    ## Interface
+    def profile(self) -> ENProfile:
+        return ENProfile(**self.values)
+
+    def count_outcomes(self, raw_results: np.ndarray, max_rounds: int):
+        """ Count how the replicates in raw_results (EN_RAW_RESULTS_DTYPE) ended. Like
+        ENResultsAggregator.max_rounds_count, replicates ended earlier by one of the params' stop
+        conditions are in none of the counts."""
+        consensus = raw_results['consensus_round'] > 0
+        abandoned = raw_results['research_abandoned_round'] > 0
+        self.values['consensus'] += int(np.count_nonzero(consensus))
+        self.values['abandoned'] += int(np.count_nonzero(abandoned))
+        self.values['max_rounds'] += int(np.count_nonzero(~consensus & ~abandoned
+                                                          & (raw_results['final_sim_round'] >= max_rounds)))
+
+    def instrument_simulation(self, simulation: EpistemicNetworkSimulation):
+        values = self.values
+        network = simulation.epistemic_network
+        play_round = self._timed(network.enetwork_play_round, 'play_round_time')
+        def counted_play_round():
+            values['rounds_played'] += 1
+            play_round()
+        network.enetwork_play_round = counted_play_round
+        if isinstance(network, ENetworkStateForBinomialUpdating):
+            self._instrument_network_state(network)
+        else:
+            self._instrument_agents(network)
+        sim_action = simulation._sim_action
+        def timed_sim_action(sim_round: int):
+            # _sim_action also plays the round. Only the rest of it is the stop check.
+            start = time.perf_counter()
+            play_round_time = values['play_round_time']
+            sim_action(sim_round)
+            values['stop_check_time'] += (time.perf_counter() - start
+                                          - (values['play_round_time'] - play_round_time))
+        simulation._sim_action = timed_sim_action
+
+    def instrument_batch_simulation(self, simulation: EpistemicNetworkBatchSimulation):
+        values = self.values
+        network = simulation.epistemic_network
+        play_round = self._timed(network.enetwork_play_round, 'play_round_time')
+        def counted_play_round():
+            values['rounds_played'] += network.credences.shape[0]
+            play_round()
+        network.enetwork_play_round = counted_play_round
+        bayes_update = self._timed(network._bayes_update, 'bayes_update_time')
+        def counted_bayes_update(beliefs: np.ndarray, evidence: np.ndarray) -> np.ndarray:
+            values['bayes_updates'] += int(np.count_nonzero(np.broadcast_to(evidence, beliefs.shape)))
+            return bayes_update(beliefs, evidence)
+        network._bayes_update = counted_bayes_update
+        simulation._sim_action = self._timed(simulation._sim_action, 'stop_check_time')
+
+    ## Private methods
+    def _instrument_agents(self, network: ENetworkForBinomialUpdating):
+        values = self.values
+        for scientist in network.scientists:
+            scientist._experiment = self._timed(scientist._experiment, 'experiment_time')
+        for updater in network.scientists + network.passive_updaters:
+            updater.bayes_update_credence = self._counted_bayes_update(updater)
+        if network._pooled_updating:
+            update_complete_network = self._timed(network._update_complete_network, 'bayes_update_time')
+            def counted_update_complete_network() -> int:
+                updates = update_complete_network()
+                values['bayes_updates'] += updates
+                return updates
+            network._update_complete_network = counted_update_complete_network
+        if network.propagandist:
+            propagandist = network.propagandist
+            collect_round_evidence = self._timed(propagandist.collect_round_evidence, 'propagandist_time')
+            def counted_collect_round_evidence():
+                collect_round_evidence()
+                values['propagandist_experiments_shared'] += propagandist.shared_evidence.count
+            propagandist.collect_round_evidence = counted_collect_round_evidence
+
+    def _instrument_network_state(self, network: ENetworkStateForBinomialUpdating):
+        values = self.values
+        network._experiment = self._timed(network._experiment, 'experiment_time')
+        update_scientists = self._timed(network._update_scientists, 'bayes_update_time')
+        def counted_update_scientists():
+            influencers = network._influencers
+            values['bayes_updates'] += int(np.count_nonzero(np.where(network._current_round_influencer,
+                                                                     network.experimenting[influencers],
+                                                                     network.previous_experimenting[influencers])))
+            update_scientists()
+        network._update_scientists = counted_update_scientists
+        update_passive_updaters = self._timed(network._update_passive_updaters, 'bayes_update_time')
+        def counted_update_passive_updaters():
+            seen = (int(np.count_nonzero(network.experimenting[:network._passive_influencer_count]))
+                    + network.shared_evidence.count)
+            values['bayes_updates'] += seen * len(network._passive_beliefs)
+            update_passive_updaters()
+        network._update_passive_updaters = counted_update_passive_updaters
+        collect_shared_evidence = self._timed(network._collect_shared_evidence, 'propagandist_time')
+        def counted_collect_shared_evidence():
+            collect_shared_evidence()
+            values['propagandist_experiments_shared'] += network.shared_evidence.count
+        network._collect_shared_evidence = counted_collect_shared_evidence
+
+    def _timed(self, func: Callable, field: str) -> Callable:
+        values = self.values
+        def timed(*args):
+            start = time.perf_counter()
+            result = func(*args)
+            values[field] += time.perf_counter() - start
+            return result
+        return timed
+
+    def _counted_bayes_update(self, updater) -> Callable[[], None]:
+        bayes_update_credence = self._timed(updater.bayes_update_credence, 'bayes_update_time')
+        values = self.values
+        influencers = updater.bayes_influencers
+        propagandists = updater.selective_propagandist_influencers
+        def counted_bayes_update_credence():
+            values['bayes_updates'] += (sum(1 for influencer in influencers if influencer.get_experiment_data())
+                                        + sum(propagandist.shared_evidence.count for propagandist in propagandists))
+            bayes_update_credence()
+        return counted_bayes_update_credence
+
+def merge_profiles(profile: Optional[ENProfile], other: ENProfile) -> ENProfile:
+    if profile is None:
+        return other
+    return ENProfile(*(a + b for a, b in zip(profile, other)))
@@ -0,0 +1,137 @@
+import json
+import os
+import time
+from sim.serialization import to_json_value
+from sim.simresults import ENResultsAggregator
+from sim.sim_models import *
+from typing import Collection, List, Optional, Tuple
+
+""" Progress of a running sweep, from the chunks as they come back: replicates done, throughput,
+the running consensus proportion and an ETA, per config and for the whole sweep. Everything is
+computed in the parent process from the aggregators' running totals, so workers do no extra work.
+Updates come once per chunk, so smaller chunks give finer progress. Rates and ETAs only count
+replicates simulated in this run, not those resumed from a checkpoint."""
+
+class ENSweepProgress():
+    def __init__(self,
+                 configs: List[ENParams],
+                 interval: Optional[float] = 10.,
+                 status_path: Optional[str] = None):
+        self.configs = configs
+        # Seconds between printed progress reports. None prints none.
+        self.interval = interval
+        # A JSON status file, rewritten atomically with every report, for monitoring to read
+        self.status_path = status_path
+        self._start_time = time.perf_counter()
+        self._last_report: Optional[float] = None
+        self._resumed_sims = 0
+        self._resumed_rounds = 0
+        # Time, sims done and rounds done when each config's first chunk of this run came back. The
+        # config's rates are measured from there, as the time its first chunk took is unknown.
+        self._config_baselines: List[Optional[Tuple[float, int, int]]] = []
+
+    ## Interface
+    def start(self, aggregators: List[ENResultsAggregator]):
+        """ Call once the resumed chunks, if any, are in the aggregators."""
+        self._start_time = time.perf_counter()
+        self._resumed_sims = sum(aggregator.sims_done for aggregator in aggregators)
+        self._resumed_rounds = sum(aggregator.rounds_done for aggregator in aggregators)
+        self._config_baselines = [None] * len(aggregators)
+
+    def chunk_added(self, config_index: int, aggregator: ENResultsAggregator):
+        """ Call after each chunk of this run is added to its aggregator."""
+        if self._config_baselines[config_index] is None:
+            self._config_baselines[config_index] = (time.perf_counter(), aggregator.sims_done, aggregator.rounds_done)
+
+    def report(self, aggregators: List[ENResultsAggregator], finished: Collection[int], final: bool = False):
+        """ Print and write the status if a report is due, or if final."""
+        now = time.perf_counter()
+        if not final and self._last_report is not None and now - self._last_report < self._report_interval():
+            return
+        self._last_report = now
+        status = self._status(aggregators, finished, now, final)
+        if self.interval is not None:
+            self._print(status)
+        if self.status_path:
+            tmp_path = f'{self.status_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(status, f, indent=1)
+            os.replace(tmp_path, self.status_path)
+
+    ## Private methods
+    def _report_interval(self) -> float:
+        # Without printing, the status file is still kept current at this pace
+        return self.interval if self.interval is not None else 10.
+
+    def _status(self,
+                aggregators: List[ENResultsAggregator],
+                finished: Collection[int],
+                now: float,
+                final: bool) -> dict:
+        elapsed = now - self._start_time
+        configs = []
+        for i, aggregator in enumerate(aggregators):
+            config_start, baseline_sims, baseline_rounds = self._config_baselines[i] or (now, 0, 0)
+            sims_per_sec = _rate(aggregator.sims_done - baseline_sims, now - config_start)
+            configs.append({'index': i,
+                            'params': to_json_value(self.configs[i]),
+                            'finished': i in finished,
+                            'sims_done': aggregator.sims_done,
+                            'sim_count': aggregator.sim_count,
+                            'sims_per_sec': sims_per_sec,
+                            'rounds_per_sec': _rate(aggregator.rounds_done - baseline_rounds, now - config_start),
+                            'avg_rounds': aggregator.rounds_done / aggregator.sims_done if aggregator.sims_done else None,
+                            'consensus_proportion': aggregator.running_proportion_consensus_reached(),
+                            'max_rounds_proportion': (aggregator.max_rounds_count / aggregator.sims_done
+                                                      if aggregator.sims_done else None),
+                            'eta': _eta(aggregator.sim_count - aggregator.sims_done, sims_per_sec)})
+        sims_done = sum(aggregator.sims_done for aggregator in aggregators)
+        sim_count = sum(aggregator.sim_count for aggregator in aggregators)
+        sims_per_sec = _rate(sims_done - self._resumed_sims, elapsed)
+        rounds_done = sum(aggregator.rounds_done for aggregator in aggregators)
+        return {'updated': time.time(),
+                'elapsed': elapsed,
+                'finished': final,
+                'configs_finished': len(finished),
+                'config_count': len(aggregators),
+                'sims_done': sims_done,
+                'sim_count': sim_count,
+                'sims_per_sec': sims_per_sec,
+                'rounds_per_sec': _rate(rounds_done - self._resumed_rounds, elapsed),
+                'eta': _eta(sim_count - sims_done, sims_per_sec),
+                'configs': configs}
+
+    def _print(self, status: dict):
+        print(f"Progress: {status['sims_done']}/{status['sim_count']} sims, "
+              f"{status['configs_finished']}/{status['config_count']} configs | "
+              f"{status['sims_per_sec']:.1f} sims/s | {status['rounds_per_sec']:.0f} rounds/s | "
+              f"ETA {_format_seconds(status['eta'])}")
+        for config in status['configs']:
+            if config['finished'] or not config['sims_done']:
+                continue
+            print(f"  config {config['index']}: {config['sims_done']}/{config['sim_count']} sims | "
+                  f"{config['sims_per_sec']:.1f} sims/s | avg {config['avg_rounds']:.0f} rounds | "
+                  f"consensus {config['consensus_proportion']:.3f} | "
+                  f"at max rounds {config['max_rounds_proportion']:.3f} | "
+                  f"ETA {_format_seconds(config['eta'])}")
+
+def _rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.
+
+def _eta(remaining: int, per_sec: float) -> Optional[float]:
+    if remaining <= 0:
+        return 0.
+    if per_sec <= 0:
+        return None
+    return remaining / per_sec
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '?'
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}h{minutes:02d}m'
+    if minutes:
+        return f'{minutes}m{seconds:02d}s'
+    return f'{seconds}s'
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+from sim.serialization import sims_summary_from_json, to_json_value
+from sim.sim_models import *
+from typing import List, NamedTuple, Optional
+
+""" A content-addressed cache of finished configs, so that rerunning a sweep only simulates the
+configs it has not seen before. An entry is keyed by everything its results depend on: the params,
+sim count, seed entropy and options, the adaptive sampling settings, the chunk size where it
+changes the random streams, whether it was profiled, and code_version(), a hash of the simulation
+code. Each entry is a directory holding the ENSimsSummary as JSON and, optionally, the raw results.
+Reading an entry refreshes its mtime, and once the cache is over its size cap, the least recently
+used entries are evicted.
+
+Manage a cache with: python -m sim.resultcache <directory> list | invalidate [KEY ...] [--stale] | clear"""
+
+SUMMARY_FILENAME = 'summary.json'
+RAW_RESULTS_FILENAME = 'raw.npy'
+
+# Any change to these, relative to the repository root, can change results and so invalidates the
+# cache. Even edits to comments do: that costs a rerun, never a stale result.
+VERSIONED_SOURCES = ('agents', 'network', 'sim/sim.py', 'sim/batchsim.py', 'sim/simworker.py',
+                     'sim/sim_models.py', 'sim/simresults.py', 'sim/stopconditions.py')
+
+_code_version: Optional[str] = None
+
+class ENCachedConfig(NamedTuple):
+    summary: ENSimsSummary
+    sim_count: int
+    time_elapsed: float
+    raw_results: Optional[np.ndarray] # EN_RAW_RESULTS_DTYPE, None unless stored
+
+class ENCacheEntry(NamedTuple):
+    key: str
+    params: ENParams
+    sim_count: int
+    code_version: str
+    size: int # Bytes
+    last_used: float # Unix time
+
+class ENResultCache():
+    def __init__(self,
+                 directory: str,
+                 max_bytes: Optional[int] = 1 << 30,
+                 store_raw_results: bool = True):
+        self.directory = directory
+        # Least recently used entries are evicted beyond this size. None for no cap.
+        self.max_bytes = max_bytes
+        self.store_raw_results = store_raw_results
+        os.makedirs(directory, exist_ok=True)
+
+    ## Interface
+    def key(self,
+            params: ENParams,
+            sim_count: int,
+            seed_entropy: int,
+            options: ENSimOptions,
+            adaptive_sampling: Optional[ENAdaptiveSampling],
+            chunk_size: int,
+            profile: bool) -> str:
+        description = json.dumps({'params': to_json_value(params),
+                                  'sim_count': sim_count,
+                                  'seed_entropy': seed_entropy,
+                                  'options': to_json_value(options),
+                                  'adaptive_sampling': to_json_value(adaptive_sampling),
+                                  # Only the vectorized engine's results depend on the chunk size.
+                                  'chunk_size': chunk_size if options.engine == ENSimEngine.VECTORIZED else None,
+                                  'profile': profile,
+                                  'code_version': code_version()},
+                                 sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()[:20]
+
+    def get(self, key: str) -> Optional[ENCachedConfig]:
+        entry_dir = os.path.join(self.directory, key)
+        summary_path = os.path.join(entry_dir, SUMMARY_FILENAME)
+        try:
+            with open(summary_path) as f:
+                d = json.load(f)
+            os.utime(summary_path)
+        except FileNotFoundError:
+            return None
+        raw_results = None
+        raw_results_path = os.path.join(entry_dir, RAW_RESULTS_FILENAME)
+        if os.path.isfile(raw_results_path):
+            raw_results = np.load(raw_results_path)
+        return ENCachedConfig(sims_summary_from_json(d['summary']), d['sim_count'], d['time_elapsed'], raw_results)
+
+    def put(self, key: str, cached: ENCachedConfig):
+        entry_dir = os.path.join(self.directory, key)
+        tmp_dir = f'{entry_dir}.tmp-{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        if self.store_raw_results and cached.raw_results is not None:
+            np.save(os.path.join(tmp_dir, RAW_RESULTS_FILENAME), cached.raw_results)
+        with open(os.path.join(tmp_dir, SUMMARY_FILENAME), 'w') as f:
+            json.dump({'summary': to_json_value(cached.summary),
+                       'sim_count': cached.sim_count,
+                       'time_elapsed': cached.time_elapsed,
+                       'code_version': code_version()},
+                      f, indent=1)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(tmp_dir, entry_dir)
+        self._evict(keep=key)
+
+    def entries(self) -> List[ENCacheEntry]:
+        """ Every entry, least recently used first."""
+        entries = []
+        for key in os.listdir(self.directory):
+            summary_path = os.path.join(self.directory, key, SUMMARY_FILENAME)
+            if '.tmp' in key or not os.path.isfile(summary_path):
+                continue
+            with open(summary_path) as f:
+                d = json.load(f)
+            entry_dir = os.path.join(self.directory, key)
+            entries.append(ENCacheEntry(key,
+                                        sims_summary_from_json(d['summary']).params,
+                                        d['sim_count'],
+                                        d['code_version'],
+                                        sum(os.path.getsize(os.path.join(entry_dir, filename))
+                                            for filename in os.listdir(entry_dir)),
+                                        os.path.getmtime(summary_path)))
+        return sorted(entries, key=lambda entry: entry.last_used)
+
+    def invalidate(self, keys: Optional[List[str]] = None, stale: bool = False) -> int:
+        """ Remove the entries with the given keys, those of other code versions if stale, or all of
+        them if neither is given. Return how many were removed."""
+        removed = 0
+        for entry in self.entries():
+            if (keys is None and not stale) or (keys and entry.key in keys) or (stale and entry.code_version != code_version()):
+                shutil.rmtree(os.path.join(self.directory, entry.key), ignore_errors=True)
+                removed += 1
+        return removed
+
+    ## Private methods
+    def _evict(self, keep: str):
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        size = sum(entry.size for entry in entries)
+        for entry in entries:
+            if size <= self.max_bytes:
+                break
+            if entry.key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.directory, entry.key), ignore_errors=True)
+            size -= entry.size
+
+def code_version() -> str:
+    """ A hash of the simulation code (VERSIONED_SOURCES)."""
+    global _code_version
+    if _code_version is None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        digest = hashlib.sha256()
+        for source in VERSIONED_SOURCES:
+            path = os.path.join(root, source)
+            paths = [path]
+            if os.path.isdir(path):
+                paths = sorted(os.path.join(dirpath, filename)
+                               for dirpath, _, filenames in os.walk(path)
+                               for filename in filenames if filename.endswith('.py'))
+            for path in paths:
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        _code_version = digest.hexdigest()[:12]
+    return _code_version
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate a result cache.")
+    parser.add_argument('directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="list the entries, least recently used first")
+    invalidate_parser = subparsers.add_parser('invalidate', help="remove entries")
+    invalidate_parser.add_argument('keys', nargs='*')
+    invalidate_parser.add_argument('--stale', action='store_true',
+                                   help="remove the entries of other versions of the simulation code")
+    subparsers.add_parser('clear', help="remove every entry")
+    args = parser.parse_args()
+    cache = ENResultCache(args.directory, max_bytes=None)
+    match args.command:
+        case 'list':
+            for entry in cache.entries():
+                current = '' if entry.code_version == code_version() else ' (stale)'
+                print(f'{entry.key}  {entry.size / 1024:.0f} KiB  '
+                      f'{time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.last_used))}  '
+                      f'sims={entry.sim_count}{current}  {entry.params}')
+        case 'invalidate':
+            if not args.keys and not args.stale:
+                parser.error("give keys to invalidate, or --stale")
+            print(f'Removed {cache.invalidate(args.keys or None, args.stale)} entries')
+        case 'clear':
+            print(f'Removed {cache.invalidate()} entries')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import json
+import os
+import numpy as np
+from sim.serialization import config_key, options_from_json, params_from_json, to_json_value
+from sim.simresults import EN_RAW_RESULTS_DTYPE
+from sim.sim_models import *
+from typing import Dict, List, NamedTuple
+
+""" Columnar store for every replicate's ENSimulationRawResults. Each config is one .npy file of
+EN_RAW_RESULTS_DTYPE rows in replicate order, named by its config_key. manifest.json maps the keys
+to the ENParams, ENSimOptions, sim count and seed entropy that produced them. Rerunning a config
+overwrites its file instead of adding a duplicate."""
+
+MANIFEST_FILENAME = 'manifest.json'
+
+class ENStoredResults(NamedTuple):
+    key: str
+    params: ENParams
+    sim_count: int
+    seed_entropy: int
+    options: ENSimOptions
+    raw_results: np.ndarray # Memory-mapped, read-only
+
+class ENResultStore():
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    def save_config(self,
+                    params: ENParams,
+                    sim_count: int,
+                    seed_entropy: int,
+                    options: ENSimOptions,
+                    raw_results: np.ndarray) -> str:
+        """ Write a finished config's results in one go and return its key."""
+        if raw_results.dtype != EN_RAW_RESULTS_DTYPE:
+            raise ValueError("Raw results must use EN_RAW_RESULTS_DTYPE.")
+        key = config_key(params, sim_count, seed_entropy, options)
+        filename = f'{key}.npy'
+        _atomic_save(os.path.join(self.directory, filename), raw_results)
+        self._manifest[key] = {'params': to_json_value(params),
+                               'sim_count': sim_count,
+                               'seed_entropy': seed_entropy,
+                               'options': to_json_value(options),
+                               'file': filename}
+        self._write_manifest()
+        return key
+
+    def load(self) -> List[ENStoredResults]:
+        return load_result_store(self.directory)
+
+    ## Private methods
+    def _read_manifest(self) -> Dict[str, dict]:
+        path = os.path.join(self.directory, MANIFEST_FILENAME)
+        if not os.path.isfile(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)['configs']
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILENAME)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'configs': self._manifest}, f, indent=1)
+        os.replace(tmp_path, path)
+
+def load_result_store(directory: str) -> List[ENStoredResults]:
+    """ Memory-map every config in a store. Nothing is read until the arrays are used."""
+    with open(os.path.join(directory, MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)['configs']
+    return [ENStoredResults(key,
+                            params_from_json(entry['params']),
+                            entry['sim_count'],
+                            entry['seed_entropy'],
+                            options_from_json(entry['options']),
+                            np.load(os.path.join(directory, entry['file']), mmap_mode='r'))
+            for key, entry in manifest.items()]
+
+def _atomic_save(path: str, array: np.ndarray):
+    tmp_path = f'{path}.tmp.npy'
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
@@ -0,0 +1,119 @@
+import math
+import queue
+from collections import deque
+from multiprocessing.pool import Pool
+from sim.simworker import run_sim_chunk
+from sim.sim_models import *
+from typing import Dict, Iterator, List
+
+class ENSweepScheduler():
+    """ Dispatches the chunks of a whole sweep longest-expected-first, interleaving configs, so
+    that no core idles at the end of a config. Costs start from estimate_rounds_per_replicate and
+    estimate_work_per_round and are refined by the rounds and seconds of the returned chunks, which
+the caller passes to observe once their results are at hand (they may be in shared memory).
+    Only a small window of chunks is in flight at a time, so the order keeps adapting, and more tasks
+    can be added while dispatching. With cost_aware False, chunks go out in config order instead."""
+    def __init__(self, configs: List[ENParams], processes: int, cost_aware: bool = True):
+        self.configs = configs
+        self.window = 2 * processes
+        self.cost_aware = cost_aware
+        self._pending: Dict[int, deque[ENSimChunkTask]] = {}
+        self._observed_rounds: Dict[int, int] = {}
+        self._observed_sims: Dict[int, int] = {}
+        self._observed_time: Dict[int, float] = {}
+
+    def dispatch(self, pool: Pool, tasks: Iterator[ENSimChunkTask]) -> Iterator[ENSimChunkResult]:
+        self.add_tasks(tasks)
+        finished: queue.Queue = queue.Queue()
+        in_flight = 0
+        pending = self._pending
+        while pending or in_flight:
+            while pending and in_flight < self.window:
+                if self.cost_aware:
+                    # Chunks of a config share a per-replicate cost, so only each config's next chunk competes.
+                    i = max(pending, key=lambda i: self.estimated_cost(pending[i][0]))
+                else:
+                    i = min(pending)
+                task = pending[i].popleft()
+                if not pending[i]:
+                    del pending[i]
+                pool.apply_async(run_sim_chunk, (task,), callback=finished.put, error_callback=finished.put)
+                in_flight += 1
+            result = finished.get()
+            in_flight -= 1
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+
+    def add_tasks(self, tasks: Iterator[ENSimChunkTask]):
+        for task in tasks:
+            self._pending.setdefault(task.config_index, deque()).append(task)
+
+    def observe(self, chunk: ENSimChunkResult):
+        i = chunk.config_index
+        self._observed_rounds[i] = self._observed_rounds.get(i, 0) + int(chunk.raw_results['final_sim_round'].sum())
+        self._observed_sims[i] = self._observed_sims.get(i, 0) + len(chunk.raw_results)
+        self._observed_time[i] = self._observed_time.get(i, 0.) + chunk.time_elapsed
+
+    def estimated_cost(self, task: ENSimChunkTask) -> float:
+        """ Expected seconds (or, before anything has been observed, work units) for a chunk."""
+        i = task.config_index
+        return (task.stop - task.start) * self._rounds_per_replicate(i) * self._cost_per_round(i)
+
+    ## Private methods
+    def _rounds_per_replicate(self, i: int) -> float:
+        if self._observed_sims.get(i):
+            return self._observed_rounds[i] / self._observed_sims[i]
+        return estimate_rounds_per_replicate(self.configs[i])
+
+    def _cost_per_round(self, i: int) -> float:
+        work = estimate_work_per_round(self.configs[i])
+        if self._observed_rounds.get(i):
+            return self._observed_time[i] / self._observed_rounds[i]
+        # Convert work units to seconds with the rate seen over all configs so far.
+        observed_work = sum(self._observed_rounds[j] * estimate_work_per_round(self.configs[j])
+                            for j in self._observed_rounds)
+        if observed_work:
+            return work * sum(self._observed_time.values()) / observed_work
+        return work
+
+def estimate_rounds_per_replicate(params: ENParams) -> float:
+    """ Each experiment moves log-odds by about n * 2 * epsilon * log(p / (1 - p)) in expectation,
+    and a scientist sees one per influencer per round. Reaching consensus from a middling prior
+    takes a log-odds change of roughly 6."""
+    p = 0.5 + params.epsilon
+    drift = params.binom_n_per_round * 2 * params.epsilon * math.log(p / (1 - p)) * _avg_influencers(params)
+    if drift <= 0:
+        return params.max_research_rounds_allowed
+    return min(params.max_research_rounds_allowed, 1 + 6 / drift)
+
+def estimate_work_per_round(params: ENParams) -> float:
+    """ Bayes updates per round: every scientist on each influencer, and every passive updater on its
+    scientists and on what the propagandist shares, which it filters from every scientist once a round."""
+    pop = params.scientist_pop_count
+    work = pop * (1 + _avg_influencers(params))
+    passive = params.passive_updaters_config
+    if passive:
+        seen = min(passive.scientist_influencer_count, pop) + (1 if params.selective_propagandist_active else 0)
+        work += passive.updater_count * (1 + seen)
+    if params.selective_propagandist_active:
+        work += pop
+    return work
+
+def _avg_influencers(params: ENParams) -> float:
+    pop = params.scientist_pop_count
+    config = params.network_config or ENetworkConfig()
+    match params.network_type:
+        case ENetworkType.COMPLETE:
+            return pop
+        case ENetworkType.K_REGULAR | ENetworkType.SMALL_WORLD:
+            return config.degree + 1
+        case ENetworkType.ERDOS_RENYI:
+            return config.probability * (pop - 1) + 1
+        case ENetworkType.STAR:
+            return 3 - 2 / max(pop, 1)
+        case ENetworkType.WHEEL:
+            return 5 - 4 / max(pop, 1)
+        case _:
+            # CYCLE, and a guess for edge lists
+            return 3
@@ -0,0 +1,65 @@
+import hashlib
+import json
+from enum import Enum
+from sim.sim_models import *
+from typing import Any
+
+""" JSON forms of the sim models, for manifests and for keys that identify a config's results."""
+
+def to_json_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, tuple) and hasattr(value, '_asdict'):
+        return {field: to_json_value(field_value) for field, field_value in value._asdict().items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    return value
+
+def params_from_json(d: dict) -> ENParams:
+    d = dict(d)
+    d['network_type'] = ENetworkType[d['network_type']]
+    if d.get('passive_updaters_config') is not None:
+        d['passive_updaters_config'] = ENPassiveUpdatersConfig(**d['passive_updaters_config'])
+    if d.get('network_config') is not None:
+        d['network_config'] = ENetworkConfig(**d['network_config'])
+    d['stop_conditions'] = tuple(ENStopCondition[name] for name in d.get('stop_conditions', ()))
+    return ENParams(**d)
+
+def options_from_json(d: dict) -> ENSimOptions:
+    d = dict(d)
+    d['engine'] = ENSimEngine[d['engine']]
+    d['credence_representation'] = ENCredenceRepresentation[d['credence_representation']]
+    # Results saved before the outcome stream could be chosen were drawn per call
+    d['outcome_stream'] = ENOutcomeStream[d.get('outcome_stream', ENOutcomeStream.PER_CALL.name)]
+    d['complete_network_updating'] = ENCompleteNetworkUpdating[d.get('complete_network_updating',
+                                                                     ENCompleteNetworkUpdating.PER_INFLUENCER.name)]
+    return ENSimOptions(**d)
+
+def chunk_task_from_json(d: dict) -> ENSimChunkTask:
+    d = dict(d)
+    d['params'] = params_from_json(d['params'])
+    d['options'] = options_from_json(d['options'])
+    if d.get('trajectory') is not None:
+        d['trajectory'] = ENTrajectoryConfig(**d['trajectory'])
+    d['observer_variants'] = tuple(ENObserverVariant(**variant) for variant in d.get('observer_variants', ()))
+    return ENSimChunkTask(**d)
+
+def sims_summary_from_json(d: dict) -> ENSimsSummary:
+    return ENSimsSummary(params_from_json(d['params']),
+                         ENResultsSummary(**d['results_summary']),
+                         ENSamplingReport(**d['sampling_report']) if d.get('sampling_report') else None,
+                         ENProfile(**d['profile']) if d.get('profile') else None)
+
+def config_key(params: ENParams, sim_count: int, seed_entropy: int, options: ENSimOptions) -> str:
+    """ Identifies the results of a config: same key, same per-replicate results."""
+    description = json.dumps({'params': to_json_value(params),
+                              'sim_count': sim_count,
+                              'seed_entropy': seed_entropy,
+                              'options': to_json_value(options)},
+                             sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()[:20]
+
+def params_key(params: ENParams) -> str:
+    """ Identifies a parameter config on its own."""
+    description = json.dumps(to_json_value(params), sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()[:20]
@@ -0,0 +1,52 @@
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from sim.simresults import EN_RAW_RESULTS_DTYPE
+from sim.sim_models import *
+from typing import Optional
+
+""" A sweep's raw results in shared memory. The sweep allocates one block with a row of capacity
+EN_RAW_RESULTS_DTYPE replicates per config, and its aggregators keep their results in views of it.
+Workers in a process pool write each chunk into its rows and send back only an ENSimChunkResult
+with buffered_count set, so results are never pickled, and the rows go on to summaries, the result
+store and the cache without further copies."""
+
+class ENSharedResults():
+    def __init__(self, config_count: int, capacity: int, name: Optional[str] = None):
+        if name is None:
+            size = max(1, config_count * capacity * EN_RAW_RESULTS_DTYPE.itemsize)
+            self._memory = SharedMemory(create=True, size=size)
+        else:
+            # Pool workers share the resource tracker of the process that created the block, so
+            # attaching does not make them responsible for it.
+            self._memory = SharedMemory(name)
+        self.buffer = ENSharedResultsBuffer(self._memory.name, config_count, capacity)
+        self.array: Optional[np.ndarray] = np.ndarray((config_count, capacity),
+                                                      dtype=EN_RAW_RESULTS_DTYPE,
+                                                      buffer=self._memory.buf)
+
+    @classmethod
+    def attach(cls, buffer: ENSharedResultsBuffer) -> 'ENSharedResults':
+        return cls(buffer.config_count, buffer.capacity, buffer.name)
+
+    ## Interface
+    def write_chunk(self, chunk: ENSimChunkResult) -> ENSimChunkResult:
+        """ Write the chunk's results into the block and return it without them."""
+        self.array[chunk.config_index, chunk.start:chunk.start + len(chunk.raw_results)] = chunk.raw_results
+        return chunk._replace(raw_results=chunk.raw_results[:0], buffered_count=len(chunk.raw_results))
+
+    def read_chunk(self, chunk: ENSimChunkResult) -> ENSimChunkResult:
+        """ The chunk with its results as a view of the block."""
+        if not chunk.buffered_count:
+            return chunk
+        raw_results = self.array[chunk.config_index, chunk.start:chunk.start + chunk.buffered_count]
+        return chunk._replace(raw_results=raw_results, buffered_count=0)
+
+    def close(self):
+        self.array = None
+        try:
+            self._memory.close()
+        except BufferError:
+            pass # Views are still around. The mapping goes away with them.
+
+    def unlink(self):
+        self._memory.unlink()
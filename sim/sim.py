@@ -1,19 +1,28 @@
+from network.arraynetwork import ENetworkStateForBinomialUpdating
 from network.network import ENetworkForBinomialUpdating
-import numpy as np
-from typing import Optional
-from sim.sim_models import ENSimulationRawResults
+from typing import Optional, Sequence, Union
+from sim.sim_models import ENSimulationRawResults, ENStopCondition
+from sim.stopconditions import ENCredenceBands, any_stop_condition_met
+from sim.trajectory import ENTrajectoryRecorder
 
 class EpistemicNetworkSimulation():
     def __init__(self,
-                 epistemic_network: ENetworkForBinomialUpdating,
+                 epistemic_network: Union[ENetworkForBinomialUpdating, ENetworkStateForBinomialUpdating],
                  maxrounds: int,
                  low_stop: float,
-                 high_stop: float):
+                 high_stop: float,
+                 trajectory_recorder: Optional[ENTrajectoryRecorder] = None,
+                 stop_conditions: Sequence[ENStopCondition] = ()):
         self.epistemic_network = epistemic_network
         self._low_stop = low_stop
         self._maxrounds = maxrounds
         self._high_stop = high_stop
         self._sim_round = 0
+        self._recorder = trajectory_recorder
+        self._stop_conditions = tuple(stop_conditions)
+        # The network keeps the counts behind every stop check up to date
+        self._bands = ENCredenceBands(low_stop, high_stop)
+        epistemic_network.track_credence_bands(self._bands)
         self.results: Optional[ENSimulationRawResults] = None
     
     def run_sim(self):
@@ -21,26 +30,37 @@ class EpistemicNetworkSimulation():
             if self.results:
                 break
             self._sim_action(i)
-        if not self.results:
+        ran_out = not self.results
+        if ran_out:
             self.results = ENSimulationRawResults(None, None, self._sim_round, None)
+        if self._recorder:
+            # Rows hold the state at the start of a round. Out of rounds, the last round was played.
+            self._recorder.finish(self._sim_round + ran_out,
+                                  self.epistemic_network.credences,
+                                  self.epistemic_network.passive_credences)
 
     def _sim_action(self, sim_round: int):
         if self.results:
             return
         self._sim_round = sim_round
-        credences = np.array([a.credence for a in self.epistemic_network.scientists])
-        if all(credences < self._low_stop):
-            # Everyone's credence in B is below 0.5. Abandon further research
+        if self._recorder and sim_round == self._recorder.next_round:
+            self._recorder.record(sim_round, self.epistemic_network.credences, self.epistemic_network.passive_credences)
+        if self._bands.abandoned():
+            # Everyone's credence in B is below the stop threshold. Abandon further research
             self.results = ENSimulationRawResults(None, sim_round, sim_round, None)
             return
-        if all(credences > .99):
-            # Everyone's credence in B is above .99. Scientific consensus reached
+        if self._bands.consensus():
+            # Everyone's credence in B is above the consensus threshold. Scientific consensus reached
             p_avg_cr = self.epistemic_network.passive_updaters_avg_credence()
             self.results = ENSimulationRawResults(sim_round,
                                                   None,
                                                   sim_round,
-                                                  p_avg_cr)
+                                                  p_avg_cr,
+                                                  tuple(self.epistemic_network.variant_passive_updaters_avg_credences()))
             # get average credence that policymakers have when scientists reach consensus 
 
+            return
+        if self._stop_conditions and any_stop_condition_met(self._stop_conditions, self._bands):
+            self.results = ENSimulationRawResults(None, None, sim_round, None)
             return
         self.epistemic_network.enetwork_play_round()
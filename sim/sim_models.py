@@ -1,15 +1,103 @@
-from typing import Optional, NamedTuple,  List
+from typing import Optional, NamedTuple,  List, Tuple
 from enum import Enum, auto
+import numpy as np
 
 class ENetworkType(Enum):
    COMPLETE = auto()
    CYCLE = auto()
+   # Topologies below are built from an ENetworkConfig (see network/topology.py)
+   K_REGULAR = auto()
+   SMALL_WORLD = auto()
+   ERDOS_RENYI = auto()
+   STAR = auto()
+   WHEEL = auto()
+   EDGE_LIST = auto()
+
+class ENSimType(Enum):
+   ZOLLMAN_COMPLETE = auto()
+   ZOLLMAN_CYCLE = auto()
+   POLICYMAKERS_COMPLETE = auto()
+   POLICYMAKERS_CYCLE = auto()
+   PROPAGANDA_COMPLETE = auto()
+   PROPAGANDA_CYCLE = auto()
+   PROPAGANDA_CYCLE_VARY_EPSILON = auto()
+
+class ENSimEngine(Enum):
+   # One EpistemicNetworkSimulation per replicate over an object graph of agents
+   OBJECT_GRAPH = auto()
+   # All replicates of a config as NumPy arrays (EpistemicNetworkBatchSimulation)
+   VECTORIZED = auto()
+   # Like OBJECT_GRAPH, with the same results, over ENetworkStateForBinomialUpdating: the network's
+   # state in NumPy arrays, with each round vectorized over agents
+   STRUCT_OF_ARRAYS = auto()
+
+class ENOutcomeStream(Enum):
+   # How the experiments' outcomes are laid out in a replicate's random stream (network/outcomes.py).
+   # Both are drawn in blocks. ENSimEngine.VECTORIZED draws each round's outcomes for the whole batch.
+   # One draw per experiment, in the order the experiments are run: the order of the one
+   # rng.binomial call per experiment of earlier versions, which reproduces their results. The default
+   PER_CALL = auto()
+   # Outcome i of round r is draw r * scientist count + i, whether or not scientist i experiments.
+   # Opt-in: faster, but its results are not comparable replicate by replicate with PER_CALL's
+   BLOCKED = auto()
+
+class ENCompleteNetworkUpdating(Enum):
+   # How ENSimEngine.OBJECT_GRAPH updates the scientists of an ENetworkType.COMPLETE network.
+   # Every scientist updates on every influencer's experiment in turn, O(N^2) updates per round
+   PER_INFLUENCER = auto()
+   # The same information as PER_INFLUENCER (this round's experiments of the scientists up to and
+   # including oneself, last round's of the others) pooled into one update per scientist, O(N) per
+   # round. Identical results with log-odds credences; with probabilities, equal up to rounding.
+   SEQUENTIAL = auto()
+   # Everyone experiments, then everyone updates on all of the round's experiments, O(N) per round.
+   # This is how ENSimEngine.VECTORIZED always updates.
+   SYNCHRONOUS = auto()
+
+class ENStopCondition(Enum):
+   # Further conditions that end a replicate, besides abandonment and consensus (see
+   # sim/stopconditions.py). A replicate they end has neither a consensus nor an abandonment round.
+   # Every scientist is below the stop threshold or above the consensus threshold, with some of each
+   POLARIZATION = auto()
+
+class ENSweepScheduling(Enum):
+   # Configs are dispatched and written in list order
+   IN_ORDER = auto()
+   # Chunks of all configs are dispatched longest-expected-first (sim/scheduler.py) and configs are
+   # written as they finish
+   COST_AWARE = auto()
+
+class ENSweepExecutor(Enum):
+   # What runs a sweep's chunk tasks
+   # A multiprocessing pool: one interpreter per worker, with tasks and results pickled between them
+   PROCESSES = auto()
+   # A thread pool in this process: no copies and no pickling, but only code that releases the GIL,
+   # like the NumPy rounds of ENSimEngine.VECTORIZED, runs in parallel
+   THREADS = auto()
+
+class ENThresholdStatistic(Enum):
+   # What an ENThresholdSearch looks for the crossing of (see sim/thresholdsearch.py)
+   # ENResultsSummary.scientist_proportion_consensus_reached
+   PROPORTION_CONSENSUS_REACHED = auto()
+   # ENResultsSummary.passive_updaters_avg_credence
+   PASSIVE_UPDATERS_AVG_CREDENCE = auto()
+
+class ENCredenceRepresentation(Enum):
+   PROBABILITY = auto()
+   # Credence stored as log-odds, with one aggregated update per agent per round
+   LOG_ODDS = auto()
+
 class ENPassiveUpdatersConfig(NamedTuple):
     updater_count: int
     min_prior: float
     max_prior: float
     scientist_influencer_count: int
 
+class ENetworkConfig(NamedTuple):
+    degree: int = 4 # K_REGULAR, SMALL_WORLD
+    probability: float = 0.1 # SMALL_WORLD rewiring, ERDOS_RENYI edges
+    edge_list_path: Optional[str] = None # EDGE_LIST
+    seed: int = 0 # Random topologies are fixed per config
+
 class ENParams(NamedTuple):
     scientist_pop_count: int 
     network_type: ENetworkType
@@ -20,22 +108,139 @@ class ENParams(NamedTuple):
     consensus_threshold: float
     passive_updaters_config: Optional[ENPassiveUpdatersConfig] # E.g. policymakers
     selective_propagandist_active: bool
+    network_config: Optional[ENetworkConfig] = None
+    stop_conditions: Tuple[ENStopCondition, ...] = ()
 
 class ENSimulationRawResults(NamedTuple):
     consensus_round: Optional[int]
     research_abandoned_round: Optional[int]
     final_sim_round: int
     passive_updaters_avg_credence: Optional[float]
+    # The same for each ENObserverVariant simulated alongside, in order
+    variant_passive_updaters_avg_credences: Tuple[Optional[float], ...] = ()
+
+class ENObserverVariant(NamedTuple):
+    """ The observers of another config that only differs from the simulated one in what does not
+    feed back into the scientists: which scientists the passive updaters listen to, and whether there
+    is a propagandist. Its passive updaters have the same priors, so for the same seed both configs
+    have the same scientists round by round, and one simulation serves both (see ENSweep)."""
+    config_index: int
+    scientist_influencer_count: int
+    selective_propagandist_active: bool
+
+class ENAdaptiveSampling(NamedTuple):
+    """ Run a config's replicates in batches and stop once every tracked statistic's confidence
+    interval is narrow enough, within [min_sims, max_sims] replicates."""
+    # Largest half-width allowed for the consensus proportion and the passive updater credence,
+    # and, relative to the mean, for the average consensus round
+    tolerance: float
+    min_sims: int
+    max_sims: int
+    batch_size: int = 100
+    confidence: float = 0.95
+
+class ENTrajectoryConfig(NamedTuple):
+    """ Record per-round credences of every sample_every-th replicate (by replicate index), every
+    stride rounds, into memory-mapped files under directory. See sim/trajectory.py."""
+    directory: str
+    stride: int = 1
+    sample_every: int = 1
+
+class ENSimOptions(NamedTuple):
+    """ How replicates are simulated, as opposed to what is simulated (ENParams)."""
+    engine: ENSimEngine = ENSimEngine.OBJECT_GRAPH
+    credence_representation: ENCredenceRepresentation = ENCredenceRepresentation.PROBABILITY
+    outcome_stream: ENOutcomeStream = ENOutcomeStream.PER_CALL
+    complete_network_updating: ENCompleteNetworkUpdating = ENCompleteNetworkUpdating.PER_INFLUENCER
+
+class ENSharedResultsBuffer(NamedTuple):
+    """ Where workers on this machine write raw results instead of sending them back (see
+    sim/sharedresults.py): a shared memory block of config_count rows of capacity replicates."""
+    name: str
+    config_count: int
+    capacity: int
+
+class ENSimChunkTask(NamedTuple):
+    """ Replicates start..stop-1 of a config. Replicate i is seeded with
+    np.random.SeedSequence(seed_entropy, spawn_key=(i,))."""
+    config_index: int
+    params: ENParams
+    seed_entropy: int
+    start: int
+    stop: int
+    options: ENSimOptions
+    trajectory: Optional[ENTrajectoryConfig] = None
+    profile: bool = False
+    # Further configs whose results are read off the same replicates
+    observer_variants: Tuple[ENObserverVariant, ...] = ()
+    results_buffer: Optional[ENSharedResultsBuffer] = None
+
+class ENProfile(NamedTuple):
+    """ Where a config's simulation time went (see sim/profiler.py). Times are in seconds.
+    Experiments, Bayes updates and the propagandist's filtering are all part of play_round."""
+    play_round_time: float = 0.
+    experiment_time: float = 0.
+    bayes_update_time: float = 0.
+    propagandist_time: float = 0.
+    stop_check_time: float = 0.
+    rounds_played: int = 0
+    bayes_updates: int = 0
+    propagandist_experiments_shared: int = 0
+    consensus: int = 0
+    abandoned: int = 0
+    max_rounds: int = 0
+
+class ENSimChunkResult(NamedTuple):
+    config_index: int
+    start: int
+    raw_results: np.ndarray # EN_RAW_RESULTS_DTYPE
+    time_elapsed: float
+    profile: Optional[ENProfile] = None
+    # The results of the task's observer variants, one chunk per config
+    variant_chunks: Tuple['ENSimChunkResult', ...] = ()
+    # Replicates written to the task's results buffer. raw_results is then empty.
+    buffered_count: int = 0
 
 class ENResultsSummary(NamedTuple):
     scientist_proportion_consensus_reached: str
     scientists_avg_consensus_round: str
     passive_updaters_avg_credence: str
 
+class ENSamplingReport(NamedTuple):
+    """ What adaptive sampling achieved for a config."""
+    sim_count: int
+    proportion_consensus_reached_ci_half_width: str
+    avg_consensus_round_ci_half_width: str
+    passive_updaters_avg_credence_ci_half_width: str
+
 class ENSimsSummary(NamedTuple):
     params: ENParams
     results_summary: ENResultsSummary
+    sampling_report: Optional[ENSamplingReport] = None
+    profile: Optional[ENProfile] = None
 
 class ENResultsCSVWritableSummary(NamedTuple):
     headers: List[str]
-    sim_data: List[str]
\ No newline at end of file
+    sim_data: List[str]
+
+class ENThresholdPoint(NamedTuple):
+    """ A parameter value evaluated by an ENThresholdSearch."""
+    value: float
+    sim_count: int
+    statistic: float
+    ci_half_width: float
+
+class ENThresholdEstimate(NamedTuple):
+    """ Where a statistic crosses target as the field of ENParams (dotted for nested configs) goes
+    from the low to the high end of the search. The crossing lies within [ci_low, ci_high] at the
+    search's confidence, if the statistic is monotonic in the field."""
+    field: str
+    target: float
+    statistic: ENThresholdStatistic
+    crossing: float
+    ci_low: float
+    ci_high: float
+    # Whether the interval is as narrow as the search's tolerance, within its replicate budget
+    converged: bool
+    sim_count: int
+    points: Tuple[ENThresholdPoint, ...]
@@ -0,0 +1,169 @@
+import math
+import numpy as np
+from statistics import NormalDist
+from sim.profiler import merge_profiles
+from sim.sim_models import *
+from typing import Dict, List, Optional, Tuple
+
+# Compact per-replicate form of ENSimulationRawResults, used to ship results between processes.
+# Rounds start at 1, so a missing round is stored as 0. A missing credence is stored as NaN.
+EN_RAW_RESULTS_DTYPE = np.dtype([('consensus_round', np.int32),
+                                 ('research_abandoned_round', np.int32),
+                                 ('final_sim_round', np.int32),
+                                 ('passive_updaters_avg_credence', np.float64)])
+
+def raw_results_to_array(results: List[Optional[ENSimulationRawResults]]) -> np.ndarray:
+    if None in results:
+        raise ValueError("Failed to get results from at least one simulation.")
+    array = np.empty(len(results), dtype=EN_RAW_RESULTS_DTYPE)
+    for i, res in enumerate(results):
+        array[i] = (res.consensus_round or 0,
+                    res.research_abandoned_round or 0,
+                    res.final_sim_round,
+                    np.nan if res.passive_updaters_avg_credence is None else res.passive_updaters_avg_credence)
+    return array
+
+def variant_raw_results_to_array(results: List[ENSimulationRawResults], raw_results: np.ndarray, variant: int) -> np.ndarray:
+    """ raw_results (those of results) as the observer variant with index variant saw them: the same
+    but for the passive updaters' credence."""
+    array = raw_results.copy()
+    array['passive_updaters_avg_credence'] = [res.variant_passive_updaters_avg_credences[variant]
+                                              if res.variant_passive_updaters_avg_credences
+                                              and res.variant_passive_updaters_avg_credences[variant] is not None
+                                              else np.nan
+                                              for res in results]
+    return array
+
+def raw_results_from_array(array: np.ndarray) -> List[ENSimulationRawResults]:
+    return [ENSimulationRawResults(int(row['consensus_round']) or None,
+                                   int(row['research_abandoned_round']) or None,
+                                   int(row['final_sim_round']),
+                                   None if np.isnan(row['passive_updaters_avg_credence'])
+                                   else float(row['passive_updaters_avg_credence']))
+            for row in array]
+
+def summarize_raw_results(params: ENParams, array: np.ndarray) -> ENSimsSummary:
+    """ The summary written to the CSV. Reductions run in replicate order, so the result does not
+    depend on the order in which chunks came back."""
+    if not len(array):
+        raise ValueError("There needs to be at least one simulation result.")
+    consensus_rounds = array['consensus_round'][array['consensus_round'] > 0]
+    proportion_consensus_reached = round(len(consensus_rounds) / len(array), 3)
+    avg_consensus_round = "N/A"
+    if len(consensus_rounds):
+        avg_consensus_round = round(float(np.mean(consensus_rounds)), 3)
+    passive_crs = array['passive_updaters_avg_credence']
+    # Like the truthiness test this replaces, an average credence of exactly 0 is left out.
+    passive_crs = passive_crs[~np.isnan(passive_crs) & (passive_crs != 0)]
+    passive_cr = "N/A"
+    if len(passive_crs):
+        passive_cr = round(np.mean(passive_crs), 3)
+    sims_summary = ENResultsSummary(str(proportion_consensus_reached), str(avg_consensus_round), str(passive_cr))
+    return ENSimsSummary(params, sims_summary)
+
+def confidence_half_widths(array: np.ndarray,
+                           confidence: float) -> Tuple[float, Optional[float], Optional[float]]:
+    """ Half-widths of the confidence intervals of the statistics in summarize_raw_results: the
+    consensus proportion (Wilson score interval), and the average consensus round and passive
+    updater credence (normal approximation). None where a statistic is N/A; inf where it is
+    defined but a single value cannot give an interval."""
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n = len(array)
+    consensus_rounds = array['consensus_round'][array['consensus_round'] > 0]
+    p = len(consensus_rounds) / n
+    proportion_hw = z / (1 + z ** 2 / n) * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2))
+    passive_crs = array['passive_updaters_avg_credence']
+    passive_crs = passive_crs[~np.isnan(passive_crs) & (passive_crs != 0)]
+    return proportion_hw, _mean_half_width(consensus_rounds, z), _mean_half_width(passive_crs, z)
+
+def _mean_half_width(values: np.ndarray, z: float) -> Optional[float]:
+    if not len(values):
+        return None
+    if len(values) < 2:
+        return math.inf
+    return z * float(np.std(values, ddof=1)) / math.sqrt(len(values))
+
+class ENResultsAggregator():
+    """ Collects the chunks of one config as they stream back from the workers. Keeps running
+    totals for monitoring and the full compact results for the final summary. Results are summarized
+    over the first sim_count replicates; adaptive sampling raises sim_count up to capacity."""
+    def __init__(self, params: ENParams, sim_count: int, capacity: Optional[int] = None):
+        self.params = params
+        self.sim_count = sim_count
+        self.results = np.zeros(capacity or sim_count, dtype=EN_RAW_RESULTS_DTYPE)
+        self.sims_done = 0
+        self.rounds_done = 0
+        self.consensus_count = 0
+        # Replicates that ran out of rounds, without consensus or abandonment
+        self.max_rounds_count = 0
+        self.time_elapsed = 0.
+        self.sampling_report: Optional[ENSamplingReport] = None
+        # Summed over the chunks simulated with profiling on, in this run
+        self.profile: Optional[ENProfile] = None
+        self._chunk_lengths: Dict[int, int] = {}
+
+    def add_chunk(self, chunk: ENSimChunkResult):
+        self._chunk_lengths[chunk.start] = len(chunk.raw_results)
+        if not np.may_share_memory(self.results, chunk.raw_results):
+            # Unless a worker wrote the chunk into results itself (see sim/sharedresults.py)
+            self.results[chunk.start:chunk.start + len(chunk.raw_results)] = chunk.raw_results
+        self.sims_done += len(chunk.raw_results)
+        self.rounds_done += int(chunk.raw_results['final_sim_round'].sum())
+        self.consensus_count += int(np.count_nonzero(chunk.raw_results['consensus_round']))
+        # The params' stop conditions can end a replicate earlier, without either
+        self.max_rounds_count += int(np.count_nonzero((chunk.raw_results['consensus_round'] == 0)
+                                                      & (chunk.raw_results['research_abandoned_round'] == 0)
+                                                      & (chunk.raw_results['final_sim_round']
+                                                         >= self.params.max_research_rounds_allowed)))
+        self.time_elapsed += chunk.time_elapsed
+        if chunk.profile:
+            self.profile = merge_profiles(self.profile, chunk.profile)
+
+    def has_chunk(self, start: int) -> bool:
+        return start in self._chunk_lengths
+
+    def missing_ranges(self, start: int, stop: int) -> List[Tuple[int, int]]:
+        """ The runs of replicates among start..stop-1 that no chunk holds, as (start, stop) pairs."""
+        ranges = []
+        for chunk_start, length in sorted(self._chunk_lengths.items()):
+            if chunk_start >= stop:
+                break
+            if chunk_start > start:
+                ranges.append((start, chunk_start))
+            start = max(start, chunk_start + length)
+        if start < stop:
+            ranges.append((start, stop))
+        return ranges
+
+    def is_complete(self) -> bool:
+        return not self.missing_ranges(0, self.sim_count)
+
+    def running_proportion_consensus_reached(self) -> Optional[float]:
+        if not self.sims_done:
+            return None
+        return self.consensus_count / self.sims_done
+
+    def summary(self) -> ENSimsSummary:
+        if not self.is_complete():
+            raise ValueError("Not all simulations of the config have finished.")
+        summary = summarize_raw_results(self.params, self.results[:self.sim_count])
+        return summary._replace(sampling_report=self.sampling_report, profile=self.profile)
+
+    def decide_sampling(self, sampling: ENAdaptiveSampling) -> bool:
+        """ Once the first sim_count replicates are complete: return True if sampling should go on,
+        otherwise record the achieved intervals in the sampling report."""
+        results = self.results[:self.sim_count]
+        half_widths = confidence_half_widths(results, sampling.confidence)
+        proportion_hw, round_hw, passive_hw = half_widths
+        relative_round_hw = None
+        if round_hw is not None:
+            consensus_rounds = results['consensus_round'][results['consensus_round'] > 0]
+            relative_round_hw = round_hw / float(np.mean(consensus_rounds))
+        precise = all(hw <= sampling.tolerance for hw in (proportion_hw, relative_round_hw, passive_hw)
+                      if hw is not None)
+        if not precise and self.sim_count < sampling.max_sims:
+            return True
+        self.sampling_report = ENSamplingReport(self.sim_count,
+                                                *[str(round(hw, 3)) if hw is not None else "N/A"
+                                                  for hw in half_widths])
+        return False
@@ -1,145 +1,241 @@
-import numpy as np
-import timeit
-from multiprocessing import Pool
-from network.network import ENetworkForBinomialUpdating, ENetworkType
-from sim.sim import *
 from sim.sim_models import *
-from agents.bayesianupdaters.bayesianbinomialupdater import BayesianBinomialUpdater
-from typing import Optional, List
-from enum import Enum, auto
+from sim.checkpoint import ENSweepCheckpoint
+from sim.progress import ENSweepProgress
+from sim.resultcache import ENResultCache
+from sim.resultstore import ENResultStore
+from sim.sweep import ENSweep, scientist_params
+from sim.workqueue import ENWorkQueue
+from typing import Dict, Iterator, Optional, List, Tuple
 import os
 import csv
 
-class ENSimType(Enum):
-    ZOLLMAN_COMPLETE = auto()
-    ZOLLMAN_CYCLE = auto()
-    POLICYMAKERS_COMPLETE = auto()
-    POLICYMAKERS_CYCLE = auto()
-    PROPAGANDA_COMPLETE = auto()
-    PROPAGANDA_CYCLE = auto()
-    PROPAGANDA_CYCLE_VARY_EPSILON = auto()
+def preset_configs(sim_type: ENSimType) -> Tuple[List[ENParams], str]:
+    """ The configs of a pre-defined template and the CSV file its results are written to."""
+    match sim_type:
+        # A partial reproduction of the results of Zollman https://philpapers.org/rec/ZOLTCS
+        case ENSimType.ZOLLMAN_COMPLETE:
+            configs = [ENParams(pop, ENetworkType.COMPLETE, 1000, 0.001, 0.5, 10000, 0.99, None, False) for pop in range(3, 5)]
+            return configs, "zollman2007.csv"
+        case ENSimType.ZOLLMAN_CYCLE:
+            configs = [ENParams(pop, ENetworkType.CYCLE, 1000, 0.001, 0.5, 10000, 0.99, None, False) for pop in range(4, 5)]
+            return configs, "zollman2007.csv"
+        case ENSimType.POLICYMAKERS_COMPLETE: # Weatherall et al. 2020 (without propagandists)   pop = 4; 6; 10; 20; 50 – but we are skipping 50 for sure
+            configs = [ENParams(pop, ENetworkType.COMPLETE, 1000, 0.001, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(2, 0, 0.5, infl_count), False) for pop in (4, 6)
+                                                                                                                                           for infl_count in range(1, pop+1)]
+            return configs, "policymakers_complete.csv"
+        case ENSimType.POLICYMAKERS_CYCLE: # Figure 2 first part
+            configs = [ENParams(pop, ENetworkType.CYCLE, 10, 0.05, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, infl_count), False) for pop in (20,) 
+                                                                                                                                            for infl_count in range(1, pop+1)]
+            return configs, "policymakers_cycle.csv"                                          
+        case ENSimType.PROPAGANDA_COMPLETE:
+            configs = [ENParams(pop, ENetworkType.COMPLETE, 10, 0.05, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, infl_count), True)  for pop in (20,) 
+                                                                                                                                                    for infl_count in range(1, pop+1)]
+            return configs, "policymakers_cycle.csv"
+        case ENSimType.PROPAGANDA_CYCLE:
+            configs = [ENParams(pop, ENetworkType.CYCLE, 10, 0.05, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, infl_count), True)     for pop in (20,) 
+                                                                                                                                                    for infl_count in range(1, pop+1)]
+            return configs, "policymakers_cycle.csv" 
+        case PROPAGANDA_CYCLE_VARY_EPSILON:
+            configs = [ENParams(20, ENetworkType.CYCLE, 10, epsilon, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, 10), True) for epsilon in (0.01, 0.05, 0.075, 0.1)]
+            return configs, "policymakers_cycle.csv"
 
 class ENSimSetup():
     def __init__(self,
                  sim_count: int,
-                 sim_type: Optional[ENSimType]):
+                 sim_type: Optional[ENSimType],
+                 engine: ENSimEngine = ENSimEngine.OBJECT_GRAPH,
+                 chunk_size: Optional[int] = None,
+                 credence_representation: ENCredenceRepresentation = ENCredenceRepresentation.PROBABILITY,
+                 processes: Optional[int] = None,
+                 results_dir: Optional[str] = None,
+                 checkpoint_dir: Optional[str] = None,
+                 scheduling: ENSweepScheduling = ENSweepScheduling.IN_ORDER,
+                 adaptive_sampling: Optional[ENAdaptiveSampling] = None,
+                 trajectory: Optional[ENTrajectoryConfig] = None,
+                 profile: bool = False,
+                 queue_dir: Optional[str] = None,
+                 outcome_stream: ENOutcomeStream = ENOutcomeStream.PER_CALL,
+                 progress_interval: Optional[float] = 10.,
+                 status_path: Optional[str] = None,
+                 cache_dir: Optional[str] = None,
+                 cache_max_bytes: Optional[int] = 1 << 30,
+                 start_method: Optional[str] = None,
+                 complete_network_updating: ENCompleteNetworkUpdating = ENCompleteNetworkUpdating.PER_INFLUENCER,
+                 share_scientists: bool = False,
+                 executor: ENSweepExecutor = ENSweepExecutor.PROCESSES):
+        if checkpoint_dir and queue_dir:
+            raise ValueError("A work queue keeps its results as checkpoints. Give either checkpoint_dir or queue_dir.")
         self.sim_count = sim_count
         self.sim_type = sim_type
+        # ENOutcomeStream.PER_CALL reproduces the results of versions before outcomes were drawn in
+        # blocks. BLOCKED is faster, but its results differ from theirs.
+        # ENCompleteNetworkUpdating.SEQUENTIAL runs complete networks in O(N) per round instead of O(N^2).
+        self.options = ENSimOptions(engine, credence_representation, outcome_stream, complete_network_updating)
+        # Replicates per worker task. For ENSimEngine.VECTORIZED a chunk is also one batch, drawn from
+        # a single random stream, so the chunk size changes the results. Defaults to all of a config's
+        # replicates for that engine.
+        self.chunk_size = chunk_size
+        # Worker processes. Defaults to os.cpu_count(). With a work queue, the number of local workers,
+        # which may be 0.
+        self.processes = processes
+        self.seed_base = 253
+        # Every replicate's raw results are kept here when given (see sim/resultstore.py).
+        self.result_store = ENResultStore(results_dir) if results_dir else None
+        # Completed chunks are saved here when given, and a rerun resumes where the last run stopped.
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint = ENSweepCheckpoint(checkpoint_dir) if checkpoint_dir else None
+        self.scheduling = scheduling
+        # Opt-in: sim_count is ignored and each config runs until its intervals are narrow enough.
+        self.adaptive_sampling = adaptive_sampling
+        # Per-round credences of sampled replicates are recorded when given (see sim/trajectory.py).
+        self.trajectory = trajectory
+        # Per-phase timers and counters, written to the CSV with each config (see sim/profiler.py).
+        self.profile = profile
+        # Chunks are queued in this shared directory for workers on any machine when given, and the
+        # results are merged from there (see sim/workqueue.py). Rerunning merges what is done so far.
+        self.queue = ENWorkQueue(queue_dir) if queue_dir else None
+        if self.queue:
+            self.checkpoint_dir = queue_dir
+            self.checkpoint = self.queue.results
+        # Seconds between progress reports while a sweep runs, None for none. A JSON status file for
+        # monitoring is kept at status_path when given (see sim/progress.py).
+        self.progress_interval = progress_interval
+        self.status_path = status_path
+        # Finished configs are cached here when given, and configs found in it are not run again
+        # (see sim/resultcache.py).
+        self.cache = ENResultCache(cache_dir, cache_max_bytes) if cache_dir else None
+        # 'fork', 'spawn' or 'forkserver' (which preloads the simulation code), None for the platform's default
+        self.start_method = start_method
+        # Configs that only differ in their passive updaters' scientist influencers or in the
+        # propagandist are seeded alike and simulated together (see ENSweep). E.g. the 20 configs of
+        # ENSimType.PROPAGANDA_CYCLE then cost about as much as one.
+        self.share_scientists = share_scientists
+        # ENSweepExecutor.THREADS runs the chunks on a thread pool in this process, which suits
+        # ENSimEngine.VECTORIZED (see benchmarks/executors.py). processes is then the number of threads.
+        self.executor = executor
     
     def quick_setup(self):
         """ Setup sims from pre-defined templates, e.g. ENSimType.ZOLLMAN_COMPLETE. 
         Use setup_sims instead if you need to customize the parameters."""
         if not self.sim_type:
             raise ValueError("Quick setup can only be called if you have specified ENSimType")
-        match self.sim_type:
-            # A partial reproduction of the results of Zollman https://philpapers.org/rec/ZOLTCS
-            case ENSimType.ZOLLMAN_COMPLETE:
-                configs = [ENParams(pop, ENetworkType.COMPLETE, 1000, 0.001, 0.5, 10000, 0.99, None, False) for pop in range(3, 5)]
-                self.setup_sims(configs, "zollman2007.csv")
-            case ENSimType.ZOLLMAN_CYCLE:
-                configs = [ENParams(pop, ENetworkType.CYCLE, 1000, 0.001, 0.5, 10000, 0.99, None, False) for pop in range(4, 5)]
-                self.setup_sims(configs, "zollman2007.csv")
-            case ENSimType.POLICYMAKERS_COMPLETE: # Weatherall et al. 2020 (without propagandists)   pop = 4; 6; 10; 20; 50 – but we are skipping 50 for sure
-                configs = [ENParams(pop, ENetworkType.COMPLETE, 1000, 0.001, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(2, 0, 0.5, infl_count), False) for pop in (4, 6)
-                                                                                                                                               for infl_count in range(1, pop+1)]
-                self.setup_sims(configs, "policymakers_complete.csv")
-            case ENSimType.POLICYMAKERS_CYCLE: # Figure 2 first part
-                configs = [ENParams(pop, ENetworkType.CYCLE, 10, 0.05, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, infl_count), False) for pop in (20,) 
-                                                                                                                                                for infl_count in range(1, pop+1)]
-                self.setup_sims(configs, "policymakers_cycle.csv")                                          
-            case ENSimType.PROPAGANDA_COMPLETE:
-                configs = [ENParams(pop, ENetworkType.COMPLETE, 10, 0.05, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, infl_count), True)  for pop in (20,) 
-                                                                                                                                                        for infl_count in range(1, pop+1)]
-                self.setup_sims(configs, "policymakers_cycle.csv")
-            case ENSimType.PROPAGANDA_CYCLE:
-                configs = [ENParams(pop, ENetworkType.CYCLE, 10, 0.05, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, infl_count), True)     for pop in (20,) 
-                                                                                                                                                        for infl_count in range(1, pop+1)]
-                self.setup_sims(configs, "policymakers_cycle.csv") 
-            case PROPAGANDA_CYCLE_VARY_EPSILON:
-                configs = [ENParams(20, ENetworkType.CYCLE, 10, epsilon, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, 10), True) for epsilon in (0.01, 0.05, 0.075, 0.1)]
-                self.setup_sims(configs, "policymakers_cycle.csv")
+        configs, output_filename = preset_configs(self.sim_type)
+        self.setup_sims(configs, output_filename)
 
     def setup_sims(self, configs: List[ENParams], output_filename: str):
-        # We need to be careful when passing rng instances to starmap. If we do not set independent seeds, 
-        # we will get the *same* results each simulation since the subprocesses share the parent's initial 
-        # rng state.
-        # https://numpy.org/doc/stable/reference/random/parallel.html
-        child_seeds = [np.random.SeedSequence(253 + i).spawn(self.sim_count) for i in range(len(configs))]
-        for i, param_config in enumerate(configs):
-            print(f'Running config: {param_config}')
-            print('...')
-            rng_streams = [np.random.default_rng(s) for s in child_seeds[i]]
-            start_time = timeit.default_timer()
-            results_summary = self.run_sims_for_param_config(param_config, rng_streams)
-            time_elapsed = timeit.default_timer() - start_time
+        # Before anything is simulated
+        output_filename = self.output_path(output_filename)
+        sweep = self.sweep(configs, self._seed_entropies(configs))
+        if sweep.checkpoint:
+            # Configs whose rows were written by an earlier, interrupted run are not run or written again.
+            pending = [i for i in range(len(configs)) if not sweep.checkpoint.is_recorded(sweep.checkpoint_key(i))]
+            if len(pending) < len(configs):
+                print(f'Skipping {len(configs) - len(pending)} configs already recorded in {self.checkpoint_dir}')
+            sweep = self.sweep([configs[i] for i in pending], [sweep.seed_entropies[i] for i in pending])
+        for i, results_summary, time_elapsed in sweep.run():
+            print(f'Finished config: {results_summary.params}')
             print(f'Time elapsed: {time_elapsed}s')
-            csv_data = self.data_for_writing(results_summary, self.sim_count, time_elapsed)
+            sim_count = self.sim_count
+            if results_summary.sampling_report:
+                sim_count = results_summary.sampling_report.sim_count
+            csv_data = self.data_for_writing(results_summary, sim_count, time_elapsed)
             print()
             self.record_sim(csv_data, output_filename)
+            if sweep.checkpoint:
+                sweep.checkpoint.mark_recorded(sweep.checkpoint_key(i))
+
+    def run_sweep(self,
+                  configs: List[ENParams],
+                  seed_entropies: Optional[List[int]] = None) -> Iterator[Tuple[int, ENSimsSummary, float]]:
+        """ Run every replicate of every config on one worker pool and yield (config index, summary,
+        time elapsed) as configs finish. See ENSweep."""
+        # We need to be careful when seeding the workers. If we do not set independent seeds,
+        # we will get the *same* results each simulation since the subprocesses share the parent's initial
+        # rng state. Config i is seeded with SeedSequence(seed_base + i) and its replicates with the
+        # sequences spawned from that.
+        # https://numpy.org/doc/stable/reference/random/parallel.html
+        if seed_entropies is None:
+            seed_entropies = self._seed_entropies(configs)
+        return self.sweep(configs, seed_entropies).run()
+
+    def run_sims_for_param_config(self, params: ENParams, seed_entropy: Optional[int] = None) -> ENSimsSummary:
+        """ Run a single config on its own. Seeded like the first config of a sweep by default."""
+        if seed_entropy is None:
+            seed_entropy = self.seed_base
+        for _, results_summary, _ in self.run_sweep([params], [seed_entropy]):
+            return results_summary
+        raise ValueError("Failed to get results from the config.")
+
+    def sweep(self, configs: List[ENParams], seed_entropies: List[int]) -> ENSweep:
+        """ An ENSweep of configs with this setup's options, e.g. to read raw results off its aggregators."""
+        return ENSweep(configs,
+                       seed_entropies,
+                       self.sim_count,
+                       self.options,
+                       self.chunk_size,
+                       self.processes,
+                       self.result_store,
+                       self.checkpoint,
+                       self.scheduling,
+                       self.adaptive_sampling,
+                       self.trajectory,
+                       self.profile,
+                       self.queue,
+                       self._progress(configs),
+                       self.cache,
+                       self.start_method,
+                       self.share_scientists,
+                       self.executor)
+
+    def _seed_entropies(self, configs: List[ENParams]) -> List[int]:
+        if not self.share_scientists:
+            return [self.seed_base + i for i in range(len(configs))]
+        # Configs that share their scientists are seeded like the first of them.
+        first_configs: Dict[ENParams, int] = {}
+        return [self.seed_base + first_configs.setdefault(scientist_params(params), i)
+                for i, params in enumerate(configs)]
 
-    def run_sims_for_param_config(self, params: ENParams, rng_streams: List[np.random.Generator]) -> ENSimsSummary:
-        if not rng_streams:
-            raise ValueError("There needs to be at least one rng.")
-        pool = Pool()
-        results_from_sims = pool.starmap(self.run_sim,
-                                        [(rng,) + params for rng in rng_streams])
-        pool.close()
-        pool.join()
-        if None in results_from_sims:
-            raise ValueError("Failed to get results from at least one simulation.")
-        results = [r for r in results_from_sims if r is not None]
-        cons_count = self.consensus_count(results)
-        proportion_consensus_reached = round(cons_count / len(results), 3)
-        if cons_count > 0:
-            # TODO: Add try statement?
-            avg_c_r = np.mean([res.consensus_round for res in results if res.consensus_round])
-            avg_consensus_round = round(float(avg_c_r), 3)
-        else:
-            avg_consensus_round = "N/A"
-        passive_upd_averages = [res.passive_updaters_avg_credence for res in results if res.passive_updaters_avg_credence]
-        passive_cr = "N/A"
-        if passive_upd_averages:
-            passive_cr = round(np.mean(passive_upd_averages), 3)
-        sims_summary = ENResultsSummary(str(proportion_consensus_reached), str(avg_consensus_round), str(passive_cr))
-        return ENSimsSummary(params, sims_summary)
-
-    def run_sim(self,
-                rng: np.random.Generator,
-                scientist_pop_count: int, 
-                network_type: ENetworkType, 
-                n_per_round: int, 
-                epsilon: float, 
-                scientist_stop_threshold: float,
-                max_research_rounds: int,
-                consensus_threshold: float,
-                passive_updaters_config: Optional[ENPassiveUpdatersConfig],
-                selective_propagandist_active: bool) -> Optional[ENSimulationRawResults]:
-        network = ENetworkForBinomialUpdating(rng,
-                                              scientist_pop_count,
-                                              network_type,
-                                              n_per_round,
-                                              epsilon,
-                                              scientist_stop_threshold,
-                                              passive_updaters_config,
-                                              selective_propagandist_active)
-        simulation = EpistemicNetworkSimulation(network, 
-                                                max_research_rounds, 
-                                                scientist_stop_threshold, 
-                                                consensus_threshold)
-        simulation.run_sim()
-        return simulation.results
-
-    def consensus_count(self, results: List[ENSimulationRawResults]) -> int:
-        total = 0
-        for sim_result in results:
-            if not sim_result:
-                continue
-            if sim_result.consensus_round:
-                total += 1
-        return total
+    def _progress(self, configs: List[ENParams]) -> Optional[ENSweepProgress]:
+        if self.progress_interval is None and not self.status_path:
+            return None
+        return ENSweepProgress(configs, self.progress_interval, self.status_path)
+
+    def csv_headers(self) -> List[str]:
+        """ The columns of the rows this setup writes (see data_for_writing)."""
+        headers = ['Sim count', *ENParams._fields, 'sim time (s)', *ENResultsSummary._fields]
+        if self.adaptive_sampling:
+            headers.extend(ENSamplingReport._fields[1:])
+        if self.profile:
+            headers.extend(ENProfile._fields)
+        return headers
+
+    def output_path(self, path: str) -> str:
+        """ path, unless it holds rows with other columns, e.g. written before ENParams gained a field
+        or with another choice of optional reports. Then the first of path.2.csv, path.3.csv, ... that
+        is new or has these columns."""
+        headers = self.csv_headers()
+        root, ext = os.path.splitext(path)
+        candidate = path
+        number = 1
+        while self._has_other_header(candidate, headers):
+            number += 1
+            candidate = f'{root}.{number}{ext}'
+        if candidate != path:
+            existing = self._header(path)
+            missing = [header for header in headers if header not in existing]
+            extra = [header for header in existing if header not in headers]
+            print(f'{path} has other columns (missing: {missing}, extra: {extra}). Writing to {candidate} instead.')
+        return candidate
 
     def record_sim(self, results: ENResultsCSVWritableSummary, path: str):
-        file_exists = os.path.isfile(path)
+        file_exists = os.path.isfile(path) and os.path.getsize(path) > 0
+        if self._has_other_header(path, results.headers):
+            # The columns depend on ENParams and on which optional reports are on. See output_path.
+            raise ValueError(f"{path} has other columns than these results. Write them to another file.")
+        if file_exists and self._has_row(path, results.sim_data):
+            # A rerun of the same config, e.g. a cache hit
+            print(f'Row already in {path}')
+            return
         # res_dir = "/results"
         # Path(res_dir).mkdir(parents=True, exist_ok=True)
         # filename = Path(res_dir, filename).with_suffix('.csv')
@@ -149,6 +245,17 @@ class ENSimSetup():
                 writer.writerow(results.headers)
             writer.writerow(results.sim_data)
 
+    def _has_other_header(self, path: str, headers: List[str]) -> bool:
+        return os.path.isfile(path) and os.path.getsize(path) > 0 and self._header(path) != headers
+
+    def _header(self, path: str) -> List[str]:
+        with open(path, newline='') as csv_file:
+            return next(csv.reader(csv_file), [])
+
+    def _has_row(self, path: str, row: List[str]) -> bool:
+        with open(path, newline='') as csv_file:
+            return any(existing == row for existing in csv.reader(csv_file))
+
     def data_for_writing(self, 
                         sims_summary: ENSimsSummary, 
                         sim_count: int, 
@@ -158,6 +265,11 @@ class ENSimSetup():
         headers.append('sim time (s)')
         summary_fields = [field for field in sims_summary.results_summary._asdict().keys()]
         headers.extend(summary_fields)
+        if sims_summary.sampling_report:
+            headers.extend(list(sims_summary.sampling_report._fields)[1:])
+        # A config resumed entirely from checkpoints saved without profiles has none
+        if sims_summary.profile or self.profile:
+            headers.extend(ENProfile._fields)
 
         sim_data = [str(sim_count)]
         sim_data.extend([str(param_val) for param_val in sims_summary.params])
@@ -166,5 +278,12 @@ class ENSimSetup():
         print(f'Summary fields: {summary_fields}')
         print(f'Results from config: {result_str_list}')
         sim_data.extend(result_str_list)
+        if sims_summary.sampling_report:
+            sim_data.extend(sims_summary.sampling_report[1:])
+        if sims_summary.profile:
+            print(f'Profile: {sims_summary.profile}')
+            sim_data.extend([str(value) for value in sims_summary.profile])
+        elif self.profile:
+            sim_data.extend([''] * len(ENProfile._fields))
         summary = ENResultsCSVWritableSummary(headers, sim_data)
         return summary
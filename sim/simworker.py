@@ -0,0 +1,142 @@
+import numpy as np
+import timeit
+from network.arraynetwork import ENetworkStateForBinomialUpdating, influencer_tables, likelihood_ratio_table
+from network.network import ENetworkForBinomialUpdating
+from network.batchnetwork import ENetworkBatchForBinomialUpdating
+from network.topology import shared_topology
+from sim.sim import EpistemicNetworkSimulation
+from sim.batchsim import EpistemicNetworkBatchSimulation
+from sim.profiler import ENProfiler
+from sim.sharedresults import ENSharedResults
+from sim.simresults import raw_results_to_array, variant_raw_results_to_array
+from sim.sim_models import *
+from sim.trajectory import ENTrajectoryRecorder, trajectory_recorders
+from typing import Dict, List, Optional, Sequence
+
+""" Module-level task functions for the worker pool, so that tasks pickle as plain data
+rather than as bound methods of ENSimSetup."""
+
+def init_worker(configs: List[ENParams], options: ENSimOptions):
+    """ Pool initializer: builds the per-config tables the replicates share (topologies, and the
+    likelihood ratio and influencer tables of ENSimEngine.STRUCT_OF_ARRAYS) before any task
+    arrives, once per worker rather than lazily in the first task of each config."""
+    for params in configs:
+        match options.engine:
+            case ENSimEngine.OBJECT_GRAPH:
+                if params.network_type not in (ENetworkType.COMPLETE, ENetworkType.CYCLE):
+                    shared_topology(params.scientist_pop_count, params.network_type, params.network_config)
+            case ENSimEngine.STRUCT_OF_ARRAYS:
+                influencer_tables(params.scientist_pop_count, params.network_type, params.network_config)
+                likelihood_ratio_table(params.binom_n_per_round, 0.5 + params.epsilon)
+            case ENSimEngine.VECTORIZED:
+                if params.network_type != ENetworkType.COMPLETE:
+                    shared_topology(params.scientist_pop_count, params.network_type, params.network_config)
+
+def replicate_seeds(seed_entropy: int, start: int, stop: int) -> List[np.random.SeedSequence]:
+    """ The seeds of replicates start..stop-1. Identical to
+    np.random.SeedSequence(seed_entropy).spawn(stop)[start:stop]."""
+    return [np.random.SeedSequence(seed_entropy, spawn_key=(i,)) for i in range(start, stop)]
+
+def run_sim_chunk(task: ENSimChunkTask) -> ENSimChunkResult:
+    start_time = timeit.default_timer()
+    seeds = replicate_seeds(task.seed_entropy, task.start, task.stop)
+    recorders = trajectory_recorders(task.trajectory, task.params, task.seed_entropy, task.start, task.stop)
+    profiler = ENProfiler() if task.profile else None
+    match task.options.engine:
+        case ENSimEngine.OBJECT_GRAPH | ENSimEngine.STRUCT_OF_ARRAYS:
+            results = [run_sim(np.random.default_rng(seed), task.params, task.options, recorders.get(i), profiler,
+                               task.observer_variants)
+                       for i, seed in enumerate(seeds, task.start)]
+        case ENSimEngine.VECTORIZED:
+            # A batch draws all its replicates from one stream, seeded by its first replicate.
+            results = run_batch_sim(np.random.default_rng(seeds[0]), len(seeds), task.params, task.options,
+                                    {i - task.start: recorder for i, recorder in recorders.items()},
+                                    profiler,
+                                    task.observer_variants)
+    raw_results = raw_results_to_array(results)
+    if profiler:
+        profiler.count_outcomes(raw_results, task.params.max_research_rounds_allowed)
+    # The configs that shared the replicates share their time too
+    time_elapsed = (timeit.default_timer() - start_time) / (1 + len(task.observer_variants))
+    variant_chunks = tuple(ENSimChunkResult(variant.config_index,
+                                            task.start,
+                                            variant_raw_results_to_array(results, raw_results, i),
+                                            time_elapsed)
+                           for i, variant in enumerate(task.observer_variants))
+    chunk = ENSimChunkResult(task.config_index,
+                             task.start,
+                             raw_results,
+                             time_elapsed,
+                             profiler.profile() if profiler else None,
+                             variant_chunks)
+    if task.results_buffer:
+        shared_results = ENSharedResults.attach(task.results_buffer)
+        chunk = shared_results.write_chunk(chunk)._replace(
+            variant_chunks=tuple(shared_results.write_chunk(variant_chunk) for variant_chunk in variant_chunks))
+        shared_results.close()
+    return chunk
+
+def run_sim(rng: np.random.Generator,
+            params: ENParams,
+            options: ENSimOptions,
+            trajectory_recorder: Optional[ENTrajectoryRecorder] = None,
+            profiler: Optional[ENProfiler] = None,
+            observer_variants: Sequence[ENObserverVariant] = ()) -> Optional[ENSimulationRawResults]:
+    network_args = (rng,
+                    params.scientist_pop_count,
+                    params.network_type,
+                    params.binom_n_per_round,
+                    params.epsilon,
+                    params.scientist_stop_threshold,
+                    params.passive_updaters_config,
+                    params.selective_propagandist_active,
+                    options.credence_representation,
+                    params.network_config,
+                    options.outcome_stream)
+    match options.engine:
+        case ENSimEngine.STRUCT_OF_ARRAYS:
+            network = ENetworkStateForBinomialUpdating(*network_args, observer_variants=observer_variants)
+        case _:
+            network = ENetworkForBinomialUpdating(*network_args,
+                                                  options.complete_network_updating,
+                                                  observer_variants)
+    simulation = EpistemicNetworkSimulation(network,
+                                            params.max_research_rounds_allowed,
+                                            params.scientist_stop_threshold,
+                                            params.consensus_threshold,
+                                            trajectory_recorder,
+                                            params.stop_conditions)
+    if profiler:
+        profiler.instrument_simulation(simulation)
+    simulation.run_sim()
+    return simulation.results
+
+def run_batch_sim(rng: np.random.Generator,
+                  sim_count: int,
+                  params: ENParams,
+                  options: ENSimOptions,
+                  trajectory_recorders: Optional[Dict[int, ENTrajectoryRecorder]] = None,
+                  profiler: Optional[ENProfiler] = None,
+                  observer_variants: Sequence[ENObserverVariant] = ()) -> List[Optional[ENSimulationRawResults]]:
+    network = ENetworkBatchForBinomialUpdating(rng,
+                                               sim_count,
+                                               params.scientist_pop_count,
+                                               params.network_type,
+                                               params.binom_n_per_round,
+                                               params.epsilon,
+                                               params.scientist_stop_threshold,
+                                               params.passive_updaters_config,
+                                               params.selective_propagandist_active,
+                                               options.credence_representation,
+                                               params.network_config,
+                                               observer_variants)
+    simulation = EpistemicNetworkBatchSimulation(network,
+                                                 params.max_research_rounds_allowed,
+                                                 params.scientist_stop_threshold,
+                                                 params.consensus_threshold,
+                                                 trajectory_recorders,
+                                                 params.stop_conditions)
+    if profiler:
+        profiler.instrument_batch_simulation(simulation)
+    simulation.run_sim()
+    return simulation.results
@@ -0,0 +1,150 @@
+import math
+import numpy as np
+from agents.bayesianupdaters.logoddsbinomialupdater import log_odds_from_probability, probability_from_log_odds
+from sim.sim_models import ENStopCondition
+from typing import Sequence, Tuple
+
+""" When a replicate stops. Every condition is a function of two counts: the scientists whose
+credence is below the stop threshold, and those whose credence is above the consensus threshold.
+ENCredenceBands keeps these counts running. A scientist of the object graph moves between bands as
+it updates, and only when its band changes, so checking any number of conditions at the start of a
+round is O(1) in the population. The struct-of-arrays network updates every belief each round and
+recounts them with vectorized comparisons. A new ENStopCondition needs a case in
+ENCredenceBands.stop_condition_met and one in stop_condition_mask, for the batch engine."""
+
+# The bands of a credence
+BETWEEN = 0
+BELOW = 1 # The stop threshold
+ABOVE = 2 # The consensus threshold
+
+class ENCredenceBands():
+    def __init__(self, low_stop: float, high_stop: float):
+        self.low_stop = low_stop
+        self.high_stop = high_stop
+        # Log-odds outside these brackets are certainly on one side of the threshold. Those within
+        # are converted like LogOddsBinomialUpdater.credence, so the bands match it to the last bit.
+        self._low_stop_log_odds = _log_odds_bracket(low_stop)
+        self._high_stop_log_odds = _log_odds_bracket(high_stop)
+        self.population = 0
+        # Scientists per band
+        self._counts = [0, 0, 0]
+
+    ## Interface
+    @property
+    def below(self) -> int:
+        return self._counts[BELOW]
+
+    @property
+    def above(self) -> int:
+        return self._counts[ABOVE]
+
+    def band(self, credence: float) -> int:
+        if credence < self.low_stop:
+            return BELOW
+        if credence > self.high_stop:
+            return ABOVE
+        return BETWEEN
+
+    def log_odds_band(self, log_odds: float) -> int:
+        """ The band of the credence with these log-odds, mostly without converting them."""
+        lower, upper = self._low_stop_log_odds
+        if log_odds < lower or (log_odds <= upper and probability_from_log_odds(log_odds) < self.low_stop):
+            return BELOW
+        lower, upper = self._high_stop_log_odds
+        if log_odds > upper or (lower <= log_odds and probability_from_log_odds(log_odds) > self.high_stop):
+            return ABOVE
+        return BETWEEN
+
+    def credence_range(self, band: int) -> Tuple[float, float]:
+        """ The credences in band, as an inclusive (floor, ceiling), so that checking whether a
+        credence stayed in its band is one comparison."""
+        if band == BELOW:
+            return -math.inf, math.nextafter(self.low_stop, -math.inf)
+        if band == ABOVE:
+            return math.nextafter(self.high_stop, math.inf), math.inf
+        return self.low_stop, self.high_stop
+
+    def log_odds_range(self, band: int) -> Tuple[float, float]:
+        """ Like credence_range, for log-odds, leaving out those within a hair of a threshold."""
+        # All log-odds are near a threshold of 0 or 1, and none are in these ranges
+        if band == BELOW:
+            lower = self._low_stop_log_odds[0]
+            return (-math.inf, math.nextafter(lower, -math.inf)) if lower > -math.inf else (math.inf, -math.inf)
+        if band == ABOVE:
+            upper = self._high_stop_log_odds[1]
+            return (math.nextafter(upper, math.inf), math.inf) if upper < math.inf else (math.inf, -math.inf)
+        return (math.nextafter(self._low_stop_log_odds[1], math.inf),
+                math.nextafter(self._high_stop_log_odds[0], -math.inf))
+
+    def add(self, band: int):
+        self.population += 1
+        self._counts[band] += 1
+
+    def move(self, old_band: int, new_band: int):
+        """ A scientist's credence went from old_band to new_band."""
+        self._counts[old_band] -= 1
+        self._counts[new_band] += 1
+
+    def recount(self, beliefs: np.ndarray, log_odds: bool = False):
+        """ For networks that update every belief at once: count beliefs, credences or their
+        log-odds, into bands with vectorized comparisons."""
+        self.population = len(beliefs)
+        self._counts[BELOW] = self._count_below(beliefs, log_odds)
+        self._counts[ABOVE] = self._count_above(beliefs, log_odds)
+        self._counts[BETWEEN] = self.population - self._counts[BELOW] - self._counts[ABOVE]
+
+    def abandoned(self) -> bool:
+        return self._counts[BELOW] == self.population
+
+    def consensus(self) -> bool:
+        return self._counts[ABOVE] == self.population
+
+    def stop_condition_met(self, condition: ENStopCondition) -> bool:
+        match condition:
+            case ENStopCondition.POLARIZATION:
+                return 0 < self.below and 0 < self.above and self.below + self.above == self.population
+            case _:
+                raise NotImplementedError(f'Stop condition {condition} is not supported.')
+
+    ## Private methods
+    def _count_below(self, beliefs: np.ndarray, log_odds: bool) -> int:
+        if not log_odds:
+            return int(np.count_nonzero(beliefs < self.low_stop))
+        lower, upper = self._low_stop_log_odds
+        near = beliefs[(lower <= beliefs) & (beliefs <= upper)].tolist()
+        return (int(np.count_nonzero(beliefs < lower))
+                + sum(probability_from_log_odds(b) < self.low_stop for b in near))
+
+    def _count_above(self, beliefs: np.ndarray, log_odds: bool) -> int:
+        if not log_odds:
+            return int(np.count_nonzero(beliefs > self.high_stop))
+        lower, upper = self._high_stop_log_odds
+        near = beliefs[(lower <= beliefs) & (beliefs <= upper)].tolist()
+        return (int(np.count_nonzero(beliefs > upper))
+                + sum(probability_from_log_odds(b) > self.high_stop for b in near))
+
+def stop_condition_mask(condition: ENStopCondition,
+                        credences: np.ndarray,
+                        low_stop: float,
+                        high_stop: float) -> np.ndarray:
+    """ Which rows of a batch's (replicates, scientists) credences meet the condition."""
+    below = credences < low_stop
+    above = credences > high_stop
+    match condition:
+        case ENStopCondition.POLARIZATION:
+            return np.all(below | above, axis=1) & np.any(below, axis=1) & np.any(above, axis=1)
+        case _:
+            raise NotImplementedError(f'Stop condition {condition} is not supported.')
+
+def _log_odds_bracket(probability: float) -> Tuple[float, float]:
+    if not 0 < probability < 1:
+        return -math.inf, math.inf
+    # Far wider than the few ulps by which the conversions can err
+    margin = 1e-9 * min(probability, 1 - probability)
+    return log_odds_from_probability(probability - margin), log_odds_from_probability(probability + margin)
+
+def any_stop_condition_met(conditions: Sequence[ENStopCondition], bands: ENCredenceBands) -> bool:
+    for condition in conditions:
+        if bands.stop_condition_met(condition):
+            return True
+    return False
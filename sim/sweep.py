@@ -0,0 +1,415 @@
+import math
+import os
+import time
+import numpy as np
+from multiprocessing import get_context
+from multiprocessing.pool import ThreadPool
+from sim.checkpoint import ENSweepCheckpoint
+from sim.progress import ENSweepProgress
+from sim.resultcache import ENCachedConfig, ENResultCache
+from sim.resultstore import ENResultStore
+from sim.scheduler import ENSweepScheduler
+from sim.sharedresults import ENSharedResults
+from sim.serialization import config_key
+from sim.simresults import ENResultsAggregator
+from sim.simworker import init_worker, run_sim_chunk
+from sim.sim_models import *
+from sim.workqueue import ENWorkQueue
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class ENSweep():
+    """ One run of a list of configs over a single worker pool. Results stream back into per-config
+    ENResultsAggregators. With ENSweepScheduling.IN_ORDER, chunks of consecutive configs are queued
+    back to back, so the tail of one config overlaps with the start of the next. With COST_AWARE,
+    ENSweepScheduler interleaves the chunks of all configs. With adaptive sampling, sim_count is the
+    ceiling, and a config is extended one batch at a time, once all its dispatched chunks are back,
+    until its confidence intervals are narrow enough. Stopping decisions only depend on those
+    replicates, so they do not depend on timing. With a work queue, the chunks are queued in a shared
+    directory instead of being sent to a pool, and processes is the number of local workers that
+    help out (see sim/workqueue.py). Configs found in the result cache are not run at all. With
+    share_scientists, configs that only differ in their observers (see ENObserverVariant) and have the
+    same seed entropy are simulated together: each chunk of replicates runs once, and every config's
+    results are read off it, exactly as if it had been run alone."""
+    def __init__(self,
+                 configs: List[ENParams],
+                 seed_entropies: List[int],
+                 sim_count: int,
+                 options: ENSimOptions,
+                 chunk_size: Optional[int],
+                 processes: Optional[int],
+                 result_store: Optional[ENResultStore],
+                 checkpoint: Optional[ENSweepCheckpoint],
+                 scheduling: ENSweepScheduling = ENSweepScheduling.IN_ORDER,
+                 adaptive_sampling: Optional[ENAdaptiveSampling] = None,
+                 trajectory: Optional[ENTrajectoryConfig] = None,
+                 profile: bool = False,
+                 queue: Optional[ENWorkQueue] = None,
+                 progress: Optional[ENSweepProgress] = None,
+                 cache: Optional[ENResultCache] = None,
+                 start_method: Optional[str] = None,
+                 share_scientists: bool = False,
+                 executor: ENSweepExecutor = ENSweepExecutor.PROCESSES):
+        if adaptive_sampling and queue:
+            raise ValueError("Adaptive sampling decides on each batch before queueing the next "
+                             "and cannot run on a work queue.")
+        if (options.complete_network_updating != ENCompleteNetworkUpdating.PER_INFLUENCER
+            and options.engine != ENSimEngine.OBJECT_GRAPH):
+            raise ValueError("The updating of complete networks can only be chosen for the object graph engine.")
+        if adaptive_sampling:
+            if not 1 <= adaptive_sampling.min_sims <= adaptive_sampling.max_sims:
+                raise ValueError("Adaptive sampling needs 1 <= min_sims <= max_sims.")
+            sim_count = adaptive_sampling.max_sims
+        if sim_count < 1:
+            raise ValueError("There needs to be at least one simulation per config.")
+        self.configs = configs
+        self.seed_entropies = seed_entropies
+        self.sim_count = sim_count
+        self.options = options
+        self.processes = processes
+        self.adaptive_sampling = adaptive_sampling
+        self.chunk_size = chunk_size or self._default_chunk_size()
+        self.result_store = result_store
+        # The queue's results are checkpoint chunks
+        self.checkpoint = queue.results if queue else checkpoint
+        self.queue = queue
+        self.progress = progress
+        # A cache hit would not record trajectories, so sweeps that record them always simulate.
+        self.cache = cache if not trajectory else None
+        self.scheduling = scheduling
+        # A multiprocessing start method, or None for the platform's default. Threads ignore it, and
+        # a work queue's local workers are always processes.
+        self.start_method = start_method
+        self.executor = executor
+        self.trajectory = trajectory
+        self.profile = profile
+        # Adaptive sampling decides on each config's replicates separately, and trajectories and
+        # profiles describe a config's own simulation, so these sweeps run every config on its own.
+        self.share_scientists = share_scientists and not (adaptive_sampling or trajectory or profile)
+        initial_sim_count = self._aligned(adaptive_sampling.min_sims) if adaptive_sampling else sim_count
+        self.aggregators = [ENResultsAggregator(params, initial_sim_count, sim_count) for params in configs]
+        self._yielded: set[int] = set()
+        self._cached: Dict[int, ENCachedConfig] = {}
+        # While a process pool runs, the aggregators' results live here and workers write into them
+        self._shared_results: Optional[ENSharedResults] = None
+
+    def run(self) -> Iterator[Tuple[int, ENSimsSummary, float]]:
+        """ Yield (config index, summary, time elapsed) as configs finish; in config order unless
+        scheduling is COST_AWARE. The time of a config is the time workers spent simulating its
+        replicates, which leaves out pool start-up and IPC and stays meaningful when configs overlap."""
+        if self.cache:
+            self._load_cached()
+        if self.checkpoint:
+            self._resume_from_checkpoint()
+        if self.adaptive_sampling:
+            for i in range(len(self.configs)):
+                if i not in self._cached:
+                    self._extend_sampling(i)
+        if self.progress:
+            self.progress.start(self.aggregators)
+        yield from self._finished_configs()
+        if len(self._yielded) < len(self.configs):
+            if self.queue:
+                yield from self._run_on_queue()
+            else:
+                yield from self._run_on_pool()
+        if self.progress:
+            self.progress.report(self.aggregators, self._yielded, final=True)
+
+    def checkpoint_key(self, config_index: int) -> str:
+        key = config_key(self.configs[config_index],
+                         self.sim_count,
+                         self.seed_entropies[config_index],
+                         self.options)
+        if self.options.engine == ENSimEngine.VECTORIZED:
+            # The chunk size determines the random streams of a batch. Other engines seed every
+            # replicate on its own, so a resumed sweep takes their chunks whatever their boundaries,
+            # e.g. from a run with another process count.
+            return f'{key}-c{self.chunk_size}'
+        return key
+
+    def raw_results(self, config_index: int) -> np.ndarray:
+        """ A finished config's results, replicate by replicate (EN_RAW_RESULTS_DTYPE). A copy, as
+        the aggregators' results are shared with the workers while the sweep runs."""
+        aggregator = self.aggregators[config_index]
+        if aggregator.sims_done < aggregator.sim_count:
+            raise ValueError(f"The raw results of config {config_index} are not available, e.g. it was "
+                             "a cache hit without them.")
+        return aggregator.results[:aggregator.sim_count].copy()
+
+    ## Private methods
+    def _run_on_pool(self) -> Iterator[Tuple[int, ENSimsSummary, float]]:
+        if self.executor == ENSweepExecutor.PROCESSES:
+            self._share_results()
+        try:
+            yield from self._run_pool()
+        finally:
+            if self._shared_results:
+                self._unshare_results()
+
+    def _run_pool(self) -> Iterator[Tuple[int, ENSimsSummary, float]]:
+        with self._pool() as pool:
+            scheduler = None
+            if self.scheduling == ENSweepScheduling.IN_ORDER and not self.adaptive_sampling:
+                chunks = pool.imap_unordered(run_sim_chunk, self._pending_tasks())
+            else:
+                scheduler = ENSweepScheduler(self.configs,
+                                             self.processes or os.cpu_count() or 1,
+                                             cost_aware = self.scheduling == ENSweepScheduling.COST_AWARE)
+                chunks = scheduler.dispatch(pool, self._pending_tasks())
+            for chunk in chunks:
+                chunk = self._add_chunk(chunk)
+                if scheduler:
+                    scheduler.observe(chunk)
+                if self.adaptive_sampling:
+                    scheduler.add_tasks(self._extend_sampling(chunk.config_index))
+                yield from self._finished_configs()
+
+    def _pool(self):
+        initargs = (self.configs, self.options)
+        match self.executor:
+            case ENSweepExecutor.PROCESSES:
+                context = get_context(self.start_method)
+                if self.start_method == 'forkserver':
+                    # Workers fork from a server that has imported the simulation code, instead of importing it each.
+                    context.set_forkserver_preload(['sim.simworker'])
+                return context.Pool(self.processes, initializer=init_worker, initargs=initargs)
+            case ENSweepExecutor.THREADS:
+                # Every replicate has its own Generator, seeded by its spawn key, so threads share no
+                # random state, and the tables init_worker builds are read-only.
+                return ThreadPool(self.processes, initializer=init_worker, initargs=initargs)
+
+    def _share_results(self):
+        self._shared_results = ENSharedResults(len(self.configs), self.sim_count)
+        for i, aggregator in enumerate(self.aggregators):
+            self._shared_results.array[i] = aggregator.results
+            aggregator.results = self._shared_results.array[i]
+
+    def _unshare_results(self):
+        for aggregator in self.aggregators:
+            aggregator.results = aggregator.results.copy()
+        self._shared_results.close()
+        self._shared_results.unlink()
+        self._shared_results = None
+
+    def _pending_tasks(self) -> Iterator[ENSimChunkTask]:
+        if self.share_scientists:
+            yield from self._shared_tasks()
+            return
+        for i in range(len(self.configs)):
+            if i in self._cached:
+                continue
+            yield from self._tasks_for_config(i, 0)
+
+    def _tasks_for_config(self, i: int, from_sim: int) -> Iterator[ENSimChunkTask]:
+        """ The missing chunks among replicates from_sim..sim_count-1 of config i."""
+        for start, stop in self._segments([i], from_sim, self.aggregators[i].sim_count):
+            if self.aggregators[i].missing_ranges(start, stop):
+                yield self._task(i, start, stop)
+
+    def _shared_tasks(self) -> Iterator[ENSimChunkTask]:
+        """ A task per chunk of each group of configs that share their scientists, run by the first
+        config of the group that misses the chunk, with the others that miss it as observer variants."""
+        groups: Dict[Tuple[ENParams, int], List[int]] = {}
+        for i in range(len(self.configs)):
+            if i not in self._cached:
+                groups.setdefault((scientist_params(self.configs[i]), self.seed_entropies[i]), []).append(i)
+        for members in groups.values():
+            for start, stop in self._segments(members, 0, self.sim_count):
+                missing = [i for i in members if self.aggregators[i].missing_ranges(start, stop)]
+                if not missing:
+                    continue
+                lead, *variants = missing
+                yield self._task(lead, start, stop, tuple(self._observer_variant(i) for i in variants))
+
+    def _segments(self, members: List[int], from_sim: int, stop: int) -> List[Tuple[int, int]]:
+        """ Replicates from_sim..stop-1 cut on the chunk grid and wherever the members' chunks start
+        or end, which need not be on the grid for chunks resumed from a checkpoint. A member has
+        either all or none of each segment."""
+        bounds = set(range(math.ceil(from_sim / self.chunk_size) * self.chunk_size, stop, self.chunk_size))
+        bounds.add(from_sim)
+        for i in members:
+            for missing_start, missing_stop in self.aggregators[i].missing_ranges(from_sim, stop):
+                bounds.update((missing_start, missing_stop))
+        bounds = sorted(bound for bound in bounds if bound < stop)
+        return list(zip(bounds, bounds[1:] + [stop]))
+
+    def _task(self,
+              i: int,
+              start: int,
+              stop: int,
+              observer_variants: Tuple[ENObserverVariant, ...] = ()) -> ENSimChunkTask:
+        return ENSimChunkTask(i,
+                              self.configs[i],
+                              self.seed_entropies[i],
+                              start,
+                              stop,
+                              self.options,
+                              self.trajectory,
+                              self.profile,
+                              observer_variants,
+                              self._shared_results.buffer if self._shared_results else None)
+
+    def _observer_variant(self, i: int) -> ENObserverVariant:
+        params = self.configs[i]
+        influencer_count = params.passive_updaters_config.scientist_influencer_count if params.passive_updaters_config else 0
+        return ENObserverVariant(i, influencer_count, params.selective_propagandist_active)
+
+    def _extend_sampling(self, i: int) -> List[ENSimChunkTask]:
+        aggregator = self.aggregators[i]
+        tasks: List[ENSimChunkTask] = []
+        while aggregator.sampling_report is None and aggregator.is_complete():
+            if not aggregator.decide_sampling(self.adaptive_sampling):
+                break
+            previous_sim_count = aggregator.sim_count
+            aggregator.sim_count = self._aligned(previous_sim_count + self.adaptive_sampling.batch_size)
+            tasks.extend(self._tasks_for_config(i, previous_sim_count))
+        return tasks
+
+    def _aligned(self, sim_count: int) -> int:
+        # Keeps batches on the chunk grid, so that resumed chunks line up
+        return min(self.sim_count, math.ceil(sim_count / self.chunk_size) * self.chunk_size)
+
+    def _add_chunk(self, chunk: ENSimChunkResult) -> ENSimChunkResult:
+        """ Add the chunk's results and return it with them, read from shared memory if need be."""
+        if self._shared_results:
+            chunk = self._shared_results.read_chunk(chunk)._replace(
+                variant_chunks=tuple(self._shared_results.read_chunk(variant_chunk) for variant_chunk in chunk.variant_chunks))
+        for config_chunk in (chunk._replace(variant_chunks=()), *chunk.variant_chunks):
+            if self.checkpoint:
+                self.checkpoint.save_chunk(self.checkpoint_key(config_chunk.config_index), config_chunk)
+            self.aggregators[config_chunk.config_index].add_chunk(config_chunk)
+            self._report_chunk(config_chunk.config_index)
+        return chunk
+
+    def _report_chunk(self, config_index: int):
+        if self.progress:
+            self.progress.chunk_added(config_index, self.aggregators[config_index])
+            self.progress.report(self.aggregators, self._yielded)
+
+    def _finished_configs(self) -> Iterator[Tuple[int, ENSimsSummary, float]]:
+        for i, aggregator in enumerate(self.aggregators):
+            if i in self._yielded:
+                continue
+            if i in self._cached:
+                self._yielded.add(i)
+                cached = self._cached[i]
+                if self.result_store and cached.raw_results is not None:
+                    self.result_store.save_config(self.configs[i],
+                                                  cached.sim_count,
+                                                  self.seed_entropies[i],
+                                                  self.options,
+                                                  cached.raw_results)
+                yield i, cached.summary, cached.time_elapsed
+                continue
+            finished = aggregator.is_complete() and (not self.adaptive_sampling or aggregator.sampling_report)
+            if not finished:
+                if self.scheduling == ENSweepScheduling.IN_ORDER:
+                    return
+                continue
+            self._yielded.add(i)
+            if self.result_store:
+                self.result_store.save_config(self.configs[i],
+                                              aggregator.sim_count,
+                                              self.seed_entropies[i],
+                                              self.options,
+                                              aggregator.results[:aggregator.sim_count])
+            summary = aggregator.summary()
+            if self.cache:
+                self.cache.put(self._cache_key(i), ENCachedConfig(summary,
+                                                                  aggregator.sim_count,
+                                                                  aggregator.time_elapsed,
+                                                                  aggregator.results[:aggregator.sim_count]))
+            yield i, summary, aggregator.time_elapsed
+
+    def _resume_from_checkpoint(self, live: bool = False) -> int:
+        """ Add the checkpointed chunks that are not in the aggregators yet and return how many there were.
+        live if they were simulated in this run."""
+        added = 0
+        for i, aggregator in enumerate(self.aggregators):
+            if i in self._yielded or i in self._cached:
+                continue
+            for chunk in self.checkpoint.load_chunks(self.checkpoint_key(i), i, aggregator.has_chunk):
+                for part in _missing_parts(chunk, aggregator):
+                    aggregator.add_chunk(part)
+                    if live:
+                        self._report_chunk(i)
+                    added += 1
+        return added
+
+    def _load_cached(self):
+        for i, aggregator in enumerate(self.aggregators):
+            cached = self.cache.get(self._cache_key(i))
+            if cached is None:
+                continue
+            self._cached[i] = cached
+            if cached.raw_results is not None:
+                # For the running totals
+                aggregator.sim_count = cached.sim_count
+                aggregator.add_chunk(ENSimChunkResult(i, 0, cached.raw_results, cached.time_elapsed))
+
+    def _cache_key(self, config_index: int) -> str:
+        return self.cache.key(self.configs[config_index],
+                              self.sim_count,
+                              self.seed_entropies[config_index],
+                              self.options,
+                              self.adaptive_sampling,
+                              self.chunk_size,
+                              self.profile)
+
+    def _run_on_queue(self) -> Iterator[Tuple[int, ENSimsSummary, float]]:
+        for task in self._pending_tasks():
+            self.queue.submit(self.checkpoint_key(task.config_index),
+                              task,
+                              [self.checkpoint_key(variant.config_index) for variant in task.observer_variants])
+        workers = self.queue.start_workers(self.processes if self.processes is not None else os.cpu_count() or 1)
+        try:
+            while len(self._yielded) < len(self.configs):
+                if failures := self.queue.failures():
+                    raise RuntimeError(f"{len(failures)} queued tasks failed. The first:\n{failures[0]}")
+                if not self._resume_from_checkpoint(live=True):
+                    self.queue.requeue_stale()
+                    time.sleep(self.queue.poll_interval)
+                yield from self._finished_configs()
+        except BaseException:
+            for worker in workers:
+                worker.terminate()
+            raise
+        finally:
+            for worker in workers:
+                worker.join()
+
+    def _default_chunk_size(self) -> int:
+        # With adaptive sampling, size the chunks for a batch rather than for the ceiling.
+        sim_count = self.adaptive_sampling.batch_size if self.adaptive_sampling else self.sim_count
+        match self.options.engine:
+            case ENSimEngine.OBJECT_GRAPH | ENSimEngine.STRUCT_OF_ARRAYS:
+                # Same heuristic as the default chunksize of Pool.map
+                processes = self.processes or os.cpu_count() or 1
+                return max(1, math.ceil(sim_count / (4 * processes)))
+            case ENSimEngine.VECTORIZED:
+                # A chunk is one batch, and the batch size determines the random streams. Do not let it
+                # depend on the machine.
+                return sim_count
+
+def _missing_parts(chunk: ENSimChunkResult, aggregator: ENResultsAggregator) -> List[ENSimChunkResult]:
+    """ The parts of a checkpointed chunk whose replicates the aggregator does not have yet, which
+    are all of it unless it was saved by a run with other chunk boundaries. The time of a part is
+    the chunk's time pro rata, and only a whole chunk keeps its profile."""
+    stop = chunk.start + len(chunk.raw_results)
+    parts = []
+    for part_start, part_stop in aggregator.missing_ranges(chunk.start, stop):
+        if (part_start, part_stop) == (chunk.start, stop):
+            return [chunk]
+        parts.append(chunk._replace(start=part_start,
+                                    raw_results=chunk.raw_results[part_start - chunk.start:part_stop - chunk.start],
+                                    time_elapsed=chunk.time_elapsed * (part_stop - part_start) / len(chunk.raw_results),
+                                    profile=None))
+    return parts
+
+def scientist_params(params: ENParams) -> ENParams:
+    """ params without what only its observers depend on (see ENObserverVariant). Configs with the
+    same scientist params and seed entropy have the same scientists, replicate by replicate."""
+    passive_updaters_config = params.passive_updaters_config
+    if passive_updaters_config:
+        passive_updaters_config = passive_updaters_config._replace(scientist_influencer_count=0)
+    return params._replace(passive_updaters_config=passive_updaters_config, selective_propagandist_active=False)
@@ -0,0 +1,203 @@
+import numpy as np
+from sim.simresults import confidence_half_widths, summarize_raw_results
+from sim.simsetup import ENSimSetup
+from sim.sim_models import *
+from typing import Any, Dict, List, Optional, Tuple
+
+""" Where does a statistic cross a target as one parameter varies? E.g. the epsilon at which the
+passive updaters' average credence at consensus rises above 0.5 despite the propagandist. Instead
+of a dense grid, ENThresholdSearch bisects [low, high] on noisy estimates: it keeps the narrowest
+bracket of evaluated values whose estimates lie on either side of the target, gives more replicates
+to a bracket end whose confidence interval still contains the target (the less certain end first),
+and only then evaluates the middle of the bracket.
+
+Every evaluation is a batch of simsetup.sim_count replicates. The b-th batch of any value is seeded
+with simsetup.seed_base + b, so values are compared on common random numbers, and a rerun with a
+cache_dir or checkpoint_dir set reuses what was simulated before."""
+
+class ENThresholdSearch():
+    def __init__(self,
+                 simsetup: ENSimSetup,
+                 params: ENParams,
+                 field: str,
+                 low: float,
+                 high: float,
+                 target: float,
+                 statistic: ENThresholdStatistic = ENThresholdStatistic.PROPORTION_CONSENSUS_REACHED,
+                 tolerance: Optional[float] = None,
+                 max_sims: int = 20000,
+                 max_point_sims: Optional[int] = None,
+                 confidence: float = 0.95,
+                 output_filename: Optional[str] = None):
+        if simsetup.adaptive_sampling:
+            raise ValueError("A threshold search runs batches of sim_count replicates. Turn off adaptive sampling.")
+        if not low < high:
+            raise ValueError(f"The search needs low < high, got [{low}, {high}].")
+        self.simsetup = simsetup
+        self.params = params
+        # An ENParams field, or e.g. 'passive_updaters_config.scientist_influencer_count'
+        self.field = field
+        current = field_value(params, field)
+        self._integer = isinstance(current, int) and not isinstance(current, bool)
+        if self._integer:
+            low, high = int(low), int(high)
+        self.low = low
+        self.high = high
+        self.target = target
+        self.statistic = statistic
+        # The search stops once the crossing is bracketed this narrowly. Integer fields stop at
+        # neighbouring values by default.
+        self.tolerance = tolerance if tolerance is not None else (1 if self._integer else (high - low) / 64)
+        self.max_sims = max_sims
+        # No value gets more replicates than this, so a value where the statistic is right at the
+        # target cannot take the whole budget
+        self.max_point_sims = max_point_sims or max(simsetup.sim_count, max_sims // 4)
+        self.confidence = confidence
+        # The evaluated values are written to this CSV file as the usual rows when given, or to a
+        # suffixed one if it has other columns (see ENSimSetup.output_path)
+        self.output_filename = simsetup.output_path(output_filename) if output_filename else None
+        self._batches: Dict[Any, List[np.ndarray]] = {}
+        self._time_elapsed: Dict[Any, float] = {}
+
+    ## Interface
+    def run(self) -> ENThresholdEstimate:
+        self._evaluate([self.low, self.high])
+        converged = False
+        while True:
+            a, b = self._bracket()
+            value = self._next_value(a, b)
+            if value is None:
+                converged = bool(self._confident(a) and self._confident(b))
+                break
+            if self._sim_count() + self.simsetup.sim_count > self.max_sims:
+                print(f'Replicate budget of {self.max_sims} spent')
+                break
+            self._evaluate([value])
+        if self.output_filename:
+            self._record()
+        return self._estimate(a, b, converged)
+
+    ## Private methods
+    def _evaluate(self, values: List[Any]):
+        configs = [params_with_field(self.params, self.field, value) for value in values]
+        seed_entropies = [self.simsetup.seed_base + len(self._batches.setdefault(value, [])) for value in values]
+        sweep = self.simsetup.sweep(configs, seed_entropies)
+        for i, _, time_elapsed in sweep.run():
+            value = values[i]
+            self._batches[value].append(sweep.raw_results(i))
+            self._time_elapsed[value] = self._time_elapsed.get(value, 0.) + time_elapsed
+            statistic, half_width = self._statistic(value)
+            print(f'{self.field} = {value}: {self.statistic.name} {statistic:.3f} ± {half_width:.3f} '
+                  f'over {self._point_sims(value)} sims')
+
+    def _bracket(self) -> Tuple[Any, Any]:
+        """ The first pair of neighbouring values whose estimates lie on either side of the target,
+        going from low to high."""
+        values = sorted(self._batches)
+        low_side = self._above(self.low)
+        for a, b in zip(values, values[1:]):
+            if self._above(a) == low_side and self._above(b) != low_side:
+                return a, b
+        raise ValueError(f"{self.statistic.name} does not cross {self.target} between "
+                         f"{self.field} = {self.low} and {self.high}.")
+
+    def _next_value(self, a: Any, b: Any) -> Optional[Any]:
+        # More replicates for an uncertain bracket end, then a narrower bracket
+        uncertain = [value for value in (a, b) if not self._confident(value)
+                     and self._point_sims(value) + self.simsetup.sim_count <= self.max_point_sims]
+        if uncertain:
+            return min(uncertain, key=self._z_score)
+        if b - a <= self.tolerance:
+            return None
+        if self._integer:
+            return (a + b) // 2
+        return (a + b) / 2
+
+    def _estimate(self, a: Any, b: Any, converged: bool) -> ENThresholdEstimate:
+        statistic_a, _ = self._statistic(a)
+        statistic_b, _ = self._statistic(b)
+        # Linear interpolation within the bracket
+        crossing = a + (self.target - statistic_a) * (b - a) / (statistic_b - statistic_a)
+        # Between the closest values known to lie on either side of the target
+        low_side = self._above(self.low)
+        ci_low = max((value for value in self._batches
+                      if value <= a and self._confident(value) and self._above(value) == low_side),
+                     default=self.low)
+        ci_high = min((value for value in self._batches
+                       if value >= b and self._confident(value) and self._above(value) != low_side),
+                      default=self.high)
+        points = tuple(ENThresholdPoint(value, self._point_sims(value), *self._statistic(value))
+                       for value in sorted(self._batches))
+        return ENThresholdEstimate(self.field,
+                                   self.target,
+                                   self.statistic,
+                                   float(crossing),
+                                   ci_low,
+                                   ci_high,
+                                   converged,
+                                   self._sim_count(),
+                                   points)
+
+    def _record(self):
+        for value in sorted(self._batches):
+            params = params_with_field(self.params, self.field, value)
+            sims_summary = summarize_raw_results(params, self._raw_results(value))
+            csv_data = self.simsetup.data_for_writing(sims_summary, self._point_sims(value), self._time_elapsed[value])
+            self.simsetup.record_sim(csv_data, self.output_filename)
+
+    def _statistic(self, value: Any) -> Tuple[float, float]:
+        return threshold_statistic(self._raw_results(value), self.statistic, self.confidence)
+
+    def _above(self, value: Any) -> bool:
+        return self._statistic(value)[0] > self.target
+
+    def _confident(self, value: Any) -> bool:
+        """ Whether the confidence interval at value excludes the target."""
+        statistic, half_width = self._statistic(value)
+        return bool(abs(statistic - self.target) > half_width)
+
+    def _z_score(self, value: Any) -> float:
+        statistic, half_width = self._statistic(value)
+        if not half_width:
+            return np.inf
+        return abs(statistic - self.target) / half_width
+
+    def _raw_results(self, value: Any) -> np.ndarray:
+        return np.concatenate(self._batches[value])
+
+    def _point_sims(self, value: Any) -> int:
+        return sum(len(batch) for batch in self._batches[value])
+
+    def _sim_count(self) -> int:
+        return sum(self._point_sims(value) for value in self._batches)
+
+def threshold_statistic(array: np.ndarray,
+                        statistic: ENThresholdStatistic,
+                        confidence: float) -> Tuple[float, float]:
+    """ The statistic over raw results (EN_RAW_RESULTS_DTYPE), as in summarize_raw_results but
+    unrounded, and the half-width of its confidence interval."""
+    proportion_hw, _, passive_cr_hw = confidence_half_widths(array, confidence)
+    match statistic:
+        case ENThresholdStatistic.PROPORTION_CONSENSUS_REACHED:
+            return float(np.count_nonzero(array['consensus_round']) / len(array)), proportion_hw
+        case ENThresholdStatistic.PASSIVE_UPDATERS_AVG_CREDENCE:
+            passive_crs = array['passive_updaters_avg_credence']
+            passive_crs = passive_crs[~np.isnan(passive_crs) & (passive_crs != 0)]
+            if not len(passive_crs):
+                raise ValueError("No replicate has a passive updater credence: there are no passive "
+                                 "updaters, or the scientists never reached consensus.")
+            return float(np.mean(passive_crs)), passive_cr_hw
+
+def field_value(params: Any, field: str) -> Any:
+    for name in field.split('.'):
+        if params is None or name not in params._fields:
+            raise ValueError(f"{field} is not a field of ENParams.")
+        params = getattr(params, name)
+    return params
+
+def params_with_field(params: Any, field: str, value: Any) -> Any:
+    """ params with field, which may be dotted, e.g. 'passive_updaters_config.updater_count', set to value."""
+    name, _, rest = field.partition('.')
+    if rest:
+        value = params_with_field(getattr(params, name), rest, value)
+    return params._replace(**{name: value})
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import numpy as np
+from sim.serialization import params_key, to_json_value
+from sim.sim_models import *
+from typing import List, NamedTuple, Optional
+
+""" Per-round credence trajectories of sampled replicates. Each recorded replicate gets a directory
+with two preallocated memory-mapped files: credences.npy, float32 of shape (rows, scientists +
+passive updaters), and rounds.npy, int32 giving the round of each row (0 for unused rows). Rows are
+the state at the start of rounds 1, 1 + stride, 1 + 2 * stride, ..., plus the final round. Layout:
+<directory>/<params key>-<seed entropy>/replicate_<index>/."""
+
+class ENTrajectory(NamedTuple):
+    rounds: np.ndarray
+    scientist_credences: np.ndarray # (rows, scientists), memory-mapped
+    passive_credences: np.ndarray # (rows, passive updaters), memory-mapped
+
+class ENTrajectoryRecorder():
+    def __init__(self,
+                 path: str,
+                 max_rounds: int,
+                 stride: int,
+                 scientist_count: int,
+                 passive_count: int):
+        os.makedirs(path, exist_ok=True)
+        rows = -(-max_rounds // stride) + 1
+        self.stride = stride
+        self.scientist_count = scientist_count
+        self.next_round = 1
+        self._row = 0
+        self._credences = np.lib.format.open_memmap(os.path.join(path, 'credences.npy'), mode='w+',
+                                                    dtype=np.float32,
+                                                    shape=(rows, scientist_count + passive_count))
+        self._rounds = np.lib.format.open_memmap(os.path.join(path, 'rounds.npy'), mode='w+',
+                                                 dtype=np.int32, shape=(rows,))
+
+    def record(self, sim_round: int, scientist_credences, passive_credences):
+        """ Call when sim_round == next_round."""
+        self._write(sim_round, scientist_credences, passive_credences)
+        self.next_round = sim_round + self.stride
+
+    def finish(self, final_round: int, scientist_credences, passive_credences):
+        if self._row == 0 or self._rounds[self._row - 1] != final_round:
+            self._write(final_round, scientist_credences, passive_credences)
+        self._credences.flush()
+        self._rounds.flush()
+
+    def _write(self, sim_round: int, scientist_credences, passive_credences):
+        self._rounds[self._row] = sim_round
+        self._credences[self._row, :self.scientist_count] = scientist_credences
+        if passive_credences is not None:
+            self._credences[self._row, self.scientist_count:] = passive_credences
+        self._row += 1
+
+def trajectory_recorders(trajectory_config: Optional[ENTrajectoryConfig],
+                         params: ENParams,
+                         seed_entropy: int,
+                         start: int,
+                         stop: int) -> dict[int, ENTrajectoryRecorder]:
+    """ Recorders for the sampled replicates among start..stop-1, keyed by replicate index."""
+    if not trajectory_config:
+        return {}
+    config_dir = trajectory_config_dir(trajectory_config.directory, params, seed_entropy)
+    _write_params(config_dir, params)
+    passive_count = params.passive_updaters_config.updater_count if params.passive_updaters_config else 0
+    first = -(-start // trajectory_config.sample_every) * trajectory_config.sample_every
+    return {i: ENTrajectoryRecorder(os.path.join(config_dir, f'replicate_{i:06d}'),
+                                    params.max_research_rounds_allowed,
+                                    trajectory_config.stride,
+                                    params.scientist_pop_count,
+                                    passive_count)
+            for i in range(first, stop, trajectory_config.sample_every)}
+
+def trajectory_config_dir(directory: str, params: ENParams, seed_entropy: int) -> str:
+    return os.path.join(directory, f'{params_key(params)}-{seed_entropy}')
+
+def recorded_replicates(config_dir: str) -> List[int]:
+    return sorted(int(name[len('replicate_'):]) for name in os.listdir(config_dir)
+                  if name.startswith('replicate_'))
+
+def load_trajectory(config_dir: str, replicate: int) -> ENTrajectory:
+    """ Memory-map one replicate's trajectory. Slices are only read from disk when used."""
+    path = os.path.join(config_dir, f'replicate_{replicate:06d}')
+    rounds = np.load(os.path.join(path, 'rounds.npy'))
+    credences = np.load(os.path.join(path, 'credences.npy'), mmap_mode='r')[:np.count_nonzero(rounds)]
+    with open(os.path.join(config_dir, 'params.json')) as f:
+        scientist_count = json.load(f)['scientist_pop_count']
+    return ENTrajectory(rounds[:len(credences)], credences[:, :scientist_count], credences[:, scientist_count:])
+
+def _write_params(config_dir: str, params: ENParams):
+    path = os.path.join(config_dir, 'params.json')
+    if os.path.isfile(path):
+        return
+    os.makedirs(config_dir, exist_ok=True)
+    # Several workers may get here at once, so write under a private name and rename. Thread
+    # workers share their pid.
+    tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(to_json_value(params), f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import time
+import traceback
+from multiprocessing import Process
+from sim.checkpoint import ENSweepCheckpoint
+from sim.serialization import chunk_task_from_json, to_json_value
+from sim.simworker import run_sim_chunk
+from sim.sim_models import *
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+""" A work queue of replicate chunks in a shared directory, so that a sweep can run on several
+machines. The coordinator (ENSweep with a queue) writes one JSON file per chunk task into tasks/.
+Workers anywhere the directory is mounted claim a task by renaming it into claimed/, which only
+one of them can do, run it, and save the result in results/ - an ENSweepCheckpoint, so the shards
+are ordinary checkpoint chunks. The coordinator merges them as they appear. A task carries its
+config and the seed entropy of its replicates, which are seeded by their spawn keys as in a local
+run, so the merged summaries are the same as those of a local run with the same chunk size.
+Trajectories are written wherever the task's ENTrajectoryConfig points, which then needs to be
+shared as well.
+
+Run a worker with: python -m sim.workqueue <directory> [--processes N] [--wait]"""
+
+TASKS_DIRNAME = 'tasks'
+CLAIMED_DIRNAME = 'claimed'
+FAILED_DIRNAME = 'failed'
+RESULTS_DIRNAME = 'results'
+
+class ENQueuedTask(NamedTuple):
+    name: str
+    key: str # Checkpoint key of the task's config
+    task: ENSimChunkTask
+    variant_keys: Tuple[str, ...] = () # Those of its observer variants
+
+class ENWorkQueue():
+    def __init__(self,
+                 directory: str,
+                 poll_interval: float = 1.,
+                 requeue_after: Optional[float] = None):
+        self.directory = directory
+        # Seconds between looks at the directory when there is nothing to do
+        self.poll_interval = poll_interval
+        # Claims older than this many seconds are put back in the queue, for workers on other hosts
+        # that may have died. Claims of dead workers on this host are always put back.
+        self.requeue_after = requeue_after
+        self.tasks_dir = os.path.join(directory, TASKS_DIRNAME)
+        self.claimed_dir = os.path.join(directory, CLAIMED_DIRNAME)
+        self.failed_dir = os.path.join(directory, FAILED_DIRNAME)
+        for path in (self.tasks_dir, self.claimed_dir, self.failed_dir):
+            os.makedirs(path, exist_ok=True)
+        self.results = ENSweepCheckpoint(os.path.join(directory, RESULTS_DIRNAME))
+
+    ## Interface
+    def submit(self, key: str, task: ENSimChunkTask, variant_keys: Sequence[str] = ()):
+        """ Queue a chunk of the config with checkpoint key key, unless it is queued, claimed or
+        done already. variant_keys are those of the task's observer variants."""
+        # Coordinators with other chunk sizes can queue other chunks of the same config
+        name = f'{key}-{task.start:09d}-{task.stop:09d}'
+        if (os.path.isfile(os.path.join(self.tasks_dir, f'{name}.json'))
+            or self._claims_of(name)
+            or any(len(chunk.raw_results) >= task.stop - task.start
+                   for chunk in self.results.load_chunks(key, task.config_index, lambda start: start != task.start))):
+            return
+        path = os.path.join(self.tasks_dir, f'{name}.json')
+        tmp_path = os.path.join(self.tasks_dir, f'.{name}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'task': to_json_value(task), 'variant_keys': list(variant_keys)}, f)
+        os.replace(tmp_path, path)
+
+    def claim(self) -> Optional[ENQueuedTask]:
+        """ Take the oldest queued task, or return None if there are none."""
+        for filename in self._task_filenames():
+            name = filename[:-len('.json')]
+            claimed_path = os.path.join(self.claimed_dir, f'{name}@{_worker_id()}')
+            try:
+                os.rename(os.path.join(self.tasks_dir, filename), claimed_path)
+            except FileNotFoundError:
+                continue # Claimed by another worker in the meantime
+            # A rename keeps the mtime. The claim's age is measured from now.
+            os.utime(claimed_path)
+            with open(claimed_path) as f:
+                d = json.load(f)
+            return ENQueuedTask(name, d['key'], chunk_task_from_json(d['task']), tuple(d.get('variant_keys', ())))
+        return None
+
+    def complete(self, queued: ENQueuedTask, chunk: ENSimChunkResult):
+        self.results.save_chunk(queued.key, chunk._replace(variant_chunks=()))
+        for key, variant_chunk in zip(queued.variant_keys, chunk.variant_chunks):
+            self.results.save_chunk(key, variant_chunk)
+        self._release(queued.name)
+
+    def work(self, wait: bool = False) -> int:
+        """ Run queued tasks until there are none left, or forever if wait. Return how many were run."""
+        done = 0
+        while True:
+            queued = self.claim()
+            if queued is None:
+                if not wait:
+                    return done
+                time.sleep(self.poll_interval)
+                continue
+            try:
+                chunk = run_sim_chunk(queued.task)
+            except Exception:
+                with open(os.path.join(self.failed_dir, f'{queued.name}@{_worker_id()}.txt'), 'w') as f:
+                    f.write(traceback.format_exc())
+                self._release(queued.name)
+                raise
+            self.complete(queued, chunk)
+            done += 1
+
+    def requeue_stale(self) -> int:
+        """ Put the claims of dead workers back in the queue. Return how many were put back."""
+        requeued = 0
+        hostname = socket.gethostname()
+        for filename in os.listdir(self.claimed_dir):
+            name, _, worker = filename.rpartition('@')
+            host, _, pid = worker.rpartition('-')
+            path = os.path.join(self.claimed_dir, filename)
+            try:
+                age = time.time() - os.path.getmtime(path)
+            except FileNotFoundError:
+                continue # Completed in the meantime
+            dead = host == hostname and not _pid_alive(int(pid))
+            if dead or (self.requeue_after is not None and age > self.requeue_after):
+                try:
+                    os.rename(path, os.path.join(self.tasks_dir, f'{name}.json'))
+                except FileNotFoundError:
+                    continue
+                requeued += 1
+        return requeued
+
+    def failures(self) -> List[str]:
+        """ The tracebacks of the tasks that raised."""
+        failures = []
+        for filename in sorted(os.listdir(self.failed_dir)):
+            with open(os.path.join(self.failed_dir, filename)) as f:
+                failures.append(f.read())
+        return failures
+
+    def start_workers(self, count: int, wait: bool = False) -> List[Process]:
+        """ Start count worker processes on this machine. See work."""
+        workers = [Process(target=self.work, args=(wait,)) for _ in range(count)]
+        for worker in workers:
+            worker.start()
+        return workers
+
+    ## Private methods
+    def _task_filenames(self) -> List[str]:
+        filenames = []
+        for filename in os.listdir(self.tasks_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                mtime = os.stat(os.path.join(self.tasks_dir, filename)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            filenames.append((mtime, filename))
+        return [filename for _, filename in sorted(filenames)]
+
+    def _claims_of(self, name: str) -> List[str]:
+        return [filename for filename in os.listdir(self.claimed_dir) if filename.rpartition('@')[0] == name]
+
+    def _release(self, name: str):
+        try:
+            os.remove(os.path.join(self.claimed_dir, f'{name}@{_worker_id()}'))
+        except FileNotFoundError:
+            pass # Requeued while it ran, and possibly run again. The results are the same.
+
+def _worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the chunk tasks queued in a shared directory.")
+    parser.add_argument('directory')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to run on this machine (default: one per CPU)")
+    parser.add_argument('--wait', action='store_true',
+                        help="keep polling for new tasks instead of exiting when the queue is empty")
+    parser.add_argument('--poll-interval', type=float, default=1.)
+    args = parser.parse_args()
+    queue = ENWorkQueue(args.directory, args.poll_interval)
+    workers = queue.start_workers(args.processes, args.wait)
+    # Stop the workers too when this process is terminated. Their claims are put back in the queue
+    # by the coordinator.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+if __name__ == '__main__':
+    main()
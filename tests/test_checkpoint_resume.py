@@ -0,0 +1,43 @@
+import os
+import numpy as np
+from sim.checkpoint import ENSweepCheckpoint
+from sim.simresults import EN_RAW_RESULTS_DTYPE
+from sim.sweep import ENSweep
+from sim.sim_models import *
+
+""" A sweep resumes from the chunks checkpointed by a run with another chunk size, e.g. one whose
+default chunk size came from another process count, and ends up with the results of an
+uninterrupted run."""
+
+CONFIGS = [ENParams(pop, ENetworkType.CYCLE, 10, 0.05, 0.5, 1000, 0.99, None, False) for pop in (4, 6)]
+
+def run_sweep(chunk_size: int, checkpoint: ENSweepCheckpoint, processes: int = 1) -> ENSweep:
+    sweep = ENSweep(CONFIGS, [253, 254], 20, ENSimOptions(), chunk_size, processes, None, checkpoint,
+                    executor=ENSweepExecutor.THREADS)
+    list(sweep.run())
+    return sweep
+
+def test_checkpoint_key_leaves_out_chunk_size(tmp_path):
+    checkpoint = ENSweepCheckpoint(str(tmp_path))
+    one = ENSweep(CONFIGS, [253, 254], 20, ENSimOptions(), None, 1, None, checkpoint)
+    four = ENSweep(CONFIGS, [253, 254], 20, ENSimOptions(), None, 4, None, checkpoint)
+    assert one.chunk_size != four.chunk_size
+    assert one.checkpoint_key(0) == four.checkpoint_key(0)
+
+def test_resume_with_other_chunk_size(tmp_path):
+    uninterrupted = run_sweep(20, ENSweepCheckpoint(str(tmp_path / 'uninterrupted')))
+    checkpoint = ENSweepCheckpoint(str(tmp_path / 'interrupted'))
+    first = run_sweep(6, checkpoint)
+    # As if the first run had been interrupted after its first and third chunks
+    for i in range(len(CONFIGS)):
+        config_dir = os.path.join(checkpoint.directory, first.checkpoint_key(i))
+        for filename in os.listdir(config_dir):
+            if not (filename.startswith('0-') or filename.startswith('12-')):
+                os.remove(os.path.join(config_dir, filename))
+    resumed = run_sweep(8, checkpoint)
+    for i in range(len(CONFIGS)):
+        for field in EN_RAW_RESULTS_DTYPE.names:
+            np.testing.assert_array_equal(resumed.raw_results(i)[field], uninterrupted.raw_results(i)[field])
+        # Replicates 0-5 and 12-17 came from the checkpoint, the rest was simulated again
+        starts = sorted(chunk.start for chunk in checkpoint.load_chunks(resumed.checkpoint_key(i), i))
+        assert starts == [0, 6, 8, 12, 18]
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from sim.simworker import run_sim_chunk
+from sim.sim_models import *
+
+""" ENCompleteNetworkUpdating.SEQUENTIAL pools the evidence each scientist of a complete network has
+seen into one update per round, and must give the results of updating per influencer."""
+
+CONFIGS = [ENParams(4, ENetworkType.COMPLETE, 1000, 0.001, 0.5, 10000, 0.99, None, False),
+           ENParams(10, ENetworkType.COMPLETE, 10, 0.05, 0.5, 10000, 0.99, ENPassiveUpdatersConfig(1, 0.0001, 0.5, 5), True),
+           ENParams(20, ENetworkType.COMPLETE, 10, 0.01, 0.5, 2000, 0.99, ENPassiveUpdatersConfig(2, 0, 0.5, 20), False)]
+
+def raw_results(params: ENParams,
+                credence_representation: ENCredenceRepresentation,
+                complete_network_updating: ENCompleteNetworkUpdating) -> np.ndarray:
+    options = ENSimOptions(ENSimEngine.OBJECT_GRAPH,
+                           credence_representation,
+                           complete_network_updating=complete_network_updating)
+    return run_sim_chunk(ENSimChunkTask(0, params, 253, 0, 40, options)).raw_results
+
+@pytest.mark.parametrize('credence_representation', list(ENCredenceRepresentation))
+@pytest.mark.parametrize('params', CONFIGS)
+def test_sequential_matches_per_influencer(params: ENParams, credence_representation: ENCredenceRepresentation):
+    per_influencer = raw_results(params, credence_representation, ENCompleteNetworkUpdating.PER_INFLUENCER)
+    sequential = raw_results(params, credence_representation, ENCompleteNetworkUpdating.SEQUENTIAL)
+    for field in per_influencer.dtype.names:
+        np.testing.assert_array_equal(sequential[field], per_influencer[field], err_msg=field)
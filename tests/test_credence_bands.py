@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from network.network import ENetworkForBinomialUpdating
+from sim.stopconditions import ENCredenceBands
+from sim.sim_models import *
+
+""" The object graph's scientists keep ENCredenceBands' running counts equal to a count of their
+credences, in both representations and however a complete network updates."""
+
+@pytest.mark.parametrize('credence_representation', list(ENCredenceRepresentation))
+@pytest.mark.parametrize('network_type, complete_network_updating',
+                         [(ENetworkType.CYCLE, ENCompleteNetworkUpdating.PER_INFLUENCER),
+                          (ENetworkType.COMPLETE, ENCompleteNetworkUpdating.SEQUENTIAL),
+                          (ENetworkType.COMPLETE, ENCompleteNetworkUpdating.SYNCHRONOUS)])
+@pytest.mark.parametrize('low_stop, high_stop', [(0.5, 0.99), (0.3, 0.7), (0., 1.)])
+def test_running_counts_match_credences(credence_representation: ENCredenceRepresentation,
+                                        network_type: ENetworkType,
+                                        complete_network_updating: ENCompleteNetworkUpdating,
+                                        low_stop: float,
+                                        high_stop: float):
+    network = ENetworkForBinomialUpdating(np.random.default_rng(253), 12, network_type, 5, 0.02, low_stop,
+                                          None, False, credence_representation,
+                                          complete_network_updating=complete_network_updating)
+    bands = ENCredenceBands(low_stop, high_stop)
+    network.track_credence_bands(bands)
+    for _ in range(300):
+        credences = network.credences
+        assert (bands.population, bands.below, bands.above) == (len(credences),
+                                                                np.count_nonzero(credences < low_stop),
+                                                                np.count_nonzero(credences > high_stop))
+        network.enetwork_play_round()
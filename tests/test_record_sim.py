@@ -0,0 +1,40 @@
+import csv
+import pytest
+from sim.simsetup import ENSimSetup
+from sim.sim_models import *
+
+""" record_sim appends rows only to a CSV file whose header matches their columns, which change
+with ENParams and with the optional sampling and profile reports."""
+
+HEADERS = ['Sim count', 'pop', 'sim time (s)']
+
+def test_appends_under_matching_header(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    simsetup = ENSimSetup(10, None)
+    simsetup.record_sim(ENResultsCSVWritableSummary(HEADERS, ['10', '4', '1.0']), path)
+    simsetup.record_sim(ENResultsCSVWritableSummary(HEADERS, ['10', '6', '2.0']), path)
+    with open(path, newline='') as csv_file:
+        assert list(csv.reader(csv_file)) == [HEADERS, ['10', '4', '1.0'], ['10', '6', '2.0']]
+
+def test_refuses_other_columns(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    simsetup = ENSimSetup(10, None)
+    simsetup.record_sim(ENResultsCSVWritableSummary(HEADERS, ['10', '4', '1.0']), path)
+    with pytest.raises(ValueError):
+        simsetup.record_sim(ENResultsCSVWritableSummary(HEADERS + ['profile'], ['10', '6', '2.0', '0.1']), path)
+    with open(path, newline='') as csv_file:
+        assert len(list(csv.reader(csv_file))) == 2
+
+def test_setup_sims_writes_to_suffixed_file_when_columns_differ(tmp_path):
+    path = tmp_path / 'results.csv'
+    # As written before ENParams gained its latest fields
+    old_layout = 'Sim count,scientist_pop_count,sim time (s)\n10,4,1.0\n'
+    path.write_text(old_layout)
+    simsetup = ENSimSetup(4, None, processes=1, progress_interval=None, executor=ENSweepExecutor.THREADS)
+    assert simsetup.output_path(str(path)) == str(tmp_path / 'results.2.csv')
+    simsetup.setup_sims([ENParams(4, ENetworkType.CYCLE, 10, 0.05, 0.5, 1000, 0.99, None, False)], str(path))
+    assert path.read_text() == old_layout
+    with open(tmp_path / 'results.2.csv', newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+    assert rows[0] == simsetup.csv_headers()
+    assert len(rows) == 2 and len(rows[1]) == len(rows[0])
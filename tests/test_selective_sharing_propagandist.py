@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from agents.binomialethicalscientist import BinomialEthicalScientist
+from agents.experimenters.binomialexperimenter import BinomialExperiment
+from agents.selective_sharing_propagandist import SelectiveSharingPropagandist
+
+""" The propagandist filters experiments against its own n_per_round, so it refuses scientists that
+run experiments of another size."""
+
+def scientist(n_per_round: int) -> BinomialEthicalScientist:
+    return BinomialEthicalScientist(np.random.default_rng(253), n_per_round, 0.05, 0.5, 0.6)
+
+def test_shares_experiments_with_k_below_half_n():
+    propagandist = SelectiveSharingPropagandist(10)
+    scientists = [scientist(10) for _ in range(3)]
+    for s in scientists:
+        propagandist.add_scientist(s)
+    for s, k in zip(scientists, (3, 5, 7)):
+        s.binomial_experiment = BinomialExperiment(k, 10)
+    propagandist.collect_round_evidence()
+    assert propagandist.shared_evidence == (1, -4)
+
+def test_refuses_other_n():
+    propagandist = SelectiveSharingPropagandist(10)
+    propagandist.add_scientist(scientist(10))
+    with pytest.raises(ValueError):
+        propagandist.add_scientist(scientist(20))
@@ -0,0 +1,30 @@
+import sim.sweep
+from sim.scheduler import ENSweepScheduler
+from sim.sweep import ENSweep
+from sim.sim_models import *
+
+""" The cost model of ENSweepScheduler learns from the chunks a sweep gets back, including those
+whose results workers wrote into shared memory."""
+
+CONFIGS = [ENParams(pop, ENetworkType.CYCLE, 10, 0.05, 0.5, 1000, 0.99, None, False) for pop in (4, 6)]
+
+class RecordingScheduler(ENSweepScheduler):
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        RecordingScheduler.instances.append(self)
+
+def test_cost_model_observes_shared_memory_chunks(monkeypatch):
+    RecordingScheduler.instances.clear()
+    monkeypatch.setattr(sim.sweep, 'ENSweepScheduler', RecordingScheduler)
+    sweep = ENSweep(CONFIGS, [253, 254], 20, ENSimOptions(), 5, 2, None, None,
+                    ENSweepScheduling.COST_AWARE,
+                    executor=ENSweepExecutor.PROCESSES)
+    results = list(sweep.run())
+    assert len(results) == len(CONFIGS)
+    scheduler, = RecordingScheduler.instances
+    for i, aggregator in enumerate(sweep.aggregators):
+        assert scheduler._observed_sims[i] == 20
+        assert scheduler._observed_rounds[i] == int(aggregator.results['final_sim_round'].sum())
+        assert scheduler._observed_rounds[i] > 0